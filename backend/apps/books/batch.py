@@ -0,0 +1,224 @@
+"""
+Batched library mutations.
+
+A batch is a list of operations applied for one user in a single
+transaction:
+
+    {"op": "add", "book": {...search result...}, "status": "tbr"}
+    {"op": "status", "user_book_id": 12, "status": "finished", "current_page": 320, "notes": "..."}
+    {"op": "rate", "user_book_id": 12, "ratings": {"overall": 4.5, "plot": 4}, "review": "..."}
+
+"status" and "rate" operations may reference a book by "open_library_id"
+instead of "user_book_id", including books added earlier in the same batch.
+Adds are applied first, then status changes in order, then ratings, each
+with a fixed number of bulk queries. Invalid operations are reported in the
+per-item results without affecting the rest of the batch.
+"""
+
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Book, UserBook, Rating, sync_authors_and_genres, upsert_ratings
+from .signals import bulk_saved
+from . import covers, enrichment
+
+
+MAX_OPERATIONS = 500
+
+OPERATIONS = ('add', 'status', 'rate')
+
+USER_BOOK_UPDATE_FIELDS = ['status', 'date_started', 'date_finished', 'current_page', 'notes']
+
+
+class BatchError(ValueError):
+    """The batch as a whole is malformed"""
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _operation_error(op, kind, valid_statuses):
+    """Why `op` can't be applied, or None if it is well-formed"""
+    if kind == 'add' and not (
+        isinstance(op.get('book'), dict) and isinstance(op['book'].get('open_library_id'), str)
+        and op['book']['open_library_id']
+    ):
+        return 'Book data with open_library_id is required'
+    if kind in ('add', 'status'):
+        new_status = op.get('status', 'tbr')
+        if not isinstance(new_status, str) or new_status not in valid_statuses:
+            return 'Invalid status'
+    if kind != 'add':
+        if not (op.get('user_book_id') or op.get('open_library_id')):
+            return 'user_book_id or open_library_id is required'
+        if op.get('user_book_id') and not _is_int(op['user_book_id']):
+            return 'user_book_id must be an integer'
+        if not op.get('user_book_id') and not isinstance(op['open_library_id'], str):
+            return 'open_library_id must be a string'
+    if kind == 'status':
+        if 'status' not in op:
+            return 'Invalid status'
+        if 'current_page' in op and not (_is_int(op['current_page']) and op['current_page'] >= 0):
+            return 'current_page must be a non-negative integer'
+        if op.get('notes') is not None and not isinstance(op['notes'], str):
+            return 'notes must be a string'
+    if kind == 'rate':
+        if not isinstance(op.get('ratings'), dict):
+            return 'At least one rating is required'
+        if not isinstance(op.get('review', ''), str):
+            return 'review must be a string'
+    return None
+
+
+def _parse_rating(value):
+    try:
+        rating = Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        return None
+    if rating < Decimal('0.5') or rating > Decimal('5.0') or (rating * 2) % 1:
+        return None
+    return rating
+
+
+def _add_books(user, operations, results):
+    """Get-or-create the Books and UserBooks for every add operation"""
+    book_data = {op['book']['open_library_id']: op['book'] for _, op in operations}
+
+    books = Book.objects.in_bulk(book_data.keys(), field_name='open_library_id')
+    missing = [
+        Book(open_library_id=key, **Book.fields_from_search_result(data))
+        for key, data in book_data.items() if key not in books
+    ]
+    if missing:
+        Book.objects.bulk_create(missing, ignore_conflicts=True)
+        created = list(Book.objects.filter(open_library_id__in=[book.open_library_id for book in missing]))
+        sync_authors_and_genres(created)
+        enrichment.enqueue(created)
+        covers.enqueue(created)
+        books.update((book.open_library_id, book) for book in created)
+
+    existing = set(UserBook.objects.filter(
+        user=user, book__in=[book.pk for book in books.values()]
+    ).values_list('book_id', flat=True))
+
+    new_user_books = {}
+    for index, op in operations:
+        book = books[op['book']['open_library_id']]
+        if book.pk in existing or book.pk in new_user_books:
+            results[index] = {'status': 'error', 'error': 'Book is already in your library'}
+            continue
+        user_book = UserBook(user=user, book=book, status='tbr')
+        user_book.apply_status(op.get('status', 'tbr'))
+        new_user_books[book.pk] = (index, user_book)
+
+    UserBook.objects.bulk_create([user_book for _, user_book in new_user_books.values()])
+
+    # Backends that can't return ids from bulk inserts need one lookup
+    if any(user_book.pk is None for _, user_book in new_user_books.values()):
+        ids = dict(UserBook.objects.filter(
+            user=user, book__in=new_user_books.keys()
+        ).values_list('book_id', 'id'))
+        for book_id, (_, user_book) in new_user_books.items():
+            user_book.pk = ids.get(book_id)
+
+    for index, user_book in new_user_books.values():
+        results[index] = {'status': 'ok', 'user_book_id': user_book.pk}
+    
+    return [user_book for _, user_book in new_user_books.values()]
+
+
+def apply_batch(user, operations):
+    """Apply `operations` for `user`, returning one result dict per operation"""
+    if not isinstance(operations, list) or not operations:
+        raise BatchError('operations must be a non-empty list')
+    if len(operations) > MAX_OPERATIONS:
+        raise BatchError(f'At most {MAX_OPERATIONS} operations are allowed per batch')
+
+    results = [None] * len(operations)
+    adds, changes, rates = [], [], []
+    valid_statuses = dict(UserBook.STATUS_CHOICES)
+
+    for index, op in enumerate(operations):
+        kind = op.get('op') if isinstance(op, dict) else None
+        if not isinstance(kind, str) or kind not in OPERATIONS:
+            results[index] = {'status': 'error', 'error': f"op must be one of: {', '.join(OPERATIONS)}"}
+            continue
+        error = _operation_error(op, kind, valid_statuses)
+        if error:
+            results[index] = {'status': 'error', 'error': error}
+        else:
+            {'add': adds, 'status': changes, 'rate': rates}[kind].append((index, op))
+
+    with transaction.atomic():
+        added = _add_books(user, adds, results) if adds else []
+
+        # Resolve every referenced UserBook in one query
+        referenced = changes + rates
+        user_books = {}
+        if referenced:
+            ids = {op['user_book_id'] for _, op in referenced if op.get('user_book_id')}
+            keys = {op['open_library_id'] for _, op in referenced if not op.get('user_book_id')}
+            for user_book in UserBook.objects.filter(user=user).filter(
+                Q(pk__in=ids) | Q(book__open_library_id__in=keys)
+            ).select_related('book'):
+                user_books[('id', user_book.pk)] = user_book
+                user_books[('key', user_book.book.open_library_id)] = user_book
+
+        def lookup(op):
+            if op.get('user_book_id'):
+                return user_books.get(('id', op['user_book_id']))
+            return user_books.get(('key', op['open_library_id']))
+
+        # Status changes, applied in order in memory and written together
+        now = timezone.now()
+        changed = {}
+        for index, op in changes:
+            user_book = lookup(op)
+            if user_book is None:
+                results[index] = {'status': 'error', 'error': 'Book not found in your library'}
+                continue
+            user_book.apply_status(op['status'], now)
+            user_book.current_page = op.get('current_page', user_book.current_page)
+            user_book.notes = op.get('notes', user_book.notes)
+            changed[user_book.pk] = user_book
+            results[index] = {'status': 'ok', 'user_book_id': user_book.pk}
+        if changed:
+            UserBook.objects.bulk_update(changed.values(), USER_BOOK_UPDATE_FIELDS)
+        if added or changed:
+            bulk_saved.send(sender=UserBook, instances=added + list(changed.values()))
+
+        # Ratings, upserted in a single statement
+        ratings = []
+        for index, op in rates:
+            user_book = lookup(op)
+            if user_book is None:
+                results[index] = {'status': 'error', 'error': 'Book not found in your library'}
+                continue
+            parsed = {}
+            for rating_type, value in op['ratings'].items():
+                if rating_type in dict(Rating.RATING_TYPES):
+                    parsed[rating_type] = _parse_rating(value)
+            if not parsed or None in parsed.values():
+                results[index] = {'status': 'error', 'error': 'Ratings must be 0.5 to 5.0 in 0.5 steps'}
+                continue
+            ratings.extend(
+                Rating(
+                    user=user,
+                    book=user_book.book,
+                    rating_type=rating_type,
+                    rating=value,
+                    review=op.get('review', '') if rating_type == 'overall' else ''
+                )
+                for rating_type, value in parsed.items()
+            )
+            results[index] = {'status': 'ok', 'user_book_id': user_book.pk}
+        upsert_ratings(ratings)
+
+    return [
+        {'index': index, 'op': op.get('op') if isinstance(op, dict) else None, **result}
+        for index, (op, result) in enumerate(zip(operations, results))
+    ]
@@ -0,0 +1,103 @@
+"""
+Full-text search over the local Book catalog.
+
+On SQLite the `books_book_fts` FTS5 table (kept in sync by triggers, see
+migration 0006) is queried with bm25 ranking. On Postgres the GIN-indexed
+`to_tsvector` expression is queried with ts_rank. Any other database falls
+back to a plain icontains scan.
+
+SQLite drops triggers along with their table, so any migration that makes
+Django rebuild `books_book` must re-create the FTS triggers.
+"""
+
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Book
+
+
+# Relative weight of title, authors and ISBN matches in bm25 ranking
+FTS_WEIGHTS = (10.0, 5.0, 1.0)
+
+# Must match the expression indexed in migration 0006
+PG_DOCUMENT = (
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(authors::text, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(isbn_10, '') || ' ' || coalesce(isbn_13, '')), 'C')"
+)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def query_terms(query):
+    """Split a free-text query into search terms, dropping punctuation"""
+    return TOKEN_RE.findall(query.casefold())
+
+
+def search_catalog(query, limit=20):
+    """Return up to `limit` Books matching `query`, best match first"""
+    terms = query_terms(query)
+    if not terms:
+        return []
+
+    if connection.vendor == 'sqlite':
+        book_ids = _search_sqlite(terms, limit)
+    elif connection.vendor == 'postgresql':
+        book_ids = _search_postgres(terms, limit)
+    else:
+        return list(_search_fallback(terms)[:limit])
+
+    books = Book.objects.in_bulk(book_ids)
+    return [books[book_id] for book_id in book_ids if book_id in books]
+
+
+def _search_sqlite(terms, limit):
+    # Every term must match, each as a prefix so partial words still hit
+    match = ' AND '.join('"%s"*' % term for term in terms)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT rowid FROM books_book_fts WHERE books_book_fts MATCH %s '
+            'ORDER BY bm25(books_book_fts, %s, %s, %s) LIMIT %s',
+            [match, *FTS_WEIGHTS, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _search_postgres(terms, limit):
+    tsquery = ' & '.join('%s:*' % term for term in terms)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT id FROM books_book '
+            f'WHERE ({PG_DOCUMENT}) @@ to_tsquery(\'simple\', %s) '
+            f'ORDER BY ts_rank({PG_DOCUMENT}, to_tsquery(\'simple\', %s)) DESC LIMIT %s',
+            [tsquery, tsquery, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _search_fallback(terms):
+    books = Book.objects.all()
+    for term in terms:
+        books = books.filter(
+            Q(title__icontains=term) | Q(authors__icontains=term) |
+            Q(isbn_10__icontains=term) | Q(isbn_13__icontains=term)
+        )
+    return books
+
+
+def format_catalog_book(book):
+    """Shape a Book like an Open Library search hit"""
+    isbn = book.isbn_13 or book.isbn_10
+    return {
+        'open_library_id': book.open_library_id,
+        'title': book.title,
+        'authors': book.authors,
+        'first_publish_year': int(book.publish_date) if (book.publish_date or '').isdigit() else None,
+        'pages': book.pages,
+        'subjects': book.genres[:5],
+        'isbn': isbn,
+        'cover_id': None,
+        'cover_url': book.cover_url,
+    }
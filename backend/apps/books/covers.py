@@ -0,0 +1,307 @@
+"""
+Local cache of book cover thumbnails.
+
+Covers are downloaded once, in background batches (`manage.py
+cache_covers`), and stored content-addressed: each thumbnail is saved under
+the SHA-256 of its bytes, so identical covers are stored once and a file
+never changes after it is written. That lets /api/books/covers/<digest>.jpg
+be served with a year-long immutable Cache-Control and the digest as ETag.
+
+Thumbnails are resized with Pillow when it is installed. Without it, the
+small and medium sizes Open Library publishes for its own cover URLs are
+stored instead, and other covers are stored as they are.
+
+The cache is capped at COVER_CACHE['MAX_BYTES']. When a batch takes it over
+the cap, the least recently served covers are evicted; serving refreshes a
+cover's last_accessed at most once per ACCESS_RESOLUTION, tracked in the
+default cache, so that reads don't turn into a write per image. Books
+without a cached cover fall back to their remote cover_url. Each worker run
+first queues evicted covers again, most recently served first, as far as
+they fit in the room left under the cap.
+"""
+
+import hashlib
+import io
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.urls import reverse
+from django.utils import timezone
+
+from .enrichment import RateLimiter
+from .models import CoverImage
+from .open_library import OpenLibraryError, get_client
+
+try:
+    from PIL import Image
+except ImportError:  # Fall back to Open Library's own thumbnail sizes
+    Image = None
+
+
+DEFAULTS = {
+    'ROOT': os.path.join(settings.BASE_DIR, 'cache', 'covers'),
+    'MAX_BYTES': 200 * 1024 * 1024,
+    'BATCH_SIZE': 50,
+    'CONCURRENCY': 4,
+    'RATE_PER_HOST': 10.0,  # Requests per second; 0 disables
+    'MAX_ATTEMPTS': 3,
+    'RETRY_DELAY': 300,  # Seconds, doubled on each attempt
+    'ACCESS_RESOLUTION': 60 * 60,  # Seconds between last_accessed updates
+}
+
+SIZES = {
+    'small': 120,  # Width in pixels
+    'medium': 300,
+}
+
+# Open Library serves every cover in S, M and L sizes
+OPEN_LIBRARY_COVER_RE = re.compile(r'^(https?://covers\.openlibrary\.org/b/[a-z]+/[^/]+?)-[SML]\.jpg$')
+OPEN_LIBRARY_SIZES = {'small': 'S', 'medium': 'M', 'original': 'L'}
+
+DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+MAX_COVER_BYTES = 5 * 1024 * 1024
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'COVER_CACHE', {})}
+
+
+# Storage
+
+def path_for(digest):
+    """Where the file with `digest` lives, fanned out over subdirectories"""
+    return Path(get_options()['ROOT']) / digest[:2] / digest[2:4] / f'{digest}.jpg'
+
+
+def store(data):
+    """Write `data` under its digest unless it is already stored; returns the digest"""
+    digest = hashlib.sha256(data).hexdigest()
+    path = path_for(digest)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so a crash never leaves a partial file under the digest
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+        os.replace(tmp, path)
+    return digest
+
+
+def url_for(cover, size):
+    """Local URL of a cached cover, or None if it isn't cached"""
+    if cover is None or cover.status != 'done':
+        return None
+    return reverse('books:cover', args=[cover.digest(size)])
+
+
+# Queue
+
+def enqueue(books):
+    """Queue the covers of books that have one; already queued books are left alone"""
+    covers = [CoverImage(book_id=book.pk, source_url=book.cover_url) for book in books if book.cover_url]
+    if covers:
+        CoverImage.objects.bulk_create(covers, ignore_conflicts=True)
+
+
+def requeue_evicted(max_bytes=None):
+    """Queue evicted covers again, most recently served first, while they fit under the cap.
+
+    Evicted covers keep their size, so fetching the queued ones again never
+    evicts anything. Returns the number of covers queued.
+    """
+    max_bytes = get_options()['MAX_BYTES'] if max_bytes is None else max_bytes
+    # Requeued covers still waiting for the worker count against the room too
+    used = CoverImage.objects.filter(status__in=['done', 'pending']).aggregate(total=Sum('bytes'))['total'] or 0
+    room = max_bytes - used
+
+    ids = []
+    evicted = CoverImage.objects.filter(status='evicted').order_by('-last_accessed', '-id').only('id', 'bytes')
+    for cover in evicted.iterator():
+        if cover.bytes > room:
+            break
+        ids.append(cover.pk)
+        room -= cover.bytes
+    if not ids:
+        return 0
+    now = timezone.now()
+    return CoverImage.objects.filter(pk__in=ids).update(
+        status='pending', attempts=0, last_error='', available_at=now, updated_at=now
+    )
+
+
+def _source_url(url, size):
+    match = OPEN_LIBRARY_COVER_RE.match(url)
+    return f'{match.group(1)}-{OPEN_LIBRARY_SIZES[size]}.jpg' if match else url
+
+
+def _resize(data, width):
+    image = Image.open(io.BytesIO(data))
+    image = image.convert('RGB')
+    image.thumbnail((width, width * 2))
+    output = io.BytesIO()
+    image.save(output, 'JPEG', quality=85, optimize=True)
+    return output.getvalue()
+
+
+def fetch_thumbnails(url, client, limiter):
+    """Download a cover and return {size: jpeg bytes}.
+
+    Runs in pool threads, so it must not touch the database.
+    """
+    def download(source):
+        limiter.wait(urlsplit(source).netloc)
+        data = client.get(source).content
+        if not data or len(data) > MAX_COVER_BYTES:
+            raise OpenLibraryError(f'Unusable cover image ({len(data)} bytes)')
+        return data
+
+    if Image is not None:
+        original = download(_source_url(url, 'original'))
+        return {size: _resize(original, width) for size, width in SIZES.items()}
+
+    if OPEN_LIBRARY_COVER_RE.match(url):
+        return {size: download(_source_url(url, size)) for size in SIZES}
+    original = download(url)
+    return {size: original for size in SIZES}
+
+
+def process_batch(covers, client, limiter, options):
+    """Download and store a batch of covers, then record them in bulk.
+
+    Returns the number of covers stored. Two workers picking up the same
+    cover only repeat work: storing is idempotent.
+    """
+    now = timezone.now()
+    results = {}
+    with ThreadPoolExecutor(max_workers=options['CONCURRENCY']) as pool:
+        futures = {pool.submit(fetch_thumbnails, cover.source_url, client, limiter): cover for cover in covers}
+        for future in as_completed(futures):
+            try:
+                results[futures[future].pk] = future.result()
+            except (OpenLibraryError, OSError, ValueError) as e:
+                results[futures[future].pk] = e
+
+    stored = 0
+    for cover in covers:
+        result = results[cover.pk]
+        cover.attempts += 1
+        cover.updated_at = now
+        if isinstance(result, Exception):
+            cover.last_error = str(result)[:1000]
+            if cover.attempts >= options['MAX_ATTEMPTS']:
+                cover.status = 'failed'
+            else:
+                cover.available_at = now + timedelta(seconds=options['RETRY_DELAY'] * 2 ** (cover.attempts - 1))
+            continue
+
+        digests = {size: store(data) for size, data in result.items()}
+        cover.small_digest, cover.medium_digest = digests['small'], digests['medium']
+        # Sizes that share a file count once
+        cover.bytes = sum({digests[size]: len(data) for size, data in result.items()}.values())
+        cover.status = 'done'
+        cover.last_error = ''
+        cover.last_accessed = now
+        stored += 1
+
+    CoverImage.objects.bulk_update(covers, [
+        'status', 'attempts', 'last_error', 'available_at', 'small_digest', 'medium_digest',
+        'bytes', 'last_accessed', 'updated_at'
+    ])
+    return stored
+
+
+def _referenced(digests):
+    """Which of `digests` are still used by a cached cover"""
+    pairs = CoverImage.objects.filter(
+        Q(small_digest__in=digests) | Q(medium_digest__in=digests), status='done'
+    ).values_list('small_digest', 'medium_digest')
+    return {digest for pair in pairs for digest in pair} & digests
+
+
+def evict(max_bytes=None):
+    """Evict least recently served covers until the cache fits in `max_bytes`.
+
+    Returns the number of covers evicted. Files are only deleted once no
+    cached cover refers to them.
+    """
+    max_bytes = get_options()['MAX_BYTES'] if max_bytes is None else max_bytes
+    done = CoverImage.objects.filter(status='done')
+    excess = (done.aggregate(total=Sum('bytes'))['total'] or 0) - max_bytes
+    if excess <= 0:
+        return 0
+
+    victims = []
+    for cover in done.order_by('last_accessed', 'id').only('id', 'bytes', 'small_digest', 'medium_digest'):
+        victims.append(cover)
+        excess -= cover.bytes
+        if excess <= 0:
+            break
+
+    digests = {digest for cover in victims for digest in (cover.small_digest, cover.medium_digest)}
+    with transaction.atomic():
+        CoverImage.objects.filter(pk__in=[cover.pk for cover in victims]).update(
+            status='evicted', small_digest='', medium_digest='', updated_at=timezone.now()
+        )
+        still_used = _referenced(digests)
+
+    for digest in digests - still_used:
+        try:
+            path_for(digest).unlink()
+        except FileNotFoundError:
+            pass
+    return len(victims)
+
+
+def touch(digest):
+    """Record that a cover was served, at most once per ACCESS_RESOLUTION"""
+    resolution = get_options()['ACCESS_RESOLUTION']
+    # Only the first hit in each window gets as far as the database
+    if not cache.add(f'covers:touched:{digest}', True, resolution):
+        return
+    now = timezone.now()
+    stale = now - timedelta(seconds=resolution)
+    CoverImage.objects.filter(
+        Q(small_digest=digest) | Q(medium_digest=digest), status='done', last_accessed__lt=stale
+    ).update(last_accessed=now)
+
+
+def cache_stats():
+    """Number of covers in each status, and bytes stored"""
+    counts = dict(CoverImage.objects.values_list('status').annotate(count=Count('id')).order_by())
+    stats = {value: counts.get(value, 0) for value, _ in CoverImage.STATUS_CHOICES}
+    stats['bytes'] = CoverImage.objects.filter(status='done').aggregate(total=Sum('bytes'))['total'] or 0
+    return stats
+
+
+def run_worker(limit=None, client=None, options=None):
+    """Cache due covers in batches until none are left (or `limit` covers are tried).
+
+    Yields (covers tried, covers stored) after every batch.
+    """
+    options = {**get_options(), **(options or {})}
+    client = client or get_client()
+    limiter = RateLimiter(options['RATE_PER_HOST'])
+    tried = stored = 0
+    requeue_evicted(options['MAX_BYTES'])
+
+    while limit is None or tried < limit:
+        batch_size = options['BATCH_SIZE'] if limit is None else min(options['BATCH_SIZE'], limit - tried)
+        covers = list(CoverImage.objects.filter(
+            status='pending', available_at__lte=timezone.now()
+        ).order_by('available_at', 'id')[:batch_size])
+        if not covers:
+            break
+        stored += process_batch(covers, client, limiter, options)
+        tried += len(covers)
+        evict(options['MAX_BYTES'])
+        yield tried, stored
@@ -0,0 +1,310 @@
+"""
+Background enrichment of catalog books with Open Library details.
+
+Books added from a search hit or an import only carry what that source
+had, so description, publisher, ISBNs and language are filled in later.
+Each book gets at most one EnrichmentTask row, which makes the table a
+deduplicated, crash-safe queue:
+
+- Workers claim a batch by stamping a random token on tasks whose
+  available_at has passed, leasing them until available_at + LEASE. A
+  worker that dies mid-batch loses its lease and the tasks are claimed
+  again, so processing resumes where it stopped.
+- A claimed batch is fetched by a bounded thread pool, with requests to
+  each host spaced by a RateLimiter on top of the client's own per-host
+  concurrency limit. Only HTTP happens in the pool threads.
+- Results are written back with one bulk_update for the books and one for
+  the tasks. Failures are retried with exponential backoff until
+  MAX_ATTEMPTS, then marked failed.
+
+Run workers with `manage.py enrich_books`.
+"""
+
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import Book, EnrichmentTask
+from .open_library import OpenLibraryError, get_client
+
+
+DEFAULTS = {
+    'CONCURRENCY': 4,  # Books fetched in parallel
+    'BATCH_SIZE': 50,  # Tasks claimed and written per batch
+    'RATE_PER_HOST': 5.0,  # Requests per second to each host; 0 disables
+    'MAX_ATTEMPTS': 5,
+    'RETRY_DELAY': 60,  # Seconds, doubled on each attempt
+    'LEASE': 300,  # Seconds a claimed task is reserved for its worker
+    'EDITIONS': 10,  # Editions considered when picking publisher/ISBN/language
+}
+
+ENRICHED_FIELDS = ['description', 'publisher', 'publish_date', 'isbn_13', 'isbn_10', 'language']
+
+WORK_ID_RE = re.compile(r'^OL\d+W$')
+
+# Open Library languages are MARC codes; keep two-letter codes for common ones
+MARC_LANGUAGES = {
+    'eng': 'en', 'spa': 'es', 'fre': 'fr', 'ger': 'de', 'ita': 'it', 'por': 'pt',
+    'rus': 'ru', 'jpn': 'ja', 'chi': 'zh', 'dut': 'nl', 'swe': 'sv', 'pol': 'pl',
+}
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'BOOK_ENRICHMENT', {})}
+
+
+class RateLimiter:
+    """Thread-safe per-host request spacing at `rate` requests per second"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+@dataclass
+class EnrichmentMetrics:
+    """Running totals for a worker, reported as progress and at the end"""
+
+    batches: int = 0
+    claimed: int = 0
+    enriched: int = 0
+    retried: int = 0
+    failed: int = 0
+    requests: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def books_per_second(self):
+        return self.enriched / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def requests_per_second(self):
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'batches': self.batches,
+            'claimed': self.claimed,
+            'enriched': self.enriched,
+            'retried': self.retried,
+            'failed': self.failed,
+            'requests': self.requests,
+            'elapsed': round(self.elapsed, 2),
+            'books_per_second': round(self.books_per_second, 2),
+            'requests_per_second': round(self.requests_per_second, 2),
+        }
+
+
+def _isbn(book):
+    if book.open_library_id.startswith('isbn:'):
+        return book.open_library_id[len('isbn:'):]
+    return book.isbn_13 or book.isbn_10
+
+
+def can_enrich(book):
+    """Whether Open Library can be asked about `book` at all"""
+    return bool(WORK_ID_RE.match(book.open_library_id) or _isbn(book))
+
+
+def enqueue(books):
+    """Queue books for enrichment; books already queued are left alone"""
+    tasks = [EnrichmentTask(book_id=book.pk) for book in books if can_enrich(book)]
+    if tasks:
+        EnrichmentTask.objects.bulk_create(tasks, ignore_conflicts=True)
+
+
+def retry_failed():
+    """Put failed tasks back in the queue with a fresh set of attempts"""
+    return EnrichmentTask.objects.filter(status='failed').update(
+        status='pending', attempts=0, available_at=timezone.now(), updated_at=timezone.now()
+    )
+
+
+def queue_stats():
+    """Number of tasks in each status"""
+    counts = dict(EnrichmentTask.objects.values_list('status').annotate(count=Count('id')).order_by())
+    return {value: counts.get(value, 0) for value, _ in EnrichmentTask.STATUS_CHOICES}
+
+
+def claim(batch_size, lease):
+    """Lease up to `batch_size` due tasks to this worker.
+
+    The UPDATE only matches tasks that are still due, so when two workers
+    race for the same rows each task goes to exactly one of them.
+    """
+    now = timezone.now()
+    due = Q(status__in=['pending', 'running'], available_at__lte=now)
+    ids = list(EnrichmentTask.objects.filter(due).values_list('pk', flat=True)[:batch_size])
+    if not ids:
+        return []
+
+    token = uuid.uuid4().hex
+    EnrichmentTask.objects.filter(due, pk__in=ids).update(
+        status='running',
+        claim_token=token,
+        available_at=now + timedelta(seconds=lease),
+        attempts=F('attempts') + 1,
+        updated_at=now,
+    )
+    return list(EnrichmentTask.objects.filter(claim_token=token).select_related('book'))
+
+
+def _description(work):
+    description = work.get('description')
+    if isinstance(description, dict):
+        description = description.get('value')
+    return description.strip() if isinstance(description, str) and description.strip() else None
+
+
+def _edition_details(edition):
+    details = {}
+    if edition.get('publishers'):
+        details['publisher'] = edition['publishers'][0][:200]
+    if edition.get('publish_date'):
+        details['publish_date'] = edition['publish_date'][:50]
+    isbn_13 = [value for value in edition.get('isbn_13', []) if len(value) == 13]
+    if isbn_13:
+        details['isbn_13'] = isbn_13[0]
+    isbn_10 = [value for value in edition.get('isbn_10', []) if len(value) == 10]
+    if isbn_10:
+        details['isbn_10'] = isbn_10[0]
+    if edition.get('languages'):
+        code = edition['languages'][0].get('key', '').rsplit('/', 1)[-1]
+        if code:
+            details['language'] = MARC_LANGUAGES.get(code, code[:10])
+    return details
+
+
+def fetch_details(book, client, limiter, editions=DEFAULTS['EDITIONS']):
+    """Fetch Open Library details for `book`.
+
+    Returns ({field: value}, number of requests made). Runs in pool
+    threads, so it must not touch the database.
+    """
+    requests = 0
+
+    def get_json(path, params=None):
+        nonlocal requests
+        limiter.wait(urlsplit(client._url(path)).netloc)
+        requests += 1
+        return client.get_json(path, params)
+
+    if WORK_ID_RE.match(book.open_library_id):
+        work = get_json(f'/works/{book.open_library_id}.json')
+        entries = get_json(f'/works/{book.open_library_id}/editions.json', {'limit': editions}).get('entries', [])
+    else:
+        edition = get_json(f'/isbn/{_isbn(book)}.json')
+        entries = [edition]
+        work_key = (edition.get('works') or [{}])[0].get('key')
+        work = get_json(f'{work_key}.json') if work_key else {}
+
+    # Prefer the edition that fills in the most fields
+    candidates = [_edition_details(entry) for entry in entries]
+    details = max(candidates, key=len, default={})
+    description = _description(work)
+    if description:
+        details['description'] = description
+    return details, requests
+
+
+def _apply_details(book, details):
+    """Fill in fields the book doesn't have yet; language replaces the 'en' default"""
+    for name, value in details.items():
+        if name == 'language' or not getattr(book, name):
+            setattr(book, name, value)
+
+
+def process_batch(tasks, client, limiter, options, metrics):
+    """Fetch details for claimed tasks in parallel and write them back in bulk"""
+    now = timezone.now()
+    results = {}
+    with ThreadPoolExecutor(max_workers=options['CONCURRENCY']) as pool:
+        futures = {
+            pool.submit(fetch_details, task.book, client, limiter, options['EDITIONS']): task
+            for task in tasks if task.attempts <= options['MAX_ATTEMPTS']
+        }
+        for future in as_completed(futures):
+            try:
+                results[futures[future].pk] = future.result()
+            except (OpenLibraryError, ValueError, KeyError, TypeError, AttributeError) as e:
+                results[futures[future].pk] = e
+
+    books = []
+    for task in tasks:
+        result = results.get(task.pk, OpenLibraryError('Too many attempts'))
+        task.claim_token = ''
+        task.updated_at = now
+        if isinstance(result, Exception):
+            task.last_error = str(result)[:1000]
+            if task.attempts >= options['MAX_ATTEMPTS']:
+                task.status = 'failed'
+                metrics.failed += 1
+            else:
+                task.status = 'pending'
+                task.available_at = now + timedelta(seconds=options['RETRY_DELAY'] * 2 ** (task.attempts - 1))
+                metrics.retried += 1
+            continue
+
+        details, requests = result
+        metrics.requests += requests
+        _apply_details(task.book, details)
+        task.book.updated_at = now
+        books.append(task.book)
+        task.status = 'done'
+        task.last_error = ''
+        metrics.enriched += 1
+
+    with transaction.atomic():
+        if books:
+            Book.objects.bulk_update(books, ENRICHED_FIELDS + ['updated_at'])
+        EnrichmentTask.objects.bulk_update(
+            tasks, ['status', 'last_error', 'available_at', 'claim_token', 'updated_at']
+        )
+    metrics.batches += 1
+    metrics.claimed += len(tasks)
+
+
+def run_worker(limit=None, once=False, client=None, options=None):
+    """Process due tasks until the queue is drained (or `limit` tasks claimed).
+
+    Yields the running EnrichmentMetrics after every batch.
+    """
+    options = {**get_options(), **(options or {})}
+    client = client or get_client()
+    limiter = RateLimiter(options['RATE_PER_HOST'])
+    metrics = EnrichmentMetrics()
+
+    while limit is None or metrics.claimed < limit:
+        batch_size = options['BATCH_SIZE'] if limit is None else min(options['BATCH_SIZE'], limit - metrics.claimed)
+        tasks = claim(batch_size, options['LEASE'])
+        if not tasks:
+            break
+        process_batch(tasks, client, limiter, options, metrics)
+        yield metrics
+        if once:
+            break
@@ -0,0 +1,337 @@
+"""
+Bulk import of Goodreads and StoryGraph CSV library exports.
+
+Rows are parsed incrementally and processed in fixed-size chunks, each in
+its own transaction: books are resolved against the catalog by ISBN in a
+couple of batched queries, missing ones are bulk-created, and UserBook and
+Rating rows are written with bulk_create(ignore_conflicts=True). Memory use
+depends on the chunk size, not on the size of the file.
+
+Books that aren't already in the catalog are keyed by ISBN (`isbn:<isbn>`)
+or, without one, by a hash of title and author (`import:<hash>`), so
+re-importing the same export is idempotent.
+"""
+
+import codecs
+import csv
+import hashlib
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, time
+from decimal import Decimal, ROUND_HALF_UP
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Book, UserBook, Rating, sync_authors_and_genres
+from .signals import bulk_saved
+from . import covers, enrichment
+
+
+DEFAULT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 50
+
+GOODREADS_STATUSES = {
+    'read': 'finished',
+    'to-read': 'tbr',
+    'currently-reading': 'reading',
+    'did-not-finish': 'dnf',
+    'dnf': 'dnf',
+    'abandoned': 'dnf',
+}
+
+STORYGRAPH_STATUSES = {
+    'read': 'finished',
+    'to-read': 'tbr',
+    'currently-reading': 'reading',
+    'paused': 'reading',
+    'did-not-finish': 'dnf',
+}
+
+
+class ImportFormatError(ValueError):
+    """The uploaded file isn't a recognized library export"""
+
+
+@dataclass
+class ImportRow:
+    """A library entry normalized from either export format"""
+
+    title: str
+    authors: list
+    isbn_10: str = None
+    isbn_13: str = None
+    pages: int = None
+    publish_year: str = None
+    status: str = 'tbr'
+    rating: Decimal = None
+    review: str = None
+    date_read: datetime = None
+
+    @property
+    def key(self):
+        """Catalog key used when the book isn't already known"""
+        if self.isbn_13 or self.isbn_10:
+            return f'isbn:{self.isbn_13 or self.isbn_10}'
+        digest = hashlib.sha1(
+            f'{self.title.casefold()}|{",".join(self.authors).casefold()}'.encode('utf-8')
+        ).hexdigest()[:24]
+        return f'import:{digest}'
+
+
+@dataclass
+class ImportResult:
+    """Running totals reported as progress and returned at the end"""
+
+    rows: int = 0
+    books_created: int = 0
+    added: int = 0
+    already_in_library: int = 0
+    ratings: int = 0
+    error_count: int = 0
+    errors: list = field(default_factory=list)
+
+    def add_error(self, line_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_number, 'error': message})
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'books_created': self.books_created,
+            'added': self.added,
+            'already_in_library': self.already_in_library,
+            'ratings': self.ratings,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
+
+
+# Parsing
+
+def _clean_isbn(value):
+    value = re.sub(r'[^0-9Xx]', '', value or '').upper()
+    return value if len(value) in (10, 13) else None
+
+
+def _split_authors(*values):
+    authors = []
+    for value in values:
+        for name in (value or '').split(','):
+            name = name.strip()
+            if name and name not in authors:
+                authors.append(name)
+    return authors
+
+
+def _parse_int(value):
+    try:
+        return int(value) if value and int(value) > 0 else None
+    except ValueError:
+        return None
+
+
+def _parse_date(value):
+    value = (value or '').strip()
+    for date_format in ('%Y/%m/%d', '%Y-%m-%d'):
+        try:
+            parsed = datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+        return timezone.make_aware(datetime.combine(parsed.date(), time(12)))
+    return None
+
+
+def _parse_rating(value):
+    """Round to the nearest half star; 0/blank means unrated"""
+    try:
+        rating = Decimal(value)
+    except (ArithmeticError, TypeError, ValueError):
+        return None
+    if rating <= 0:
+        return None
+    rating = (rating * 2).quantize(Decimal('1'), rounding=ROUND_HALF_UP) / 2
+    return min(max(rating, Decimal('0.5')), Decimal('5.0'))
+
+
+def _goodreads_row(row):
+    isbns = [_clean_isbn(row.get('ISBN13')), _clean_isbn(row.get('ISBN'))]
+    return ImportRow(
+        title=row.get('Title', '').strip(),
+        authors=_split_authors(row.get('Author'), row.get('Additional Authors')),
+        isbn_13=next((isbn for isbn in isbns if isbn and len(isbn) == 13), None),
+        isbn_10=next((isbn for isbn in isbns if isbn and len(isbn) == 10), None),
+        pages=_parse_int(row.get('Number of Pages')),
+        publish_year=row.get('Original Publication Year') or row.get('Year Published') or None,
+        status=GOODREADS_STATUSES.get(row.get('Exclusive Shelf', '').strip(), 'tbr'),
+        rating=_parse_rating(row.get('My Rating')),
+        review=row.get('My Review') or None,
+        date_read=_parse_date(row.get('Date Read')),
+    )
+
+
+def _storygraph_row(row):
+    isbn = _clean_isbn(row.get('ISBN/UID'))
+    return ImportRow(
+        title=row.get('Title', '').strip(),
+        authors=_split_authors(row.get('Authors')),
+        isbn_13=isbn if isbn and len(isbn) == 13 else None,
+        isbn_10=isbn if isbn and len(isbn) == 10 else None,
+        status=STORYGRAPH_STATUSES.get(row.get('Read Status', '').strip(), 'tbr'),
+        rating=_parse_rating(row.get('Star Rating')),
+        review=row.get('Review') or None,
+        date_read=_parse_date(row.get('Last Date Read')),
+    )
+
+
+def detect_format(header):
+    if 'Exclusive Shelf' in header:
+        return 'goodreads'
+    if 'Read Status' in header:
+        return 'storygraph'
+    raise ImportFormatError('Unrecognized export: expected a Goodreads or StoryGraph CSV')
+
+
+def parse_export(stream):
+    """Yield (line_number, ImportRow or error message) from a CSV text stream"""
+    reader = csv.DictReader(stream)
+    parse_row = {
+        'goodreads': _goodreads_row,
+        'storygraph': _storygraph_row,
+    }[detect_format(reader.fieldnames or [])]
+
+    for row in reader:
+        try:
+            parsed = parse_row(row)
+        except Exception as e:
+            yield reader.line_num, f'Could not parse row: {e}'
+            continue
+        if not parsed.title:
+            yield reader.line_num, 'Missing title'
+            continue
+        yield reader.line_num, parsed
+
+
+# Writing
+
+def _resolve_books(rows):
+    """Map each row's key to a Book, creating the ones the catalog lacks"""
+    isbn_13s = {row.isbn_13 for row in rows if row.isbn_13}
+    isbn_10s = {row.isbn_10 for row in rows if row.isbn_10}
+    keys = {row.key for row in rows}
+
+    existing = Book.objects.filter(
+        Q(open_library_id__in=keys) | Q(isbn_13__in=isbn_13s) | Q(isbn_10__in=isbn_10s)
+    )
+    by_key, by_isbn_13, by_isbn_10 = {}, {}, {}
+    for book in existing:
+        by_key[book.open_library_id] = book
+        if book.isbn_13:
+            by_isbn_13.setdefault(book.isbn_13, book)
+        if book.isbn_10:
+            by_isbn_10.setdefault(book.isbn_10, book)
+
+    resolved = {}
+    missing = {}
+    for row in rows:
+        book = (by_key.get(row.key) or by_isbn_13.get(row.isbn_13) or by_isbn_10.get(row.isbn_10))
+        if book is not None:
+            resolved[row.key] = book
+        elif row.key not in missing:
+            missing[row.key] = Book(
+                open_library_id=row.key,
+                title=row.title[:500],
+                authors=row.authors,
+                pages=row.pages,
+                isbn_10=row.isbn_10,
+                isbn_13=row.isbn_13,
+                publish_date=row.publish_year,
+            )
+
+    created = []
+    if missing:
+        Book.objects.bulk_create(missing.values(), ignore_conflicts=True)
+        created = list(Book.objects.filter(open_library_id__in=missing.keys()))
+        sync_authors_and_genres(created)
+        enrichment.enqueue(created)
+        covers.enqueue(created)
+        resolved.update((book.open_library_id, book) for book in created)
+
+    return resolved, len(created)
+
+
+def _import_chunk(user, rows, result):
+    with transaction.atomic():
+        books, books_created = _resolve_books(rows)
+        result.books_created += books_created
+
+        in_library = set(UserBook.objects.filter(
+            user=user, book__in=[book.pk for book in books.values()]
+        ).values_list('book_id', flat=True))
+
+        user_books = {}
+        ratings = {}
+        for row in rows:
+            book = books[row.key]
+            if book.pk in in_library:
+                result.already_in_library += 1
+                continue
+            if book.pk in user_books:
+                continue
+            finished = row.status == 'finished'
+            user_books[book.pk] = UserBook(
+                user=user,
+                book=book,
+                status=row.status,
+                date_started=row.date_read if finished else None,
+                date_finished=row.date_read if finished else None,
+            )
+            if row.rating is not None:
+                ratings[book.pk] = Rating(
+                    user=user,
+                    book=book,
+                    rating_type='overall',
+                    rating=row.rating,
+                    review=row.review,
+                )
+
+        UserBook.objects.bulk_create(user_books.values(), ignore_conflicts=True)
+        Rating.objects.bulk_create(ratings.values(), ignore_conflicts=True)
+        bulk_saved.send(sender=UserBook, instances=list(user_books.values()))
+        bulk_saved.send(sender=Rating, instances=list(ratings.values()))
+        result.added += len(user_books)
+        result.ratings += len(ratings)
+
+
+def import_library(user, stream, batch_size=DEFAULT_BATCH_SIZE):
+    """Import a CSV export for `user`, yielding an ImportResult after each chunk.
+
+    `stream` is a text stream; the last yielded result holds the final totals.
+    """
+    result = ImportResult()
+    parsed = parse_export(stream)
+
+    while True:
+        chunk = list(islice(parsed, batch_size))
+        if not chunk:
+            break
+
+        rows = []
+        for line_number, row in chunk:
+            result.rows += 1
+            if isinstance(row, str):
+                result.add_error(line_number, row)
+            else:
+                rows.append(row)
+
+        if rows:
+            _import_chunk(user, rows, result)
+        yield result
+
+
+def open_text(file):
+    """Decode a binary file object line by line for incremental CSV parsing"""
+    return codecs.getreader('utf-8-sig')(file, errors='replace')
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from apps.books import covers
+from apps.books.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Download queued book covers into the local thumbnail cache'
+
+    def add_arguments(self, parser):
+        options = covers.get_options()
+        parser.add_argument('--concurrency', type=int, default=options['CONCURRENCY'])
+        parser.add_argument('--batch-size', type=int, default=options['BATCH_SIZE'])
+        parser.add_argument(
+            '--rate', type=float, default=options['RATE_PER_HOST'],
+            help='Requests per second to each host (0 for no limit)'
+        )
+        parser.add_argument('--limit', type=int, help='Stop after trying this many covers')
+        parser.add_argument(
+            '--enqueue-missing', action='store_true',
+            help='First queue every catalog book with a cover that was never queued'
+        )
+        parser.add_argument('--evict', action='store_true', help='Only evict covers down to the size cap')
+
+    def handle(self, *args, **options):
+        if options['evict']:
+            self.stdout.write(self.style.SUCCESS(f'Evicted {covers.evict()} covers'))
+            return
+
+        if options['enqueue_missing']:
+            books = Book.objects.filter(cover_url__isnull=False, cover_image__isnull=True).exclude(cover_url='')
+            covers.enqueue(books.only('id', 'cover_url').iterator())
+
+        tried = stored = 0
+        for tried, stored in covers.run_worker(limit=options['limit'], options={
+            'CONCURRENCY': options['concurrency'],
+            'BATCH_SIZE': options['batch_size'],
+            'RATE_PER_HOST': options['rate'],
+        }):
+            self.stdout.write(f'{tried} covers tried, {stored} cached')
+
+        stats = covers.cache_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Cached {stored} of {tried} covers; {stats['done']} cached "
+            f"({stats['bytes'] / 1024 / 1024:.1f} MB), {stats['pending']} pending, "
+            f"{stats['failed']} failed, {stats['evicted']} evicted"
+        ))
@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.books import enrichment
+from apps.books.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Fill in book details from Open Library for queued books'
+
+    def add_arguments(self, parser):
+        options = enrichment.get_options()
+        parser.add_argument('--concurrency', type=int, default=options['CONCURRENCY'])
+        parser.add_argument('--batch-size', type=int, default=options['BATCH_SIZE'])
+        parser.add_argument(
+            '--rate', type=float, default=options['RATE_PER_HOST'],
+            help='Requests per second to each host (0 for no limit)'
+        )
+        parser.add_argument('--limit', type=int, help='Stop after claiming this many tasks')
+        parser.add_argument(
+            '--enqueue-missing', action='store_true',
+            help='First queue every catalog book without a description'
+        )
+        parser.add_argument('--retry-failed', action='store_true', help='Re-queue failed tasks first')
+        parser.add_argument(
+            '--poll', type=float, default=0,
+            help='Keep running, checking an empty queue every POLL seconds'
+        )
+
+    def handle(self, *args, **options):
+        if options['enqueue_missing']:
+            books = Book.objects.filter(description__isnull=True, enrichment_task__isnull=True)
+            enrichment.enqueue(books.only('id', 'open_library_id', 'isbn_10', 'isbn_13').iterator())
+        if options['retry_failed']:
+            self.stdout.write(f"Re-queued {enrichment.retry_failed()} failed tasks")
+
+        worker_options = {
+            'CONCURRENCY': options['concurrency'],
+            'BATCH_SIZE': options['batch_size'],
+            'RATE_PER_HOST': options['rate'],
+        }
+        self.stdout.write(f'Queue: {self._format(enrichment.queue_stats())}')
+
+        metrics = None
+        while True:
+            for metrics in enrichment.run_worker(limit=options['limit'], options=worker_options):
+                self.stdout.write(
+                    f'{metrics.claimed} claimed: {metrics.enriched} enriched, {metrics.retried} retrying, '
+                    f'{metrics.failed} failed ({metrics.books_per_second:.1f} books/s, '
+                    f'{metrics.requests_per_second:.1f} requests/s)'
+                )
+            if not options['poll'] or options['limit']:
+                break
+            time.sleep(options['poll'])
+
+        if metrics is None:
+            self.stdout.write('Nothing to enrich')
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Enriched {metrics.enriched} books in {metrics.elapsed:.1f}s '
+                f'({metrics.books_per_second:.1f} books/s)'
+            ))
+        self.stdout.write(f'Queue: {self._format(enrichment.queue_stats())}')
+
+    def _format(self, stats):
+        return ', '.join(f'{count} {status}' for status, count in stats.items())
@@ -0,0 +1,43 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.books import importers
+
+
+class Command(BaseCommand):
+    help = 'Import a Goodreads or StoryGraph CSV export into a user\'s library'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('path', help='Path to the exported CSV file')
+        parser.add_argument(
+            '--batch-size', type=int, default=importers.DEFAULT_BATCH_SIZE,
+            help='Rows written per transaction'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['username']}' does not exist")
+
+        result = importers.ImportResult()
+        try:
+            with open(options['path'], 'rb') as file:
+                for result in importers.import_library(
+                    user, importers.open_text(file), batch_size=options['batch_size']
+                ):
+                    self.stdout.write(
+                        f'{result.rows} rows processed: {result.added} added, '
+                        f'{result.books_created} new books, {result.error_count} errors'
+                    )
+        except (OSError, importers.ImportFormatError) as e:
+            raise CommandError(str(e))
+
+        for error in result.errors:
+            self.stderr.write(f"Line {error['line']}: {error['error']}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.added} books ({result.already_in_library} already in library, '
+            f'{result.ratings} ratings) from {result.rows} rows'
+        ))
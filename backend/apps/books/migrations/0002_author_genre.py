@@ -0,0 +1,76 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Author',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BookGenre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='books.book')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Genre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('books', models.ManyToManyField(related_name='genre_set', through='books.BookGenre', to='books.book')),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='bookgenre',
+            name='genre',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='books.genre'),
+        ),
+        migrations.CreateModel(
+            name='BookAuthor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='books.author')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='books.book')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='books',
+            field=models.ManyToManyField(related_name='author_set', through='books.BookAuthor', to='books.book'),
+        ),
+        migrations.AddIndex(
+            model_name='bookgenre',
+            index=models.Index(fields=['genre', 'book'], name='books_bookg_genre_i_02cd05_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='bookgenre',
+            unique_together={('book', 'genre')},
+        ),
+        migrations.AddIndex(
+            model_name='bookauthor',
+            index=models.Index(fields=['author', 'book'], name='books_booka_author__d8e270_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='bookauthor',
+            unique_together={('book', 'author')},
+        ),
+    ]
@@ -0,0 +1,61 @@
+from django.db import migrations
+
+
+BATCH_SIZE = 500
+
+
+def clean_names(values, max_length):
+    names = []
+    for value in values or []:
+        if not isinstance(value, str):
+            continue
+        name = value.strip()[:max_length]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def backfill_authors_genres(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    Author = apps.get_model('books', 'Author')
+    Genre = apps.get_model('books', 'Genre')
+    BookAuthor = apps.get_model('books', 'BookAuthor')
+    BookGenre = apps.get_model('books', 'BookGenre')
+
+    books = Book.objects.order_by('pk').values_list('pk', 'authors', 'genres')
+    last_pk = 0
+    while True:
+        batch = list(books.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            break
+        last_pk = batch[-1][0]
+
+        book_authors = {pk: clean_names(authors, 255) for pk, authors, _ in batch}
+        book_genres = {pk: clean_names(genres, 255) for pk, _, genres in batch}
+        author_names = {name for names in book_authors.values() for name in names}
+        genre_names = {name for names in book_genres.values() for name in names}
+
+        Author.objects.bulk_create([Author(name=name) for name in author_names], ignore_conflicts=True)
+        Genre.objects.bulk_create([Genre(name=name) for name in genre_names], ignore_conflicts=True)
+        author_ids = dict(Author.objects.filter(name__in=author_names).values_list('name', 'pk'))
+        genre_ids = dict(Genre.objects.filter(name__in=genre_names).values_list('name', 'pk'))
+
+        BookAuthor.objects.bulk_create([
+            BookAuthor(book_id=pk, author_id=author_ids[name])
+            for pk, names in book_authors.items() for name in names
+        ], ignore_conflicts=True)
+        BookGenre.objects.bulk_create([
+            BookGenre(book_id=pk, genre_id=genre_ids[name])
+            for pk, names in book_genres.items() for name in names
+        ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0002_author_genre'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_authors_genres, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+from django.db import migrations
+
+
+# Author names joined by spaces. JSONField stores \u escapes for non-ASCII
+# text, so the raw column would never match "García"
+SQLITE_AUTHORS = "(SELECT coalesce(group_concat(value, ' '), '') FROM json_each({}))"
+
+SQLITE_FORWARD = [
+    # Regular FTS5 table keyed by Book.id
+    "CREATE VIRTUAL TABLE books_book_fts USING fts5(title, authors, isbn, tokenize = 'unicode61 remove_diacritics 2')",
+    """
+    INSERT INTO books_book_fts (rowid, title, authors, isbn)
+    SELECT id, title, %s, coalesce(isbn_10, '') || ' ' || coalesce(isbn_13, '') FROM books_book
+    """ % SQLITE_AUTHORS.format('authors'),
+    """
+    CREATE TRIGGER books_book_fts_insert AFTER INSERT ON books_book BEGIN
+        INSERT INTO books_book_fts (rowid, title, authors, isbn)
+        VALUES (new.id, new.title, %s, coalesce(new.isbn_10, '') || ' ' || coalesce(new.isbn_13, ''));
+    END
+    """ % SQLITE_AUTHORS.format('new.authors'),
+    """
+    CREATE TRIGGER books_book_fts_update AFTER UPDATE OF title, authors, isbn_10, isbn_13 ON books_book BEGIN
+        DELETE FROM books_book_fts WHERE rowid = old.id;
+        INSERT INTO books_book_fts (rowid, title, authors, isbn)
+        VALUES (new.id, new.title, %s, coalesce(new.isbn_10, '') || ' ' || coalesce(new.isbn_13, ''));
+    END
+    """ % SQLITE_AUTHORS.format('new.authors'),
+    """
+    CREATE TRIGGER books_book_fts_delete AFTER DELETE ON books_book BEGIN
+        DELETE FROM books_book_fts WHERE rowid = old.id;
+    END
+    """,
+]
+
+SQLITE_REVERSE = [
+    'DROP TRIGGER IF EXISTS books_book_fts_insert',
+    'DROP TRIGGER IF EXISTS books_book_fts_update',
+    'DROP TRIGGER IF EXISTS books_book_fts_delete',
+    'DROP TABLE IF EXISTS books_book_fts',
+]
+
+# Expression must match PG_DOCUMENT in apps/books/catalog_search.py
+POSTGRES_FORWARD = [
+    """
+    CREATE INDEX books_book_search_idx ON books_book USING GIN ((
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(authors::text, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(isbn_10, '') || ' ' || coalesce(isbn_13, '')), 'C')
+    ))
+    """,
+]
+
+POSTGRES_REVERSE = [
+    'DROP INDEX IF EXISTS books_book_search_idx',
+]
+
+
+def run_for_vendor(sqlite_statements, postgres_statements):
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        statements = {'sqlite': sqlite_statements, 'postgresql': postgres_statements}.get(vendor, [])
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_userbook_date_added_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor(SQLITE_FORWARD, POSTGRES_FORWARD),
+            run_for_vendor(SQLITE_REVERSE, POSTGRES_REVERSE),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0006_book_full_text_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['isbn_13'], name='books_book_isbn_13_a77f18_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['isbn_10'], name='books_book_isbn_10_0cb43a_idx'),
+        ),
+    ]
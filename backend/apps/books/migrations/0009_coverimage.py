@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0008_enrichmenttask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoverImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_url', models.URLField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('done', 'Done'), ('failed', 'Failed'), ('evicted', 'Evicted')], default='pending', max_length=10)),
+                ('attempts', models.IntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('small_digest', models.CharField(blank=True, default='', max_length=64)),
+                ('medium_digest', models.CharField(blank=True, default='', max_length=64)),
+                ('bytes', models.IntegerField(default=0)),
+                ('last_accessed', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='cover_image', to='books.book')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'available_at'], name='books_cover_status_37afc5_idx'), models.Index(fields=['status', 'last_accessed'], name='books_cover_status_5b9366_idx'), models.Index(fields=['small_digest'], name='books_cover_small_d_8cceae_idx'), models.Index(fields=['medium_digest'], name='books_cover_medium__fc698b_idx')],
+            },
+        ),
+    ]
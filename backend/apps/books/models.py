@@ -1,6 +1,9 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
+
+from .signals import bulk_saved
 
 
 class Book(models.Model):
@@ -34,6 +37,10 @@ class Book(models.Model):
     
     class Meta:
         ordering = ['title']
+        indexes = [
+            models.Index(fields=['isbn_13']),
+            models.Index(fields=['isbn_10']),
+        ]
     
     def __str__(self):
         author_str = ', '.join(self.authors[:2])  # First 2 authors
@@ -44,6 +51,142 @@ class Book(models.Model):
     @property
     def primary_author(self):
         return self.authors[0] if self.authors else "Unknown Author"
+    
+    @staticmethod
+    def fields_from_search_result(book_data):
+        """Model field values for a book from a search_books result"""
+        return {
+            'title': book_data.get('title', 'Unknown Title'),
+            'authors': book_data.get('authors', []),
+            'pages': book_data.get('pages'),
+            'genres': book_data.get('subjects', []),
+            'cover_url': book_data.get('cover_url'),
+            'isbn_10': book_data.get('isbn'),
+            'publish_date': str(book_data.get('first_publish_year', '')) if book_data.get('first_publish_year') else None
+        }
+    
+    @property
+    def author_names(self):
+        """Author names as stored in the Author table"""
+        return _clean_names(self.authors, Author._meta.get_field('name').max_length)
+    
+    @property
+    def genre_names(self):
+        """Genre names as stored in the Genre table"""
+        return _clean_names(self.genres, Genre._meta.get_field('name').max_length)
+    
+    def sync_authors_and_genres(self):
+        """Mirror the authors/genres JSON lists into the normalized tables"""
+        sync_authors_and_genres([self])
+
+
+def sync_authors_and_genres(books):
+    """Link each saved book to exactly the Author/Genre rows for its JSON lists, in bulk"""
+    book_authors = {book.pk: book.author_names for book in books}
+    book_genres = {book.pk: book.genre_names for book in books}
+    author_names = {name for names in book_authors.values() for name in names}
+    genre_names = {name for names in book_genres.values() for name in names}
+    
+    Author.objects.bulk_create(
+        [Author(name=name) for name in author_names], ignore_conflicts=True
+    )
+    Genre.objects.bulk_create(
+        [Genre(name=name) for name in genre_names], ignore_conflicts=True
+    )
+    author_ids = dict(Author.objects.filter(name__in=author_names).values_list('name', 'id'))
+    genre_ids = dict(Genre.objects.filter(name__in=genre_names).values_list('name', 'id'))
+    
+    _replace_links(BookAuthor, 'author_id', {
+        book_id: {author_ids[name] for name in names} for book_id, names in book_authors.items()
+    })
+    _replace_links(BookGenre, 'genre_id', {
+        book_id: {genre_ids[name] for name in names} for book_id, names in book_genres.items()
+    })
+
+
+def _replace_links(model, field, wanted):
+    """Make `model` link each book in `wanted` ({book_id: target ids}) to exactly those targets"""
+    existing = set()
+    stale = []
+    for pk, book_id, target_id in model.objects.filter(book_id__in=wanted).values_list('pk', 'book_id', field):
+        if target_id in wanted[book_id]:
+            existing.add((book_id, target_id))
+        else:
+            stale.append(pk)
+    
+    if stale:
+        model.objects.filter(pk__in=stale).delete()
+    missing = [
+        model(book_id=book_id, **{field: target_id})
+        for book_id, target_ids in wanted.items() for target_id in target_ids
+        if (book_id, target_id) not in existing
+    ]
+    if missing:
+        model.objects.bulk_create(missing, ignore_conflicts=True)
+
+
+def _clean_names(values, max_length):
+    """Strip, truncate and de-duplicate a list of names, keeping order"""
+    names = []
+    for value in values or []:
+        if not isinstance(value, str):
+            continue
+        name = value.strip()[:max_length]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+class Author(models.Model):
+    """Normalized author, linked to books through BookAuthor"""
+    
+    name = models.CharField(max_length=255, unique=True)
+    books = models.ManyToManyField(Book, through='BookAuthor', related_name='author_set')
+    
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+
+
+class Genre(models.Model):
+    """Normalized genre/subject, linked to books through BookGenre"""
+    
+    name = models.CharField(max_length=255, unique=True)
+    books = models.ManyToManyField(Book, through='BookGenre', related_name='genre_set')
+    
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+
+
+class BookAuthor(models.Model):
+    """Through table between Book and Author"""
+    
+    book = models.ForeignKey(Book, on_delete=models.CASCADE)
+    author = models.ForeignKey(Author, on_delete=models.CASCADE)
+    
+    class Meta:
+        unique_together = ['book', 'author']
+        indexes = [
+            models.Index(fields=['author', 'book']),
+        ]
+
+
+class BookGenre(models.Model):
+    """Through table between Book and Genre"""
+    
+    book = models.ForeignKey(Book, on_delete=models.CASCADE)
+    genre = models.ForeignKey(Genre, on_delete=models.CASCADE)
+    
+    class Meta:
+        unique_together = ['book', 'genre']
+        indexes = [
+            models.Index(fields=['genre', 'book']),
+        ]
 
 
 class UserBook(models.Model):
@@ -72,10 +215,28 @@ class UserBook(models.Model):
     class Meta:
         unique_together = ['user', 'book']
         ordering = ['-date_added']
+        indexes = [
+            models.Index(fields=['user', 'status', 'date_finished']),
+            models.Index(fields=['user', 'date_started']),
+            models.Index(fields=['user', '-date_added', '-id']),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.book.title} ({self.get_status_display()})"
     
+    def apply_status(self, new_status, now=None):
+        """Change status, stamping start/finish dates on the transition"""
+        now = now or timezone.now()
+        
+        if new_status == 'reading' and self.status != 'reading':
+            self.date_started = now
+        elif new_status == 'finished' and self.status != 'finished':
+            self.date_finished = now
+            if not self.date_started:
+                self.date_started = now
+        
+        self.status = new_status
+    
     @property
     def reading_days(self):
         """Calculate days spent reading if finished"""
@@ -128,6 +289,119 @@ class Rating(models.Model):
     class Meta:
         unique_together = ['user', 'book', 'rating_type']
         ordering = ['rating_type']
+        indexes = [
+            models.Index(fields=['user', 'rating_type']),
+        ]
     
     def __str__(self):
-        return f"{self.user.username} - {self.book.title} - {self.get_rating_type_display()}: {self.rating}"
\ No newline at end of file
+        return f"{self.user.username} - {self.book.title} - {self.get_rating_type_display()}: {self.rating}"
+
+
+def upsert_ratings(ratings):
+    """Insert or update unsaved Rating objects in one statement.
+    
+    Later entries win when the same (user, book, rating_type) appears twice.
+    Returns the stored rows, re-read so ids and timestamps are populated.
+    """
+    unique = {}
+    for rating in ratings:
+        unique[(rating.user_id, rating.book_id, rating.rating_type)] = rating
+    if not unique:
+        return []
+    
+    Rating.objects.bulk_create(
+        unique.values(),
+        update_conflicts=True,
+        unique_fields=['user', 'book', 'rating_type'],
+        update_fields=['rating', 'review', 'updated_at']
+    )
+    
+    stored = list(Rating.objects.filter(
+        user_id__in={key[0] for key in unique},
+        book_id__in={key[1] for key in unique},
+        rating_type__in={key[2] for key in unique}
+    ).select_related('book'))
+    stored = [
+        rating for rating in stored
+        if (rating.user_id, rating.book_id, rating.rating_type) in unique
+    ]
+    bulk_saved.send(sender=Rating, instances=stored)
+    return stored
+
+
+class EnrichmentTask(models.Model):
+    """Queued Open Library lookup filling in a book's details (see enrichment.py)"""
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    # One task per book, so enqueueing a book twice is a no-op
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, related_name='enrichment_task')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    
+    # Pending tasks wait until available_at; running ones hold a lease that
+    # expires at available_at, after which another worker may claim them
+    available_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.CharField(max_length=32, blank=True, default='')
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['available_at']
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+            models.Index(fields=['claim_token']),
+        ]
+    
+    def __str__(self):
+        return f"{self.book.title} ({self.get_status_display()})"
+
+
+class CoverImage(models.Model):
+    """Locally cached thumbnails of a book's cover (see covers.py)"""
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+        ('evicted', 'Evicted'),
+    ]
+    
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, related_name='cover_image')
+    source_url = models.URLField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    available_at = models.DateTimeField(default=timezone.now)
+    
+    # SHA-256 of each stored thumbnail, which is also its file name
+    small_digest = models.CharField(max_length=64, blank=True, default='')
+    medium_digest = models.CharField(max_length=64, blank=True, default='')
+    bytes = models.IntegerField(default=0)
+    
+    # Eviction order; only refreshed every COVER_CACHE['ACCESS_RESOLUTION'] seconds
+    last_accessed = models.DateTimeField(default=timezone.now)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+            models.Index(fields=['status', 'last_accessed']),
+            models.Index(fields=['small_digest']),
+            models.Index(fields=['medium_digest']),
+        ]
+    
+    def __str__(self):
+        return f"{self.book.title} cover ({self.get_status_display()})"
+    
+    def digest(self, size):
+        return self.small_digest if size == 'small' else self.medium_digest
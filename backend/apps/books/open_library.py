@@ -0,0 +1,367 @@
+"""
+Client for all Open Library traffic.
+
+Wraps pooled httpx clients (a shared sync client for WSGI views and one
+async client per event loop for async views) with per-host concurrency
+limits, retries with exponential backoff inside an overall DEADLINE (so a
+hung upstream costs one timeout, not one per attempt) and a circuit breaker
+per host that fails fast while that host is degraded, so failing cover
+downloads from covers.openlibrary.org don't cut off search on
+openlibrary.org.
+"""
+
+import asyncio
+import random
+import threading
+import time
+import weakref
+from urllib.parse import urlsplit
+
+import httpx
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+DEFAULTS = {
+    'TIMEOUT': 10,  # Seconds per attempt
+    'DEADLINE': 10,  # Seconds per call, across every attempt and backoff
+    'MAX_CONNECTIONS': 20,
+    'MAX_CONCURRENCY_PER_HOST': 10,
+    'RETRIES': 2,
+    'BACKOFF': 0.2,  # Seconds, doubled on each retry
+    'FAILURE_THRESHOLD': 5,  # Consecutive failures before the circuit opens
+    'RESET_TIMEOUT': 30,  # Seconds the circuit stays open before a trial request
+}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class OpenLibraryError(Exception):
+    """Open Library could not be reached or returned an error"""
+
+
+class CircuitOpenError(OpenLibraryError):
+    """Requests are being short-circuited after repeated upstream failures"""
+
+
+class CircuitBreaker:
+    """Thread-safe consecutive-failure circuit breaker"""
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def before_request(self):
+        """Raise CircuitOpenError unless a request may go through now"""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._trial_in_progress:
+                raise CircuitOpenError('Open Library is unavailable')
+            # Half-open: let a single trial request through
+            self._trial_in_progress = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_progress = False
+
+    def abandon(self):
+        """Release a half-open trial that ended without an outcome (e.g. cancelled)"""
+        with self._lock:
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_progress or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_in_progress = False
+
+
+class OpenLibraryClient:
+    """Pooled, rate-limited and fault-tolerant Open Library client"""
+
+    def __init__(self, base_url, timeout=DEFAULTS['TIMEOUT'],
+                 max_connections=DEFAULTS['MAX_CONNECTIONS'],
+                 max_concurrency_per_host=DEFAULTS['MAX_CONCURRENCY_PER_HOST'],
+                 retries=DEFAULTS['RETRIES'], backoff=DEFAULTS['BACKOFF'],
+                 failure_threshold=DEFAULTS['FAILURE_THRESHOLD'],
+                 reset_timeout=DEFAULTS['RESET_TIMEOUT'], deadline=DEFAULTS['DEADLINE']):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.deadline = deadline
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections
+        )
+        self.max_concurrency_per_host = max_concurrency_per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._breakers = {}
+        self._sync_client = None
+        self._sync_semaphores = {}
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    # Plumbing
+
+    def _url(self, path):
+        return path if path.startswith(('http://', 'https://')) else f'{self.base_url}{path}'
+
+    def _backoff_delay(self, attempt):
+        return self.backoff * (2 ** attempt) * (0.5 + random.random() / 2)
+
+    def _should_retry(self, response):
+        return response.status_code in RETRY_STATUSES
+
+    def _attempt_timeout(self, deadline):
+        # Never wait on an attempt past the call's deadline
+        return max(min(self.timeout, deadline - time.monotonic()), 0.001)
+
+    def _retry_delay(self, attempt, deadline):
+        """Backoff before the next attempt, or None if there's none left in time"""
+        if attempt >= self.retries:
+            return None
+        delay = self._backoff_delay(attempt)
+        if time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+    def breaker_for(self, host):
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return breaker
+
+    @property
+    def breaker(self):
+        """The circuit breaker for base_url's host"""
+        return self.breaker_for(urlsplit(self.base_url).netloc)
+
+    def _get_sync(self, host):
+        with self._lock:
+            if self._sync_client is None:
+                self._sync_client = httpx.Client(
+                    timeout=self.timeout, limits=self.limits, follow_redirects=True
+                )
+            semaphore = self._sync_semaphores.get(host)
+            if semaphore is None:
+                semaphore = self._sync_semaphores[host] = threading.BoundedSemaphore(
+                    self.max_concurrency_per_host
+                )
+            return self._sync_client, semaphore
+
+    def _get_async(self, host):
+        # httpx.AsyncClient and asyncio.Semaphore are bound to the running loop
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            state = self._async_clients.get(loop)
+            if state is None:
+                state = self._async_clients[loop] = {
+                    'client': httpx.AsyncClient(
+                        timeout=self.timeout, limits=self.limits, follow_redirects=True
+                    ),
+                    'semaphores': {},
+                }
+            semaphore = state['semaphores'].get(host)
+            if semaphore is None:
+                semaphore = state['semaphores'][host] = asyncio.Semaphore(
+                    self.max_concurrency_per_host
+                )
+            return state['client'], semaphore
+
+    def _finish(self, breaker, response, error, as_json=False):
+        """Record the outcome of a request with the breaker and unwrap it"""
+        if response is None:
+            breaker.record_failure()
+            raise OpenLibraryError(str(error)) from error
+
+        # A 404 means the upstream is healthy; only server-side errors count
+        if self._should_retry(response):
+            breaker.record_failure()
+        elif as_json and response.is_success:
+            try:
+                data = response.json()
+            except ValueError as e:
+                # An HTML error page or a truncated body served as a 200
+                breaker.record_failure()
+                raise OpenLibraryError(f'Invalid JSON from Open Library: {e}') from e
+            breaker.record_success()
+            return data
+        else:
+            breaker.record_success()
+
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            raise OpenLibraryError(str(e)) from e
+        return response
+
+    # Requests
+
+    def get(self, path, params=None, as_json=False):
+        """GET `path` (relative to base_url, or absolute), returning the response.
+
+        With as_json, returns the decoded body instead; a body that isn't
+        JSON raises OpenLibraryError and counts as a failure.
+        """
+        url = self._url(path)
+        host = urlsplit(url).netloc
+        client, semaphore = self._get_sync(host)
+        breaker = self.breaker_for(host)
+        breaker.before_request()
+        deadline = time.monotonic() + self.deadline
+
+        try:
+            for attempt in range(self.retries + 1):
+                response, error = None, None
+                try:
+                    with semaphore:
+                        response = client.get(url, params=params, timeout=self._attempt_timeout(deadline))
+                    if not self._should_retry(response):
+                        break
+                except httpx.HTTPError as e:
+                    error = e
+                delay = self._retry_delay(attempt, deadline)
+                if delay is None:
+                    break
+                time.sleep(delay)
+        except BaseException:
+            breaker.abandon()
+            raise
+
+        return self._finish(breaker, response, error, as_json)
+
+    async def aget(self, path, params=None, as_json=False):
+        """Async version of get()"""
+        url = self._url(path)
+        host = urlsplit(url).netloc
+        client, semaphore = self._get_async(host)
+        breaker = self.breaker_for(host)
+        breaker.before_request()
+        deadline = time.monotonic() + self.deadline
+
+        try:
+            for attempt in range(self.retries + 1):
+                response, error = None, None
+                try:
+                    async with semaphore:
+                        response = await client.get(url, params=params, timeout=self._attempt_timeout(deadline))
+                    if not self._should_retry(response):
+                        break
+                except httpx.HTTPError as e:
+                    error = e
+                delay = self._retry_delay(attempt, deadline)
+                if delay is None:
+                    break
+                await asyncio.sleep(delay)
+        except BaseException:
+            breaker.abandon()
+            raise
+
+        return self._finish(breaker, response, error, as_json)
+
+    def get_json(self, path, params=None):
+        return self.get(path, params, as_json=True)
+
+    async def aget_json(self, path, params=None):
+        return await self.aget(path, params, as_json=True)
+
+    # Endpoints
+
+    SEARCH_FIELDS = 'key,title,author_name,first_publish_year,isbn,number_of_pages,subject,cover_i'
+
+    def search(self, query, limit=20):
+        """Search Open Library and format the results"""
+        return format_search_results(self.get_json('/search.json', self._search_params(query, limit)))
+
+    async def asearch(self, query, limit=20):
+        return format_search_results(await self.aget_json('/search.json', self._search_params(query, limit)))
+
+    def _search_params(self, query, limit):
+        return {'q': query, 'limit': limit, 'fields': self.SEARCH_FIELDS}
+
+    def close(self):
+        with self._lock:
+            if self._sync_client is not None:
+                self._sync_client.close()
+                self._sync_client = None
+
+
+def format_search_results(data):
+    """Shape an Open Library search.json payload for the API"""
+    books = []
+
+    for book_data in data.get('docs', []):
+        # Format book data
+        book_info = {
+            'open_library_id': book_data.get('key', '').replace('/works/', ''),
+            'title': book_data.get('title', 'Unknown Title'),
+            'authors': book_data.get('author_name', []),
+            'first_publish_year': book_data.get('first_publish_year'),
+            'pages': book_data.get('number_of_pages_median') or book_data.get('number_of_pages'),
+            'subjects': book_data.get('subject', [])[:5],  # Limit subjects
+            'isbn': book_data.get('isbn', [None])[0] if book_data.get('isbn') else None,
+            'cover_id': book_data.get('cover_i'),
+            'cover_url': f"https://covers.openlibrary.org/b/id/{book_data.get('cover_i')}-M.jpg" if book_data.get('cover_i') else None
+        }
+        books.append(book_info)
+
+    return {
+        'books': books,
+        'total': data.get('numFound', 0)
+    }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide client configured by OPEN_LIBRARY_CLIENT"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            options = {**DEFAULTS, **getattr(settings, 'OPEN_LIBRARY_CLIENT', {})}
+            _client = OpenLibraryClient(
+                settings.OPEN_LIBRARY_URL,
+                timeout=options['TIMEOUT'],
+                max_connections=options['MAX_CONNECTIONS'],
+                max_concurrency_per_host=options['MAX_CONCURRENCY_PER_HOST'],
+                retries=options['RETRIES'],
+                backoff=options['BACKOFF'],
+                failure_threshold=options['FAILURE_THRESHOLD'],
+                reset_timeout=options['RESET_TIMEOUT'],
+                deadline=options['DEADLINE'],
+            )
+        return _client
+
+
+@receiver(setting_changed)
+def _reset_client(setting, **kwargs):
+    global _client
+    if setting in ('OPEN_LIBRARY_URL', 'OPEN_LIBRARY_CLIENT'):
+        with _client_lock:
+            if _client is not None:
+                _client.close()
+            _client = None
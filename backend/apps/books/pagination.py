@@ -0,0 +1,25 @@
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+class UserBookCursorPagination(CursorPagination):
+    """Cursor pagination for a user's library, newest additions first"""
+    
+    ordering = ('-date_added', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    
+    def get_paginated_response(self, data):
+        return Response({
+            'books': data,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+        })
+    
+    def get_grouped_paginated_response(self, books_by_status, counts):
+        return Response({
+            'books_by_status': books_by_status,
+            'counts': counts,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+        })
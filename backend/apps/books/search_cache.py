@@ -0,0 +1,205 @@
+"""
+Caching for Open Library search results.
+
+Results are keyed on the normalized query and kept in a bounded in-process
+LRU with a TTL. An optional shared tier in Django's cache framework lets
+several workers reuse each other's results, and concurrent misses for the
+same query are collapsed into a single upstream fetch.
+"""
+
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+
+DEFAULTS = {
+    'BACKEND': 'apps.books.search_cache.SearchCache',
+    'TTL': 60 * 60,
+    'MAX_ENTRIES': 1024,
+    'SHARED_CACHE': None,  # Alias in settings.CACHES, e.g. 'default'
+    'WAIT_TIMEOUT': 15,  # Seconds a follower waits on an in-flight fetch
+}
+
+
+def normalize_query(query):
+    """Case-fold and collapse whitespace so equivalent queries share a key"""
+    return ' '.join(query.casefold().split())
+
+
+class _InFlight:
+    """A fetch in progress that other threads can wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SearchCache:
+    """Two-tier TTL/LRU cache with single-flight fetches"""
+
+    def __init__(self, ttl=DEFAULTS['TTL'], max_entries=DEFAULTS['MAX_ENTRIES'],
+                 shared_cache=None, wait_timeout=DEFAULTS['WAIT_TIMEOUT']):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.shared_cache = caches[shared_cache] if shared_cache else None
+        self.wait_timeout = wait_timeout
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._async_inflight = {}
+        self._lock = threading.Lock()
+
+    def _shared_key(self, key):
+        return 'book-search:' + hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def get(self, query):
+        """Return the cached result for `query`, or None"""
+        key = normalize_query(query)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+
+        if self.shared_cache is not None:
+            value = self.shared_cache.get(self._shared_key(key))
+            if value is not None:
+                self._store_local(key, value)
+                return value
+
+        return None
+
+    def set(self, query, value):
+        key = normalize_query(query)
+        self._store_local(key, value)
+        if self.shared_cache is not None:
+            self.shared_cache.set(self._shared_key(key), value, self.ttl)
+
+    def _store_local(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_or_fetch(self, query, fetch):
+        """Return the cached result for `query`, calling `fetch(query)` on a miss.
+
+        Only one thread fetches a given key at a time; the others wait for
+        its result. Errors are re-raised in every waiter and never cached.
+        """
+        value = self.get(query)
+        if value is not None:
+            return value
+
+        key = normalize_query(query)
+        with self._lock:
+            inflight = self._inflight.get(key)
+            leader = inflight is None
+            if leader:
+                inflight = self._inflight[key] = _InFlight()
+
+        if not leader:
+            if inflight.event.wait(self.wait_timeout):
+                if inflight.error is not None:
+                    raise inflight.error
+                return inflight.result
+            # The leader is taking too long; fetch independently
+            return fetch(query)
+
+        try:
+            inflight.result = fetch(query)
+            self.set(query, inflight.result)
+            return inflight.result
+        except Exception as e:
+            inflight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            inflight.event.set()
+
+    async def aget_or_fetch(self, query, fetch):
+        """Async version of get_or_fetch() where `fetch` is a coroutine function.
+
+        In-flight fetches are shared between tasks on the same event loop.
+        """
+        if self.shared_cache is None:
+            value = self.get(query)
+        else:
+            value = await sync_to_async(self.get)(query)
+        if value is not None:
+            return value
+
+        key = normalize_query(query)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            future = self._async_inflight.get((loop, key))
+            leader = future is None
+            if leader:
+                future = self._async_inflight[(loop, key)] = loop.create_future()
+
+        if not leader:
+            # Shield so a cancelled waiter doesn't cancel the shared fetch
+            return await asyncio.shield(future)
+
+        try:
+            result = await fetch(query)
+            if self.shared_cache is None:
+                self.set(query, result)
+            else:
+                await sync_to_async(self.set)(query, result)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # Mark retrieved when nobody is waiting
+            raise
+        finally:
+            with self._lock:
+                self._async_inflight.pop((loop, key), None)
+
+
+_search_cache = None
+
+
+def get_search_cache():
+    """Return the process-wide search cache configured by BOOK_SEARCH_CACHE"""
+    global _search_cache
+    if _search_cache is None:
+        options = {**DEFAULTS, **getattr(settings, 'BOOK_SEARCH_CACHE', {})}
+        backend = import_string(options['BACKEND'])
+        _search_cache = backend(
+            ttl=options['TTL'],
+            max_entries=options['MAX_ENTRIES'],
+            shared_cache=options['SHARED_CACHE'],
+            wait_timeout=options['WAIT_TIMEOUT'],
+        )
+    return _search_cache
+
+
+@receiver(setting_changed)
+def _reset_search_cache(setting, **kwargs):
+    global _search_cache
+    if setting in ('BOOK_SEARCH_CACHE', 'CACHES'):
+        _search_cache = None
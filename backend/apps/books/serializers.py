@@ -1,11 +1,44 @@
 from rest_framework import serializers
-from .models import Book, UserBook, Rating
+from .models import Book, UserBook, Rating, CoverImage
+from . import covers
 
 
-class BookSerializer(serializers.ModelSerializer):
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """ModelSerializer that accepts a `fields` argument to limit its output.
+    
+    Dotted names (e.g. `book.title`) restrict nested dynamic serializers.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        
+        if fields is None:
+            return
+        
+        allowed = set()
+        nested = {}
+        for name in fields:
+            parent, _, child = name.partition('.')
+            allowed.add(parent)
+            if child:
+                nested.setdefault(parent, []).append(child)
+        
+        for name in set(self.fields) - allowed:
+            self.fields.pop(name)
+        
+        for name, child_fields in nested.items():
+            field = self.fields.get(name)
+            if isinstance(field, DynamicFieldsModelSerializer):
+                self.fields[name] = field.__class__(read_only=True, fields=child_fields)
+
+
+class BookSerializer(DynamicFieldsModelSerializer):
     """Serializer for Book model"""
     
     primary_author = serializers.ReadOnlyField()
+    cover_small_url = serializers.SerializerMethodField()
+    cover_medium_url = serializers.SerializerMethodField()
     
     class Meta:
         model = Book
@@ -13,11 +46,28 @@ class BookSerializer(serializers.ModelSerializer):
             'id', 'open_library_id', 'isbn_10', 'isbn_13',
             'title', 'authors', 'primary_author', 'description',
             'publisher', 'publish_date', 'pages', 'genres',
-            'language', 'cover_url', 'created_at', 'updated_at'
+            'language', 'cover_url', 'cover_small_url', 'cover_medium_url',
+            'created_at', 'updated_at'
         ]
+    
+    # Locally cached thumbnails, falling back to the remote cover. Select
+    # related 'cover_image' when serializing many books.
+    
+    def _cover_url(self, book, size):
+        try:
+            cover = book.cover_image
+        except CoverImage.DoesNotExist:
+            cover = None
+        return covers.url_for(cover, size) or book.cover_url
+    
+    def get_cover_small_url(self, book):
+        return self._cover_url(book, 'small')
+    
+    def get_cover_medium_url(self, book):
+        return self._cover_url(book, 'medium')
 
 
-class UserBookSerializer(serializers.ModelSerializer):
+class UserBookSerializer(DynamicFieldsModelSerializer):
     """Serializer for UserBook model"""
     
     book = BookSerializer(read_only=True)
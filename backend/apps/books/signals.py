@@ -0,0 +1,7 @@
+from django.dispatch import Signal
+
+
+# Sent with `instances` after rows are written by bulk_create()/bulk_update(),
+# which skip post_save. Instances that were loaded from the database before
+# being changed still carry whatever state their post_init receivers recorded.
+bulk_saved = Signal()
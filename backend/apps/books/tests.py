@@ -1,3 +1,936 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import Book, UserBook, Rating, Author, Genre, BookAuthor, BookGenre, EnrichmentTask, CoverImage
+from . import covers, enrichment, importers
+from .search_cache import SearchCache, get_search_cache
+from .catalog_search import search_catalog
+from .open_library import OpenLibraryClient, OpenLibraryError, CircuitOpenError, get_client
+
+
+class StubOpenLibrary:
+    """Local HTTP server standing in for openlibrary.org"""
+
+    def __init__(self, delay=0, status=200, statuses=None, routes=None):
+        stub = self
+        self.requests = []
+        self.connections = set()
+        self.delay = delay
+        self.status = status
+        self.statuses = list(statuses or [])  # Served once each before `status`
+        self.routes = routes or {}  # Path (without query) -> JSON body, raw bytes, or None for a 404
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                stub.requests.append(self.path)
+                stub.connections.add(self.client_address)
+                time.sleep(stub.delay)
+                path = self.path.split('?')[0]
+                data = stub.routes.get(path, {
+                    'numFound': 1,
+                    'docs': [{'key': '/works/OL1W', 'title': 'Dune', 'author_name': ['Frank Herbert']}],
+                })
+                body = data if isinstance(data, bytes) else json.dumps(data or {'error': 'notfound'}).encode()
+                if path in stub.routes and data is None:
+                    self.send_response(404)
+                else:
+                    self.send_response(stub.statuses.pop(0) if stub.statuses else stub.status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def upstream(stub, **client_options):
+    """Point Open Library traffic at `stub` with a fresh search cache and client"""
+    return override_settings(
+        OPEN_LIBRARY_URL=stub.url,
+        BOOK_SEARCH_CACHE={},
+        OPEN_LIBRARY_CLIENT={'BACKOFF': 0, **client_options},
+    )
+
+
+class AddBookToLibraryTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_add_links_authors_and_genres(self):
+        response = self.client.post('/api/books/add/', {
+            'book': {
+                'open_library_id': 'OL1W',
+                'title': 'The Dispossessed',
+                'authors': ['Ursula K. Le Guin', 'Ursula K. Le Guin '],
+                'subjects': ['Science Fiction', 'Utopias'],
+            }
+        }, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        book = Book.objects.get(open_library_id='OL1W')
+        self.assertEqual(
+            list(book.author_set.values_list('name', flat=True)), ['Ursula K. Le Guin']
+        )
+        self.assertEqual(
+            sorted(book.genre_set.values_list('name', flat=True)), ['Science Fiction', 'Utopias']
+        )
+
+    def test_sync_replaces_stale_links(self):
+        book = Book.objects.create(open_library_id='OL1W', title='Dune', authors=['Frank Herbert'],
+                                   genres=['Science Fiction', 'Ecology'])
+        book.sync_authors_and_genres()
+
+        book.authors = ['Frank Herbert', 'Brian Herbert']
+        book.genres = ['Science Fiction']
+        book.sync_authors_and_genres()
+
+        self.assertEqual(
+            sorted(book.author_set.values_list('name', flat=True)), ['Brian Herbert', 'Frank Herbert']
+        )
+        self.assertEqual(list(book.genre_set.values_list('name', flat=True)), ['Science Fiction'])
+
+    def test_shared_authors_are_reused(self):
+        for key in ['OL1W', 'OL2W']:
+            self.client.post('/api/books/add/', {
+                'book': {'open_library_id': key, 'authors': ['Octavia E. Butler'], 'subjects': ['Fiction']}
+            }, format='json')
+
+        self.assertEqual(Author.objects.count(), 1)
+        self.assertEqual(Genre.objects.count(), 1)
+        self.assertEqual(BookAuthor.objects.count(), 2)
+        self.assertEqual(BookGenre.objects.count(), 2)
+
+
+class MyBooksTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for i in range(25):
+            book = Book.objects.create(open_library_id=f'OL{i}W', title=f'Book {i}', pages=100,
+                                       description='A long description')
+            UserBook.objects.create(user=self.user, book=book, status='tbr' if i % 2 else 'reading',
+                                    current_page=10)
+
+    def test_cursor_pagination_walks_every_book(self):
+        seen = []
+        url = '/api/books/my-books/'
+        while url:
+            data = self.client.get(url).data
+            seen.extend(user_book['id'] for user_book in data['books'])
+            url = data['next']
+
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+        self.assertEqual(seen, sorted(seen, reverse=True))
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        # One query for the page, no per-row book lookups
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/books/my-books/', {'page_size': 25})
+        self.assertEqual(len(response.data['books']), 25)
+        self.assertEqual(response.data['books'][0]['progress_percentage'], 10.0)
+
+    def test_sparse_fieldset(self):
+        response = self.client.get('/api/books/my-books/', {'fields': 'id,status,book.title,book.pages'})
+
+        user_book = response.data['books'][0]
+        self.assertEqual(set(user_book), {'id', 'status', 'book'})
+        self.assertEqual(set(user_book['book']), {'title', 'pages'})
+
+    def test_multi_status_is_grouped_with_counts(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/books/my-books/', {'status': 'tbr,reading,finished'})
+
+        self.assertEqual(response.data['counts'], {'tbr': 12, 'reading': 13, 'finished': 0})
+        self.assertEqual(len(response.data['books_by_status']['tbr']) +
+                         len(response.data['books_by_status']['reading']), 20)
+        self.assertTrue(all(user_book['status'] == 'tbr'
+                            for user_book in response.data['books_by_status']['tbr']))
+
+    def test_multi_status_rejects_unknown_status(self):
+        response = self.client.get('/api/books/my-books/', {'status': 'tbr,wishlist'})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_empty_status_entries_are_ignored(self):
+        response = self.client.get('/api/books/my-books/', {'status': 'tbr,'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({user_book['status'] for user_book in response.data['books']}, {'tbr'})
+
+        for value in (',', '', 'wishlist'):
+            response = self.client.get('/api/books/my-books/', {'status': value})
+            self.assertEqual(response.status_code, 400, value)
+
+
+    def test_single_user_book_detail(self):
+        user_book = UserBook.objects.filter(user=self.user).first()
+
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/books/user-book/{user_book.id}/')
+        self.assertEqual(response.data['user_book']['id'], user_book.id)
+        self.assertEqual(response.data['user_book']['book']['title'], user_book.book.title)
+
+        other = User.objects.create_user(username='other', password='secret')
+        foreign = UserBook.objects.create(user=other, book=user_book.book)
+        self.assertEqual(self.client.get(f'/api/books/user-book/{foreign.id}/').status_code, 404)
+
+
+class SearchCacheTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_repeated_queries_hit_upstream_once(self):
+        with StubOpenLibrary() as stub, upstream(stub):
+            first = self.client.get('/api/books/search/', {'q': 'Dune'})
+            second = self.client.get('/api/books/search/', {'q': '  dune '})
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first.data['books'][0]['open_library_id'], 'OL1W')
+        self.assertEqual(len(stub.requests), 1)
+
+    def test_upstream_errors_are_not_cached(self):
+        with StubOpenLibrary(status=500) as stub, upstream(stub, RETRIES=0):
+            self.assertEqual(self.client.get('/api/books/search/', {'q': 'Dune'}).status_code, 503)
+            stub.status = 200
+            self.assertEqual(self.client.get('/api/books/search/', {'q': 'Dune'}).status_code, 200)
+
+        self.assertEqual(len(stub.requests), 2)
+
+    def test_concurrent_misses_collapse_into_one_fetch(self):
+        cache = SearchCache()
+        results = []
+
+        with StubOpenLibrary(delay=0.3) as stub, upstream(stub):
+            threads = [
+                threading.Thread(target=lambda: results.append(
+                    cache.get_or_fetch('Dune', get_client().search)))
+                for _ in range(8)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(results), 8)
+        self.assertEqual(len(stub.requests), 1)
+
+    def test_lru_and_ttl_bounds(self):
+        cache = SearchCache(ttl=60, max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+
+        expired = SearchCache(ttl=0)
+        expired.set('a', 1)
+        self.assertIsNone(expired.get('a'))
+
+    @override_settings(
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+        BOOK_SEARCH_CACHE={'SHARED_CACHE': 'default'},
+    )
+    def test_shared_tier_survives_local_eviction(self):
+        get_search_cache().set('Dune', {'books': [], 'total': 0})
+        get_search_cache().clear()
+
+        self.assertEqual(get_search_cache().get('dune'), {'books': [], 'total': 0})
+
+
+class CatalogSearchTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Book.objects.create(open_library_id='OL1W', title='Dune', authors=['Frank Herbert'],
+                            isbn_13='9780441013593')
+        Book.objects.create(open_library_id='OL2W', title='Dune Messiah', authors=['Frank Herbert'])
+        Book.objects.create(open_library_id='OL3W', title='Children of Dune', authors=['Frank Herbert'])
+        Book.objects.create(open_library_id='OL4W', title='The Left Hand of Darkness',
+                            authors=['Ursula K. Le Guin'])
+
+    def test_matches_title_authors_and_isbn(self):
+        self.assertEqual(len(search_catalog('dune')), 3)
+        self.assertEqual([book.open_library_id for book in search_catalog('le guin')], ['OL4W'])
+        self.assertEqual([book.open_library_id for book in search_catalog('9780441013593')], ['OL1W'])
+        self.assertEqual(len(search_catalog('herb mess')), 1)
+        self.assertEqual(search_catalog('"*)('), [])
+
+    def test_non_ascii_authors_match_with_or_without_accents(self):
+        book = Book.objects.create(open_library_id='OL5W', title='Cien años de soledad',
+                                   authors=['Gabriel García Márquez'])
+
+        for query in ('García', 'garcia', 'Márquez', 'marquez'):
+            self.assertEqual(search_catalog(query), [book], query)
+
+        book.authors = ['Jorge Luis Borges']
+        book.save()
+        self.assertEqual(search_catalog('garcia'), [])
+        self.assertEqual(search_catalog('borges'), [book])
+
+    def test_index_follows_updates_and_deletes(self):
+        book = Book.objects.get(open_library_id='OL4W')
+        book.title = 'The Dispossessed'
+        book.save()
+
+        self.assertEqual(search_catalog('darkness'), [])
+        self.assertEqual(len(search_catalog('dispossessed')), 1)
+
+        book.delete()
+        self.assertEqual(search_catalog('dispossessed'), [])
+
+    def test_local_results_come_first_and_are_deduplicated(self):
+        with StubOpenLibrary() as stub, upstream(stub):
+            response = self.client.get('/api/books/search/', {'q': 'dune'})
+
+        ids = [book['open_library_id'] for book in response.data['books']]
+        self.assertEqual(sorted(ids), ['OL1W', 'OL2W', 'OL3W'])
+        self.assertEqual(ids[0], 'OL1W')
+
+    def test_local_results_survive_upstream_outage(self):
+        with StubOpenLibrary(status=503) as stub, upstream(stub):
+            response = self.client.get('/api/books/search/', {'q': 'darkness'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['upstream_unavailable'])
+        self.assertEqual(response.data['books'][0]['open_library_id'], 'OL4W')
+
+    def test_local_only_search_skips_upstream(self):
+        with StubOpenLibrary() as stub, upstream(stub):
+            response = self.client.get('/api/books/search/', {'q': 'dune', 'source': 'local'})
+
+        self.assertEqual(response.data['total'], 3)
+        self.assertEqual(stub.requests, [])
+
+
+class OpenLibraryClientTests(TestCase):
+
+    def test_retries_transient_errors(self):
+        with StubOpenLibrary(statuses=[503, 502]) as stub:
+            client = OpenLibraryClient(stub.url, retries=2, backoff=0)
+            results = client.search('dune')
+
+        self.assertEqual(results['books'][0]['title'], 'Dune')
+        self.assertEqual(len(stub.requests), 3)
+
+    def test_retries_stop_at_the_deadline(self):
+        with StubOpenLibrary(delay=0.5) as stub:
+            client = OpenLibraryClient(stub.url, timeout=0.3, deadline=0.4, retries=5, backoff=0)
+            start = time.monotonic()
+            with self.assertRaises(OpenLibraryError):
+                client.search('dune')
+            elapsed = time.monotonic() - start
+            client.close()
+
+        self.assertLess(elapsed, 0.6)
+        self.assertLessEqual(len(stub.requests), 2)
+
+    def test_client_errors_are_not_retried(self):
+        with StubOpenLibrary(status=404) as stub:
+            client = OpenLibraryClient(stub.url, retries=2, backoff=0)
+            with self.assertRaises(OpenLibraryError):
+                client.search('dune')
+
+        self.assertEqual(len(stub.requests), 1)
+        self.assertEqual(client.breaker.state, 'closed')
+
+    def test_circuit_opens_and_recovers(self):
+        with StubOpenLibrary(status=500) as stub:
+            client = OpenLibraryClient(stub.url, retries=0, backoff=0, failure_threshold=2, reset_timeout=0.2)
+            for _ in range(2):
+                with self.assertRaises(OpenLibraryError):
+                    client.search('dune')
+
+            with self.assertRaises(CircuitOpenError):
+                client.search('dune')
+            self.assertEqual(len(stub.requests), 2)
+
+            time.sleep(0.25)
+            stub.status = 200
+            self.assertEqual(client.search('dune')['total'], 1)
+            self.assertEqual(client.breaker.state, 'closed')
+
+    def test_invalid_json_is_a_failure(self):
+        with StubOpenLibrary(routes={'/search.json': b'<html>Gateway timeout</html>'}) as stub:
+            client = OpenLibraryClient(stub.url, retries=0, backoff=0, failure_threshold=2)
+            with self.assertRaises(OpenLibraryError):
+                client.search('dune')
+            with self.assertRaises(OpenLibraryError):
+                asyncio.run(client.asearch('dune'))
+            with self.assertRaises(CircuitOpenError):
+                client.search('dune')
+            client.close()
+
+    def test_hosts_have_separate_circuits(self):
+        with StubOpenLibrary(status=500) as stub:
+            client = OpenLibraryClient(stub.url, retries=0, backoff=0, failure_threshold=2)
+            covers_url = stub.url.replace('127.0.0.1', 'localhost') + '/covers/dune.jpg'
+            for _ in range(2):
+                with self.assertRaises(OpenLibraryError):
+                    client.get(covers_url)
+            with self.assertRaises(CircuitOpenError):
+                client.get(covers_url)
+
+            stub.status = 200
+            self.assertEqual(client.search('dune')['total'], 1)
+            self.assertEqual(client.breaker.state, 'closed')
+            client.close()
+
+    def test_connection_is_reused(self):
+        with StubOpenLibrary() as stub:
+            client = OpenLibraryClient(stub.url)
+            client.search('dune')
+            client.search('dune messiah')
+            client.close()
+
+        self.assertEqual(len(stub.requests), 2)
+        self.assertEqual(len(stub.connections), 1)
+
+
+class AsyncSearchTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', password='secret')
+
+    async def test_async_search(self):
+        await sync_to_async(self.async_client.force_login)(self.user)
+        with StubOpenLibrary() as stub, upstream(stub):
+            response = await self.async_client.get('/api/books/search/async/', {'q': 'dune'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['books'][0]['open_library_id'], 'OL1W')
+
+    async def test_concurrent_async_searches_share_one_fetch(self):
+        cache = SearchCache()
+        with StubOpenLibrary(delay=0.2) as stub, upstream(stub):
+            client = get_client()
+            results = await asyncio.gather(*[
+                cache.aget_or_fetch('Dune', client.asearch) for _ in range(10)
+            ])
+
+        self.assertEqual(len(results), 10)
+        self.assertEqual(len(stub.requests), 1)
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get('/api/books/search/async/', {'q': 'dune'})
+
+        self.assertEqual(response.status_code, 403)
+
+
+GOODREADS_CSV = '''Book Id,Title,Author,Additional Authors,ISBN,ISBN13,My Rating,Number of Pages,Year Published,Original Publication Year,Date Read,Exclusive Shelf,My Review
+1,Dune,Frank Herbert,,"=""0441013597""","=""9780441013593""",5,688,2005,1965,2023/05/14,read,Spice!
+2,"Good Omens",Terry Pratchett,Neil Gaiman,"=""""","=""""",0,,,1990,,to-read,
+3,Piranesi,Susanna Clarke,,,"=""9781635575637""",4,272,2020,2020,,currently-reading,
+'''
+
+STORYGRAPH_CSV = """Title,Authors,ISBN/UID,Read Status,Last Date Read,Star Rating,Review
+Dune,Frank Herbert,9780441013593,read,2023/05/14,4.25,
+The Fifth Season,N. K. Jemisin,9780316229296,did-not-finish,,,
+"""
+
+
+class ImportLibraryTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def run_import(self, text, batch_size=2):
+        results = list(importers.import_library(self.user, io.StringIO(text), batch_size=batch_size))
+        return results[-1]
+
+    def test_goodreads_export(self):
+        result = self.run_import(GOODREADS_CSV)
+
+        self.assertEqual((result.rows, result.added, result.books_created, result.ratings), (3, 3, 3, 2))
+        dune = UserBook.objects.get(user=self.user, book__isbn_13='9780441013593')
+        self.assertEqual(dune.status, 'finished')
+        self.assertEqual(dune.date_finished.date().isoformat(), '2023-05-14')
+        self.assertEqual(dune.book.pages, 688)
+        self.assertEqual(list(dune.book.author_set.values_list('name', flat=True)), ['Frank Herbert'])
+        self.assertEqual(Rating.objects.get(user=self.user, book=dune.book).review, 'Spice!')
+        omens = UserBook.objects.get(user=self.user, book__title='Good Omens')
+        self.assertEqual(omens.status, 'tbr')
+        self.assertEqual(omens.book.authors, ['Terry Pratchett', 'Neil Gaiman'])
+
+    def test_reimport_is_idempotent_and_matches_catalog_by_isbn(self):
+        self.run_import(GOODREADS_CSV)
+        result = self.run_import(STORYGRAPH_CSV)
+
+        self.assertEqual(result.already_in_library, 1)
+        self.assertEqual(result.added, 1)
+        self.assertEqual(Book.objects.filter(isbn_13='9780441013593').count(), 1)
+        self.assertEqual(UserBook.objects.get(book__title='The Fifth Season').status, 'dnf')
+
+        self.run_import(GOODREADS_CSV)
+        self.assertEqual(UserBook.objects.filter(user=self.user).count(), 4)
+
+    def test_storygraph_ratings_round_to_half_stars(self):
+        self.run_import(STORYGRAPH_CSV)
+
+        self.assertEqual(Rating.objects.get(user=self.user).rating, Decimal('4.5'))
+
+    def test_queries_scale_with_chunks_not_rows(self):
+        rows = ''.join(f'{i},Book {i},Author {i},,,,3,100,,,,read,\n' for i in range(200))
+        header = GOODREADS_CSV.splitlines()[0] + '\n'
+
+        with CaptureQueriesContext(connection) as queries:
+            result = self.run_import(header + rows, batch_size=100)
+
+        self.assertEqual(result.added, 200)
+        self.assertLess(len(queries), 40)
+
+    def test_streaming_endpoint(self):
+        upload = SimpleUploadedFile('goodreads.csv', GOODREADS_CSV.encode('utf-8'), content_type='text/csv')
+        response = self.client.post('/api/books/import/', {'file': upload})
+
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(lines[-1]['status'], 'complete')
+        self.assertEqual(lines[-1]['added'], 3)
+
+    def test_rejects_unknown_format(self):
+        upload = SimpleUploadedFile('books.csv', b'name,year\nDune,1965\n', content_type='text/csv')
+        response = self.client.post('/api/books/import/', {'file': upload})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_management_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as file:
+            file.write(STORYGRAPH_CSV)
+        out = io.StringIO()
+        call_command('import_library', 'reader', file.name, stdout=out)
+        os.unlink(file.name)
+
+        self.assertIn('Imported 2 books', out.getvalue())
+
+
+class BatchUpdateLibraryTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        book = Book.objects.create(open_library_id='OL1W', title='Dune', pages=600)
+        self.user_book = UserBook.objects.create(user=self.user, book=book, status='reading')
+
+    def post(self, operations):
+        return self.client.post('/api/books/batch/', {'operations': operations}, format='json')
+
+    def test_mixed_operations(self):
+        response = self.post([
+            {'op': 'add', 'book': {'open_library_id': 'OL2W', 'title': 'Piranesi', 'authors': ['Susanna Clarke']}},
+            {'op': 'status', 'user_book_id': self.user_book.id, 'status': 'finished', 'current_page': 600},
+            {'op': 'rate', 'user_book_id': self.user_book.id, 'ratings': {'overall': 4.5, 'plot': 4}, 'review': 'Great'},
+            {'op': 'status', 'open_library_id': 'OL2W', 'status': 'reading'},
+            {'op': 'rate', 'user_book_id': 999999, 'ratings': {'overall': 3}},
+            {'op': 'rate', 'user_book_id': self.user_book.id, 'ratings': {'overall': 4.2}},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['applied'], 4)
+        self.assertEqual([r['status'] for r in response.data['results']], ['ok'] * 4 + ['error'] * 2)
+
+        self.user_book.refresh_from_db()
+        self.assertEqual(self.user_book.status, 'finished')
+        self.assertIsNotNone(self.user_book.date_finished)
+        self.assertEqual(self.user_book.current_page, 600)
+        overall = Rating.objects.get(user=self.user, book=self.user_book.book, rating_type='overall')
+        self.assertEqual((overall.rating, overall.review), (Decimal('4.5'), 'Great'))
+
+        added = UserBook.objects.get(user=self.user, book__open_library_id='OL2W')
+        self.assertEqual(response.data['results'][0]['user_book_id'], added.id)
+        self.assertEqual(added.status, 'reading')
+        self.assertIsNotNone(added.date_started)
+
+    def test_ratings_are_upserted(self):
+        self.post([{'op': 'rate', 'user_book_id': self.user_book.id, 'ratings': {'overall': 3}}])
+        self.post([{'op': 'rate', 'user_book_id': self.user_book.id, 'ratings': {'overall': 5}}])
+
+        self.assertEqual(Rating.objects.get(user=self.user).rating, Decimal('5.0'))
+
+    def test_query_count_is_independent_of_batch_size(self):
+        def operations(count, offset):
+            return [
+                {'op': 'add', 'book': {'open_library_id': f'OL{offset + i}X', 'title': f'Book {i}'}, 'status': 'finished'}
+                for i in range(count)
+            ] + [
+                {'op': 'rate', 'open_library_id': f'OL{offset + i}X', 'ratings': {'overall': 4, 'plot': 3}}
+                for i in range(count)
+            ]
+
+        with CaptureQueriesContext(connection) as small:
+            self.post(operations(2, 100))
+        with CaptureQueriesContext(connection) as large:
+            self.post(operations(50, 200))
+
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(Rating.objects.filter(user=self.user).count(), 104)
+
+    def test_rejects_malformed_batch(self):
+        self.assertEqual(self.post([]).status_code, 400)
+        self.assertEqual(self.post([{'op': 'rate'}] * 501).status_code, 400)
+
+    def test_malformed_items_fail_alone(self):
+        user_book_id = self.user_book.id
+        malformed = [
+            {'op': 'status', 'user_book_id': 'abc', 'status': 'finished'},
+            {'op': 'rate', 'user_book_id': [user_book_id], 'ratings': {'overall': 4}},
+            {'op': 'status', 'user_book_id': user_book_id, 'status': ['finished']},
+            {'op': 'add', 'book': {'open_library_id': 'OL2W', 'title': 'Piranesi'}, 'status': {'tbr': 1}},
+            {'op': 'add', 'book': {'open_library_id': ['OL2W'], 'title': 'Piranesi'}},
+            {'op': 'status', 'open_library_id': {'key': 'OL1W'}, 'status': 'finished'},
+            {'op': 'status', 'user_book_id': user_book_id, 'status': 'finished', 'current_page': 'lots'},
+            {'op': 'status', 'user_book_id': user_book_id, 'status': 'finished', 'current_page': -5},
+            {'op': 'status', 'user_book_id': user_book_id, 'status': 'finished', 'notes': {'text': 'x'}},
+            {'op': 'rate', 'user_book_id': user_book_id, 'ratings': {'overall': 4}, 'review': ['x']},
+            {'op': ['status']},
+        ]
+        response = self.post(malformed + [
+            {'op': 'status', 'user_book_id': user_book_id, 'status': 'finished', 'current_page': 600},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([r['status'] for r in results], ['error'] * len(malformed) + ['ok'])
+        self.assertEqual(results[0]['error'], 'user_book_id must be an integer')
+        self.assertEqual(results[6]['error'], 'current_page must be a non-negative integer')
+        self.user_book.refresh_from_db()
+        self.assertEqual((self.user_book.status, self.user_book.current_page), ('finished', 600))
+        self.assertFalse(Rating.objects.exists())
+
+    def test_rate_book_upserts_in_bulk(self):
+        def rate(rating_types):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(f'/api/books/user-book/{self.user_book.id}/rate/', {
+                    'ratings': {rating_type: 4 for rating_type in rating_types},
+                    'review': 'Loved it'
+                }, format='json')
+            return response, len(queries)
+
+        _, one_type = rate(['overall'])
+        response, all_types = rate([rating_type for rating_type, _ in Rating.RATING_TYPES])
+
+        self.assertEqual(len(response.data['ratings']), 8)
+        self.assertEqual(one_type, all_types)
+
+
+ENRICHMENT_ROUTES = {
+    '/works/OL1W.json': {'title': 'Dune', 'description': {'type': '/type/text', 'value': 'Spice and sand.'}},
+    '/works/OL1W/editions.json': {'entries': [
+        {'publishers': ['Ace']},
+        {
+            'publishers': ['Chilton Books'],
+            'isbn_13': ['9780441013593'],
+            'publish_date': '1965',
+            'languages': [{'key': '/languages/eng'}],
+        },
+    ]},
+    '/isbn/9781635575637.json': {
+        'publishers': ['Bloomsbury'],
+        'languages': [{'key': '/languages/fre'}],
+        'works': [{'key': '/works/OL2W'}],
+    },
+    '/works/OL2W.json': {'title': 'Piranesi', 'description': 'A house of endless halls.'},
+    '/works/OL3W.json': None,
+    '/works/OL3W/editions.json': None,
+}
+
+
+class EnrichmentTests(TestCase):
+
+    def setUp(self):
+        self.dune = Book.objects.create(open_library_id='OL1W', title='Dune')
+        self.piranesi = Book.objects.create(open_library_id='isbn:9781635575637', title='Piranesi')
+
+    def run_worker(self, stub, **options):
+        client = OpenLibraryClient(stub.url, retries=0, backoff=0)
+        options = {'RATE_PER_HOST': 0, 'RETRY_DELAY': 0, **options}
+        metrics = None
+        for metrics in enrichment.run_worker(client=client, options=options):
+            pass
+        client.close()
+        return metrics
+
+    def test_enqueue_dedupes_and_skips_unknown_books(self):
+        unknown = Book.objects.create(open_library_id='import:abc123', title='Zine')
+        enrichment.enqueue([self.dune, self.piranesi, unknown])
+        enrichment.enqueue([self.dune])
+
+        self.assertEqual(EnrichmentTask.objects.count(), 2)
+        self.assertEqual(enrichment.queue_stats(), {'pending': 2, 'running': 0, 'done': 0, 'failed': 0})
+
+    def test_adding_a_book_queues_it(self):
+        user = User.objects.create_user(username='reader', password='secret')
+        client = APIClient()
+        client.force_authenticate(user)
+        client.post('/api/books/add/', {'book': {'open_library_id': 'OL9W', 'title': 'Hyperion'}}, format='json')
+
+        self.assertTrue(EnrichmentTask.objects.filter(book__open_library_id='OL9W', status='pending').exists())
+
+    def test_worker_fills_in_details_in_bulk(self):
+        self.piranesi.publisher = 'Kept'
+        self.piranesi.save()
+        enrichment.enqueue([self.dune, self.piranesi])
+
+        with StubOpenLibrary(routes=ENRICHMENT_ROUTES) as stub:
+            with CaptureQueriesContext(connection) as queries:
+                metrics = self.run_worker(stub, CONCURRENCY=2)
+
+        self.dune.refresh_from_db()
+        self.assertEqual(self.dune.description, 'Spice and sand.')
+        self.assertEqual(self.dune.publisher, 'Chilton Books')
+        self.assertEqual(self.dune.isbn_13, '9780441013593')
+        self.assertEqual(self.dune.language, 'en')
+        self.piranesi.refresh_from_db()
+        self.assertEqual(self.piranesi.description, 'A house of endless halls.')
+        self.assertEqual(self.piranesi.publisher, 'Kept')
+        self.assertEqual(self.piranesi.language, 'fr')
+
+        self.assertEqual((metrics.enriched, metrics.requests, metrics.batches), (2, 4, 1))
+        self.assertEqual(enrichment.queue_stats()['done'], 2)
+        # Claim (select, update, read back), one bulk update each for books and tasks, empty claim
+        self.assertLessEqual(len(queries), 8)
+
+    def test_failures_are_retried_then_marked_failed(self):
+        missing = Book.objects.create(open_library_id='OL3W', title='Lost')
+        enrichment.enqueue([missing])
+
+        with StubOpenLibrary(routes=ENRICHMENT_ROUTES) as stub:
+            self.run_worker(stub, MAX_ATTEMPTS=2, RETRY_DELAY=3600)
+            task = EnrichmentTask.objects.get(book=missing)
+            self.assertEqual((task.status, task.attempts), ('pending', 1))
+            self.assertIn('404', task.last_error)
+
+            # Not due again until the retry delay has passed
+            self.assertIsNone(self.run_worker(stub))
+            EnrichmentTask.objects.update(available_at=task.created_at)
+            self.run_worker(stub, MAX_ATTEMPTS=2)
+
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), ('failed', 2))
+        self.assertEqual(enrichment.retry_failed(), 1)
+        self.assertEqual(EnrichmentTask.objects.get(book=missing).status, 'pending')
+
+    def test_tasks_of_a_dead_worker_are_reclaimed(self):
+        enrichment.enqueue([self.dune, self.piranesi])
+
+        claimed = enrichment.claim(10, lease=300)
+        self.assertEqual(len(claimed), 2)
+        self.assertEqual(enrichment.claim(10, lease=300), [])
+
+        # The worker never reports back; once the lease runs out the tasks are due again
+        EnrichmentTask.objects.update(available_at=claimed[0].created_at)
+        with StubOpenLibrary(routes=ENRICHMENT_ROUTES) as stub:
+            metrics = self.run_worker(stub)
+
+        self.assertEqual(metrics.enriched, 2)
+        self.assertEqual(EnrichmentTask.objects.get(book=self.dune).attempts, 2)
+
+    def test_rate_limiter_spaces_requests_per_host(self):
+        limiter = enrichment.RateLimiter(rate=50)
+        started = time.monotonic()
+        for _ in range(6):
+            limiter.wait('openlibrary.org')
+        limiter.wait('covers.openlibrary.org')
+
+        self.assertGreaterEqual(time.monotonic() - started, 0.1)
+        self.assertLess(time.monotonic() - started, 0.5)
+
+
+COVER_ROUTES = {
+    '/covers/dune.jpg': b'\xff\xd8dune-cover' * 10,
+    '/covers/dune-copy.jpg': b'\xff\xd8dune-cover' * 10,
+    '/covers/piranesi.jpg': b'\xff\xd8piranesi-cover' * 10,
+    '/covers/missing.jpg': None,
+}
+
+
+class CoverCacheTests(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        settings = override_settings(COVER_CACHE={'ROOT': self.root.name})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        caches['default'].clear()
+        self.user = User.objects.create_user(username='reader', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_books(self, stub, *names):
+        books = [
+            Book.objects.create(open_library_id=f'OL{i}W', title=name, cover_url=f'{stub.url}/covers/{name}.jpg')
+            for i, name in enumerate(names)
+        ]
+        UserBook.objects.bulk_create([UserBook(user=self.user, book=book) for book in books])
+        covers.enqueue(books)
+        return books
+
+    def run_worker(self, stub, **options):
+        client = OpenLibraryClient(stub.url, retries=0, backoff=0)
+        for _ in covers.run_worker(client=client, options={'RATE_PER_HOST': 0, **options}):
+            pass
+        client.close()
+
+    def test_covers_are_cached_once_and_served_locally(self):
+        with StubOpenLibrary(routes=COVER_ROUTES) as stub:
+            dune, copy, piranesi = self.add_books(stub, 'dune', 'dune-copy', 'piranesi')
+            self.run_worker(stub)
+            self.assertEqual(len(stub.requests), 3)
+
+        cached = {cover.book_id: cover for cover in CoverImage.objects.all()}
+        self.assertEqual({cover.status for cover in cached.values()}, {'done'})
+        # Identical images share one content-addressed file
+        self.assertEqual(cached[dune.pk].medium_digest, cached[copy.pk].medium_digest)
+        self.assertEqual(len(list(Path(self.root.name).rglob('*.jpg'))), 2)
+
+        uncached = Book.objects.create(open_library_id='OL9W', title='Remote', cover_url='https://example.com/c.jpg')
+        UserBook.objects.create(user=self.user, book=uncached)
+        # Covers are joined into the page query
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/books/my-books/')
+        urls = {item['book']['title']: item['book']['cover_medium_url'] for item in response.data['books']}
+        self.assertEqual(urls['Remote'], 'https://example.com/c.jpg')
+        self.assertEqual(urls['dune'], f'/api/books/covers/{cached[dune.pk].medium_digest}.jpg')
+
+    def test_cover_response_is_immutable_with_etag(self):
+        with StubOpenLibrary(routes=COVER_ROUTES) as stub:
+            dune, = self.add_books(stub, 'dune')
+            self.run_worker(stub)
+        digest = CoverImage.objects.get(book=dune).small_digest
+        url = f'/api/books/covers/{digest}.jpg'
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), COVER_ROUTES['/covers/dune.jpg'])
+        self.assertEqual(response['ETag'], f'"{digest}"')
+        self.assertIn('immutable', response['Cache-Control'])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=f'"{digest}"')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get('/api/books/covers/nothere.jpg').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/books/covers/{"0" * 64}.jpg').status_code, 404)
+
+    def test_serving_touches_last_accessed_at_most_once_per_resolution(self):
+        with StubOpenLibrary(routes=COVER_ROUTES) as stub:
+            dune, = self.add_books(stub, 'dune')
+            self.run_worker(stub)
+        cover = CoverImage.objects.get(book=dune)
+        CoverImage.objects.update(last_accessed=cover.last_accessed - timedelta(days=1))
+
+        self.client.get(f'/api/books/covers/{cover.small_digest}.jpg')
+        touched = CoverImage.objects.get(pk=cover.pk).last_accessed
+        self.assertGreater(touched, cover.last_accessed - timedelta(days=1))
+
+        # Later hits in the same window don't query at all
+        with self.assertNumQueries(0):
+            self.client.get(f'/api/books/covers/{cover.small_digest}.jpg')
+        self.assertEqual(CoverImage.objects.get(pk=cover.pk).last_accessed, touched)
+
+    def test_least_recently_served_covers_are_evicted(self):
+        with StubOpenLibrary(routes=COVER_ROUTES) as stub:
+            dune, copy, piranesi = self.add_books(stub, 'dune', 'dune-copy', 'piranesi')
+            self.run_worker(stub)
+
+        now = timezone.now()
+        for offset, book in enumerate([dune, piranesi, copy]):
+            CoverImage.objects.filter(book=book).update(last_accessed=now - timedelta(hours=10 - offset))
+
+        cover_size = len(COVER_ROUTES['/covers/piranesi.jpg'])
+        self.assertEqual(covers.evict(max_bytes=cover_size), 2)
+
+        statuses = dict(CoverImage.objects.values_list('book__title', 'status'))
+        self.assertEqual(statuses, {'dune': 'evicted', 'piranesi': 'evicted', 'dune-copy': 'done'})
+        # The dune file is still used by its copy; piranesi's is gone
+        self.assertEqual(len(list(Path(self.root.name).rglob('*.jpg'))), 1)
+
+    def test_evicted_covers_are_cached_again_once_they_fit(self):
+        with StubOpenLibrary(routes=COVER_ROUTES) as stub:
+            dune, piranesi = self.add_books(stub, 'dune', 'piranesi')
+            self.run_worker(stub)
+            CoverImage.objects.filter(book=dune).update(last_accessed=timezone.now() - timedelta(days=1))
+            cap = len(COVER_ROUTES['/covers/piranesi.jpg'])
+            self.assertEqual(covers.evict(max_bytes=cap), 1)
+
+            # Listing falls back to the remote cover and doesn't write
+            with self.assertNumQueries(1):
+                response = self.client.get('/api/books/my-books/')
+            urls = {item['book']['title']: item['book']['cover_medium_url'] for item in response.data['books']}
+            self.assertEqual(urls['dune'], f'{stub.url}/covers/dune.jpg')
+
+            # Evicted covers keep their size, and only come back once they fit
+            needed = sum(CoverImage.objects.values_list('bytes', flat=True))
+            self.run_worker(stub, MAX_BYTES=needed - 1)
+            self.assertEqual(CoverImage.objects.get(book=dune).status, 'evicted')
+
+            self.run_worker(stub, MAX_BYTES=needed)
+
+        cover = CoverImage.objects.get(book=dune)
+        self.assertEqual(cover.status, 'done')
+        self.assertTrue(covers.path_for(cover.medium_digest).exists())
+        self.assertEqual(CoverImage.objects.get(book=piranesi).status, 'done')
+
+    def test_failed_downloads_are_retried(self):
+        with StubOpenLibrary(routes=COVER_ROUTES) as stub:
+            missing, = self.add_books(stub, 'missing')
+            self.run_worker(stub, MAX_ATTEMPTS=2, RETRY_DELAY=0)
+            self.run_worker(stub, MAX_ATTEMPTS=2, RETRY_DELAY=0)
+
+        cover = CoverImage.objects.get(book=missing)
+        self.assertEqual((cover.status, cover.attempts), ('failed', 2))
+
+    def test_open_library_size_variants(self):
+        url = 'https://covers.openlibrary.org/b/id/12345-M.jpg'
+
+        self.assertEqual(covers._source_url(url, 'small'), 'https://covers.openlibrary.org/b/id/12345-S.jpg')
+        self.assertEqual(covers._source_url(url, 'original'), 'https://covers.openlibrary.org/b/id/12345-L.jpg')
+        self.assertEqual(covers._source_url('https://example.com/c.jpg', 'small'), 'https://example.com/c.jpg')
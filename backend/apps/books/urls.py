@@ -6,10 +6,15 @@ app_name = 'books'
 urlpatterns = [
     # Book search and management
     path('search/', views.search_books, name='search_books'),
+    path('search/async/', views.search_books_async, name='search_books_async'),
     path('add/', views.add_book_to_library, name='add_book_to_library'),
     path('my-books/', views.my_books, name='my_books'),
+    path('import/', views.import_library, name='import_library'),
+    path('batch/', views.batch_update_library, name='batch_update_library'),
+    path('covers/<str:digest>.jpg', views.cover_image, name='cover'),
     
     # UserBook management
+    path('user-book/<int:user_book_id>/', views.user_book_detail, name='user_book_detail'),
     path('user-book/<int:user_book_id>/update/', views.update_book_status, name='update_book_status'),
     path('user-book/<int:user_book_id>/rate/', views.rate_book, name='rate_book'),
     path('user-book/<int:user_book_id>/ratings/', views.book_ratings, name='book_ratings'),
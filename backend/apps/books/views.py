@@ -1,62 +1,76 @@
-import requests
+import json
+from asgiref.sync import sync_to_async
+from django.http import FileResponse, Http404, HttpResponseNotAllowed, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.models import User
+from django.db.models import Count
+from django.utils.http import parse_etags
 from django.views.decorators.csrf import ensure_csrf_cookie  # Add this import
+from django.views.decorators.http import require_safe
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from .models import Book, UserBook, Rating
+
+from bookcase.replicas import replica_reads
+from .models import Book, UserBook, Rating, upsert_ratings
 from .serializers import BookSerializer, UserBookSerializer, RatingSerializer
+from .pagination import UserBookCursorPagination
+from .search_cache import get_search_cache, normalize_query
+from .catalog_search import search_catalog, format_catalog_book
+from .open_library import OpenLibraryError, get_client
+from . import batch, covers, enrichment, importers
+
+
+def merge_search_results(local_books, results):
+    """Put local catalog matches ahead of Open Library results, without duplicates"""
+    local_ids = {book['open_library_id'] for book in local_books}
+    remote_books = [book for book in results['books'] if book['open_library_id'] not in local_ids]
+    overlap = len(results['books']) - len(remote_books)
+    
+    return {
+        'books': local_books + remote_books,
+        'total': results['total'] + len(local_books) - overlap
+    }
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def search_books(request):
-    """Search books using Open Library API"""
+    """Search the local catalog and Open Library.
+    
+    Local matches come first, ranked by match quality, followed by Open
+    Library results not already in the catalog. `?source=local` skips the
+    upstream call; if Open Library is unavailable, local matches are still
+    returned.
+    """
     query = request.GET.get('q', '')
+    source = request.GET.get('source', 'all')
     
-    if not query:
+    if not normalize_query(query):
         return Response({
             'error': 'Search query is required'
         }, status=status.HTTP_400_BAD_REQUEST)
     
-    try:
-        # Search Open Library API
-        url = f"https://openlibrary.org/search.json"
-        params = {
-            'q': query,
-            'limit': 20,
-            'fields': 'key,title,author_name,first_publish_year,isbn,number_of_pages,subject,cover_i'
-        }
-        
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        
-        data = response.json()
-        books = []
-        
-        for book_data in data.get('docs', []):
-            # Format book data
-            book_info = {
-                'open_library_id': book_data.get('key', '').replace('/works/', ''),
-                'title': book_data.get('title', 'Unknown Title'),
-                'authors': book_data.get('author_name', []),
-                'first_publish_year': book_data.get('first_publish_year'),
-                'pages': book_data.get('number_of_pages_median') or book_data.get('number_of_pages'),
-                'subjects': book_data.get('subject', [])[:5],  # Limit subjects
-                'isbn': book_data.get('isbn', [None])[0] if book_data.get('isbn') else None,
-                'cover_id': book_data.get('cover_i'),
-                'cover_url': f"https://covers.openlibrary.org/b/id/{book_data.get('cover_i')}-M.jpg" if book_data.get('cover_i') else None
-            }
-            books.append(book_info)
-        
+    local_books = [format_catalog_book(book) for book in search_catalog(query)]
+    
+    if source == 'local':
         return Response({
-            'books': books,
-            'total': data.get('numFound', 0)
+            'books': local_books,
+            'total': len(local_books)
         }, status=status.HTTP_200_OK)
+    
+    try:
+        # Repeated and concurrent identical queries are served from the cache
+        results = get_search_cache().get_or_fetch(query, get_client().search)
         
-    except requests.RequestException as e:
+    except OpenLibraryError as e:
+        if local_books:
+            return Response({
+                'books': local_books,
+                'total': len(local_books),
+                'upstream_unavailable': True
+            }, status=status.HTTP_200_OK)
         return Response({
             'error': 'Failed to search books. Please try again.'
         }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
@@ -64,6 +78,57 @@ def search_books(request):
         return Response({
             'error': 'An error occurred while searching.'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    return Response(merge_search_results(local_books, results), status=status.HTTP_200_OK)
+
+
+async def search_books_async(request):
+    """Async variant of search_books for ASGI deployments.
+    
+    Served natively by an ASGI worker (see bookcase/asgi.py), so one worker
+    can hold many in-flight Open Library requests at once.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    
+    if not await sync_to_async(lambda: request.user.is_authenticated)():
+        return JsonResponse({
+            'detail': 'Authentication credentials were not provided.'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    query = request.GET.get('q', '')
+    source = request.GET.get('source', 'all')
+    
+    if not normalize_query(query):
+        return JsonResponse({
+            'error': 'Search query is required'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    local_books = [
+        format_catalog_book(book) for book in await sync_to_async(search_catalog)(query)
+    ]
+    
+    if source == 'local':
+        return JsonResponse({
+            'books': local_books,
+            'total': len(local_books)
+        }, status=status.HTTP_200_OK)
+    
+    try:
+        results = await get_search_cache().aget_or_fetch(query, get_client().asearch)
+        
+    except OpenLibraryError as e:
+        if local_books:
+            return JsonResponse({
+                'books': local_books,
+                'total': len(local_books),
+                'upstream_unavailable': True
+            }, status=status.HTTP_200_OK)
+        return JsonResponse({
+            'error': 'Failed to search books. Please try again.'
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    
+    return JsonResponse(merge_search_results(local_books, results), status=status.HTTP_200_OK)
 
 
 @ensure_csrf_cookie  # Add this decorator
@@ -83,16 +148,13 @@ def add_book_to_library(request):
         # Check if book exists in our database, create if not
         book, created = Book.objects.get_or_create(
             open_library_id=book_data['open_library_id'],
-            defaults={
-                'title': book_data.get('title', 'Unknown Title'),
-                'authors': book_data.get('authors', []),
-                'pages': book_data.get('pages'),
-                'genres': book_data.get('subjects', []),
-                'cover_url': book_data.get('cover_url'),
-                'isbn_10': book_data.get('isbn'),
-                'publish_date': str(book_data.get('first_publish_year', '')) if book_data.get('first_publish_year') else None
-            }
+            defaults=Book.fields_from_search_result(book_data)
         )
+        if created:
+            book.sync_authors_and_genres()
+            # Description, publisher etc. are filled in by the enrichment worker
+            enrichment.enqueue([book])
+            covers.enqueue([book])
         
         # Check if user already has this book
         user_book, created = UserBook.objects.get_or_create(
@@ -118,19 +180,122 @@ def add_book_to_library(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@ensure_csrf_cookie
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def batch_update_library(request):
+    """Apply a list of add, status and rate operations in one transaction"""
+    try:
+        results = batch.apply_batch(request.user, request.data.get('operations'))
+    except batch.BatchError as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        'results': results,
+        'applied': sum(1 for result in results if result['status'] == 'ok'),
+        'failed': sum(1 for result in results if result['status'] == 'error')
+    }, status=status.HTTP_200_OK)
+
+
+@ensure_csrf_cookie
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def import_library(request):
+    """Import a Goodreads or StoryGraph CSV export into the user's library.
+    
+    Streams newline-delimited JSON progress after each chunk of rows; the
+    last line has "status": "complete" and the final totals.
+    """
+    upload = request.FILES.get('file')
+    
+    if not upload:
+        return Response({
+            'error': 'A CSV file is required'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    progress = importers.import_library(request.user, importers.open_text(upload.file))
+    
+    try:
+        # Process the first chunk eagerly so a bad file is a clean 400
+        first = next(progress, importers.ImportResult())
+    except (importers.ImportFormatError, UnicodeDecodeError) as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    def stream_progress():
+        result = first
+        yield json.dumps({'status': 'progress', **result.as_dict()}) + '\n'
+        for result in progress:
+            yield json.dumps({'status': 'progress', **result.as_dict()}) + '\n'
+        yield json.dumps({'status': 'complete', **result.as_dict()}) + '\n'
+    
+    return StreamingHttpResponse(stream_progress(), content_type='application/x-ndjson')
+
+
+@replica_reads
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def my_books(request):
-    """Get user's books by status"""
+    """Get user's books by status, cursor-paginated newest first.
+    
+    `status` may be a comma-separated list (e.g. `tbr,reading`), in which
+    case the page is grouped by status and per-status counts are included.
+    """
     status_filter = request.GET.get('status', 'all')
+    fields = request.GET.get('fields')
     
-    user_books = UserBook.objects.filter(user=request.user)
+    user_books = UserBook.objects.filter(user=request.user).select_related('book', 'book__cover_image')
     
-    if status_filter != 'all':
-        user_books = user_books.filter(status=status_filter)
+    # Empty entries (e.g. a trailing comma) are ignored
+    statuses = [value for value in status_filter.split(',') if value]
+    grouped = len(statuses) > 1
+    
+    if statuses != ['all']:
+        valid_statuses = dict(UserBook.STATUS_CHOICES)
+        if not statuses or any(value not in valid_statuses for value in statuses):
+            return Response({
+                'error': 'Invalid status'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        user_books = user_books.filter(status__in=statuses) if grouped else user_books.filter(status=statuses[0])
+    
+    paginator = UserBookCursorPagination()
+    page = paginator.paginate_queryset(user_books, request)
+    serializer = UserBookSerializer(
+        page,
+        many=True,
+        fields=fields.split(',') if fields else None
+    )
+    
+    if not grouped:
+        return paginator.get_paginated_response(serializer.data)
+    
+    counts = dict(
+        UserBook.objects.filter(user=request.user, status__in=statuses)
+        .order_by().values_list('status').annotate(count=Count('id'))
+    )
+    books_by_status = {value: [] for value in statuses}
+    for user_book, data in zip(page, serializer.data):
+        books_by_status[user_book.status].append(data)
+    
+    return paginator.get_grouped_paginated_response(books_by_status, {
+        value: counts.get(value, 0) for value in statuses
+    })
+
+
+@replica_reads
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def user_book_detail(request, user_book_id):
+    """Get one book from the user's library"""
+    user_book = get_object_or_404(
+        UserBook.objects.select_related('book', 'book__cover_image'), id=user_book_id, user=request.user
+    )
     
     return Response({
-        'books': UserBookSerializer(user_books, many=True).data
+        'user_book': UserBookSerializer(user_book).data
     }, status=status.HTTP_200_OK)
 
 
@@ -148,16 +313,7 @@ def update_book_status(request, user_book_id):
         }, status=status.HTTP_400_BAD_REQUEST)
     
     # Handle status changes
-    from django.utils import timezone
-    
-    if new_status == 'reading' and user_book.status != 'reading':
-        user_book.date_started = timezone.now()
-    elif new_status == 'finished' and user_book.status != 'finished':
-        user_book.date_finished = timezone.now()
-        if not user_book.date_started:
-            user_book.date_started = timezone.now()
-    
-    user_book.status = new_status
+    user_book.apply_status(new_status)
     user_book.current_page = request.data.get('current_page', user_book.current_page)
     user_book.notes = request.data.get('notes', user_book.notes)
     user_book.save()
@@ -183,23 +339,18 @@ def rate_book(request, user_book_id):
             'error': 'At least one rating is required'
         }, status=status.HTTP_400_BAD_REQUEST)
     
-    created_ratings = []
-    
     try:
-        for rating_type, rating_value in ratings_data.items():
-            if rating_type not in [choice[0] for choice in Rating.RATING_TYPES]:
-                continue
-                
-            rating, created = Rating.objects.update_or_create(
+        created_ratings = upsert_ratings([
+            Rating(
                 user=request.user,
                 book=user_book.book,
                 rating_type=rating_type,
-                defaults={
-                    'rating': rating_value,
-                    'review': review_text if rating_type == 'overall' else ''
-                }
+                rating=rating_value,
+                review=review_text if rating_type == 'overall' else ''
             )
-            created_ratings.append(rating)
+            for rating_type, rating_value in ratings_data.items()
+            if rating_type in dict(Rating.RATING_TYPES)
+        ])
         
         return Response({
             'message': 'Ratings saved successfully!',
@@ -225,4 +376,28 @@ def book_ratings(request, user_book_id):
     
     return Response({
         'ratings': RatingSerializer(ratings, many=True).data
-    }, status=status.HTTP_200_OK)
\ No newline at end of file
+    }, status=status.HTTP_200_OK)
+
+
+@require_safe
+def cover_image(request, digest):
+    """Serve a cached cover thumbnail by its content digest.
+    
+    The file behind a digest never changes, so it is cacheable forever.
+    """
+    if not covers.DIGEST_RE.match(digest):
+        raise Http404
+    
+    etag = f'"{digest}"'
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        try:
+            response = FileResponse(open(covers.path_for(digest), 'rb'), content_type='image/jpeg')
+        except FileNotFoundError:
+            raise Http404
+    
+    covers.touch(digest)
+    response['ETag'] = etag
+    response['Cache-Control'] = f'public, max-age={covers.IMMUTABLE_MAX_AGE}, immutable'
+    return response
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 class StatsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.stats'
-    label = 'stats'
\ No newline at end of file
+    label = 'stats'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,104 @@
+"""
+Per-user response cache for the stats endpoints.
+
+Responses are cached per user, endpoint and query string under the user's
+data version: a random token that is replaced whenever one of their
+UserBook, Rating, ReadingSession or ReadingStreak rows changes (see
+signals.py), and under the local date, since trailing windows and streaks
+move at midnight. Entries for old versions or days are never read again
+and just expire. The same fingerprint is sent as the ETag, so a client
+revalidating data that hasn't changed gets a 304 without the view running
+at all.
+
+Responses computed on a read replica (see bookcase/replicas.py) are neither
+cached nor tagged: the replica may not have the write that started the
+current version yet, and caching it would pin stale data to that version.
+
+The cache is any alias in settings.CACHES. A per-process locmem cache is
+only correct with a single worker; use the file or Redis backend otherwise.
+"""
+
+import functools
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from bookcase import replicas
+
+
+DEFAULTS = {
+    'ALIAS': 'default',
+    'TIMEOUT': 60 * 60 * 24,
+}
+
+
+def _options():
+    return {**DEFAULTS, **getattr(settings, 'STATS_CACHE', {})}
+
+
+def get_cache():
+    return caches[_options()['ALIAS']]
+
+
+def _version_key(user_id):
+    return f'stats:version:{user_id}'
+
+
+def data_version(user_id):
+    """Return the user's current data version, starting one if needed"""
+    cache = get_cache()
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        version = uuid.uuid4().hex
+        # Another worker may have started one first; theirs wins
+        if not cache.add(_version_key(user_id), version, None):
+            version = cache.get(_version_key(user_id)) or version
+    return version
+
+
+def bump_version(user_id):
+    """Invalidate every cached stats response for the user"""
+    get_cache().set(_version_key(user_id), uuid.uuid4().hex, None)
+
+
+def cached_stats_response(get):
+    """Cache a stats view's GET responses per user, data version and day"""
+
+    @functools.wraps(get)
+    def wrapper(view, request, *args, **kwargs):
+        user_id = request.user.pk
+        params = sorted((key, values) for key, values in request.GET.lists())
+        fingerprint = hashlib.sha1(
+            f'{type(view).__name__}|{params}|{data_version(user_id)}|{timezone.localdate()}'.encode('utf-8')
+        ).hexdigest()
+        etag = f'"{fingerprint}"'
+
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            cache = get_cache()
+            key = f'stats:response:{user_id}:{fingerprint}'
+            data = cache.get(key)
+            if data is None:
+                response = get(view, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                if replicas.read_from_replica():
+                    response['Cache-Control'] = 'private, no-cache'
+                    return response
+                cache.set(key, response.data, _options()['TIMEOUT'])
+            else:
+                response = Response(data)
+
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    return wrapper
@@ -0,0 +1,26 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.stats import snapshots
+
+
+class Command(BaseCommand):
+    help = 'Rebuild stats snapshots from scratch for some or all users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='Defaults to every user')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('id')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+            missing = set(options['usernames']) - set(users.values_list('username', flat=True))
+            if missing:
+                raise CommandError(f"Unknown users: {', '.join(sorted(missing))}")
+
+        count = 0
+        for user in users.iterator():
+            snapshots.rebuild_snapshot(user)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats snapshots for {count} users'))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from bookcase import replicas
+
+
+class Command(BaseCommand):
+    help = (
+        'Touch the replication heartbeat on the primary database. Keep it running '
+        'while a read replica is configured; without it the replica counts as lagging.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=1,
+            help='Seconds between heartbeats; 0 writes a single one'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            replicas.beat()
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('Heartbeat written'))
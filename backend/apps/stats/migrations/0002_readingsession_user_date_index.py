@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='readingsession',
+            index=models.Index(fields=['user', 'session_date'], name='stats_readi_user_id_df92d0_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('stats', '0002_readingsession_user_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStatsSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status_counts', models.JSONField(default=dict)),
+                ('finished_by_month', models.JSONField(default=dict)),
+                ('pages_by_month', models.JSONField(default=dict)),
+                ('finished_by_day', models.JSONField(default=dict)),
+                ('pages_by_day', models.JSONField(default=dict)),
+                ('finished_pages', models.IntegerField(default=0)),
+                ('finished_with_pages', models.IntegerField(default=0)),
+                ('genre_counts', models.JSONField(default=dict)),
+                ('author_counts', models.JSONField(default=dict)),
+                ('rating_histogram', models.JSONField(default=dict)),
+                ('session_count', models.IntegerField(default=0)),
+                ('session_pages', models.IntegerField(default=0)),
+                ('session_minutes', models.IntegerField(default=0)),
+                ('timed_sessions', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats_snapshot', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0003_userstatssnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstatssnapshot',
+            name='current_streak_end',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userstatssnapshot',
+            name='current_streak_start',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userstatssnapshot',
+            name='longest_streak_days',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='readingstreak',
+            index=models.Index(fields=['user', 'start_date'], name='stats_readi_user_id_4d8f8b_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def build_missing_snapshots(apps, schema_editor):
+    # Builds through the live models, like `manage.py rebuild_stats_snapshots`:
+    # the snapshot code reads books, ratings and sessions as they are now
+    from django.contrib.auth.models import User
+    from apps.stats import snapshots
+
+    for user in User.objects.filter(stats_snapshot__isnull=True).order_by('id').iterator():
+        snapshots.rebuild_snapshot(user)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0009_coverimage'),
+        ('stats', '0006_replicaheartbeat'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_missing_snapshots, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,5 @@
+from datetime import date, timedelta
+
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -13,6 +15,8 @@ class ReadingSession(models.Model):
     end_page = models.IntegerField()
     session_date = models.DateField()
     duration_minutes = models.IntegerField(blank=True, null=True)  # Optional time tracking
+    started_at = models.DateTimeField(blank=True, null=True)  # Optional, for hour-of-day stats
+    ended_at = models.DateTimeField(blank=True, null=True)
     
     # Notes about the session
     notes = models.TextField(blank=True, null=True)
@@ -21,6 +25,10 @@ class ReadingSession(models.Model):
     
     class Meta:
         ordering = ['-session_date', '-created_at']
+        indexes = [
+            models.Index(fields=['user', 'session_date']),
+            models.Index(fields=['user', 'started_at']),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.book.title} - {self.session_date}"
@@ -36,13 +44,16 @@ class ReadingStreak(models.Model):
     
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     start_date = models.DateField()
-    end_date = models.DateField(blank=True, null=True)  # Null if streak is ongoing
+    end_date = models.DateField(blank=True, null=True)  # Last day read (see streaks.py)
     current_streak = models.BooleanField(default=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-start_date']
+        indexes = [
+            models.Index(fields=['user', 'start_date']),
+        ]
     
     def __str__(self):
         status = "Current" if self.current_streak else "Past"
@@ -56,6 +67,155 @@ class ReadingStreak(models.Model):
         return (end - self.start_date).days + 1
 
 
+class UserStatsSnapshot(models.Model):
+    """Running per-user totals that the stats dashboard reads in one row.
+    
+    Maintained incrementally by the receivers in signals.py; rebuild with
+    `manage.py rebuild_stats_snapshots`. Counters keyed by date use the
+    current time zone.
+    """
+    
+    # Daily counters only need to cover the longest dashboard window
+    RECENT_DAYS = 90
+    DAILY_FIELDS = ('finished_by_day', 'pages_by_day')
+    
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='stats_snapshot')
+    
+    # Library, counting finished books only unless noted
+    status_counts = models.JSONField(default=dict)  # {status: books}, all statuses
+    finished_by_month = models.JSONField(default=dict)  # {'YYYY-MM': books}, '' if undated
+    pages_by_month = models.JSONField(default=dict)  # {'YYYY-MM': pages}
+    finished_by_day = models.JSONField(default=dict)  # {'YYYY-MM-DD': books}, last RECENT_DAYS
+    pages_by_day = models.JSONField(default=dict)  # {'YYYY-MM-DD': pages}, last RECENT_DAYS
+    finished_pages = models.IntegerField(default=0)  # Pages across books with a page count
+    finished_with_pages = models.IntegerField(default=0)
+    genre_counts = models.JSONField(default=dict)  # {genre: books}
+    author_counts = models.JSONField(default=dict)  # {author: books}
+    
+    # Overall ratings
+    rating_histogram = models.JSONField(default=dict)  # {'4.5': ratings}
+    
+    # Reading sessions
+    session_count = models.IntegerField(default=0)
+    session_pages = models.IntegerField(default=0)
+    session_minutes = models.IntegerField(default=0)
+    timed_sessions = models.IntegerField(default=0)  # Sessions with a duration
+    
+    # Reading streaks, maintained by streaks.py
+    current_streak_start = models.DateField(blank=True, null=True)  # Latest streak
+    current_streak_end = models.DateField(blank=True, null=True)
+    longest_streak_days = models.IntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user.username} - Stats snapshot"
+    
+    def apply(self, tallies, sign=1, today=None):
+        """Add (or with sign=-1, remove) (field, key, amount) tallies.
+        
+        A key of None addresses an integer field; otherwise `field` is a
+        JSON counter and `key` one of its entries.
+        """
+        from django.utils import timezone
+        today = today or timezone.localdate()
+        cutoff = (today - timedelta(days=self.RECENT_DAYS)).isoformat()
+        
+        for field, key, amount in tallies:
+            if key is None:
+                setattr(self, field, getattr(self, field) + sign * amount)
+                continue
+            if field in self.DAILY_FIELDS and key < cutoff:
+                continue
+            counts = getattr(self, field)
+            counts[key] = counts.get(key, 0) + sign * amount
+            if not counts[key]:
+                del counts[key]
+        
+        for field in self.DAILY_FIELDS:
+            counts = getattr(self, field)
+            for key in [key for key in counts if key < cutoff]:
+                del counts[key]
+    
+    # Reads
+    
+    @property
+    def books_all_time(self):
+        return sum(self.finished_by_month.values())
+    
+    @property
+    def pages_all_time(self):
+        return sum(self.pages_by_month.values())
+    
+    @property
+    def first_finished_month(self):
+        """First day of the earliest month a book was finished in, or None"""
+        months = [month for month in self.finished_by_month if month]
+        return date.fromisoformat(min(months) + '-01') if months else None
+    
+    @property
+    def avg_pages_per_book(self):
+        return self.finished_pages / self.finished_with_pages if self.finished_with_pages else 0
+    
+    def finished_since(self, day):
+        """(books, pages) finished on or after `day`, at most RECENT_DAYS ago"""
+        day = day.isoformat()
+        books = sum(count for key, count in self.finished_by_day.items() if key >= day)
+        pages = sum(count for key, count in self.pages_by_day.items() if key >= day)
+        return books, pages
+    
+    def finished_in_year(self, year):
+        """(books, pages) finished during `year`"""
+        prefix = f'{year:04d}-'
+        books = sum(count for key, count in self.finished_by_month.items() if key.startswith(prefix))
+        pages = sum(count for key, count in self.pages_by_month.items() if key.startswith(prefix))
+        return books, pages
+    
+    def monthly_books(self, year, through_month=12):
+        return {
+            month: self.finished_by_month.get(f'{year:04d}-{month:02d}', 0)
+            for month in range(1, through_month + 1)
+        }
+    
+    @property
+    def total_ratings(self):
+        return sum(self.rating_histogram.values())
+    
+    @property
+    def avg_rating(self):
+        total = self.total_ratings
+        if not total:
+            return 0
+        return sum(float(value) * count for value, count in self.rating_histogram.items()) / total
+    
+    def top_genres(self, limit=5):
+        return sorted(self.genre_counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    
+    def top_authors(self, limit=5):
+        return sorted(self.author_counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    
+    @property
+    def avg_pages_per_session(self):
+        return self.session_pages / self.session_count if self.session_count else 0
+    
+    @property
+    def avg_session_duration(self):
+        return self.session_minutes / self.timed_sessions if self.timed_sessions else 0
+
+
+class ReplicaHeartbeat(models.Model):
+    """A single row touched on the primary by `manage.py replica_heartbeat`.
+    
+    Its age as read on a replica is that replica's replication lag (see
+    bookcase/replicas.py).
+    """
+    
+    beat_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"Heartbeat at {self.beat_at}"
+
+
 # You could add more stats models here in the future:
 # - BookRecommendation
 # - ReadingChallenge  
@@ -0,0 +1,315 @@
+"""
+Stats sections computed from a shared, lazily loaded StatsContext.
+
+Each endpoint builds one section from a fresh context; the bundle endpoint
+builds several from the same context, so data they have in common (the
+stats snapshot with its streaks, hourly session totals) is loaded once per
+request.
+"""
+
+from datetime import timedelta
+from functools import cached_property
+
+from dateutil.relativedelta import relativedelta
+from django.db.models import Q, Count, Avg, Sum, F, Value, DateField, FilteredRelation
+from django.db.models.functions import ExtractHour, ExtractWeekDay, Greatest, Trunc
+from django.utils import timezone
+
+from apps.books.models import UserBook, BookGenre
+from . import snapshots, streaks
+from .models import ReadingSession
+
+
+# Trailing windows (in days) reported as books_last_N_days; each must fit
+# within UserStatsSnapshot.RECENT_DAYS
+BOOK_WINDOWS = [7, 14, 30, 60, 90]
+RATING_BINS = [0.5, 1.0, 1.5, 2.0, 2.5, 3.0, 3.5, 4.0, 4.5, 5.0]
+
+# Upper bound on the timeline's days so a single request can't scan unbounded history
+MAX_TIMELINE_DAYS = 730
+GRANULARITIES = {
+    'day': relativedelta(days=1),
+    'week': relativedelta(weeks=1),
+    'month': relativedelta(months=1),
+}
+
+# ExtractWeekDay numbers days from Sunday (1) to Saturday (7); heatmap rows
+# follow the same order
+WEEKDAYS = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+
+# Pages read in a session, ignoring sessions logged backwards
+SESSION_PAGES = Greatest(F('end_page') - F('start_page'), Value(0))
+
+
+class InvalidParameter(ValueError):
+    """A query parameter for a section is malformed"""
+
+
+class StatsContext:
+    """Per-request cache of the data shared between stats sections"""
+
+    def __init__(self, user, today=None):
+        self.user = user
+        self.today = today or timezone.localdate()
+
+    @cached_property
+    def snapshot(self):
+        return snapshots.get_snapshot(self.user)
+
+    @cached_property
+    def streaks(self):
+        """(current, longest) streak lengths in days"""
+        return streaks.streak_lengths(self.snapshot, self.today)
+
+    @cached_property
+    def hourly_session_pages(self):
+        """(weekday, hour, pages, sessions) per bucket of timestamped sessions"""
+        return list(
+            ReadingSession.objects.filter(user=self.user, started_at__isnull=False)
+            .annotate(weekday=ExtractWeekDay('started_at'), hour=ExtractHour('started_at'))
+            .values('weekday', 'hour').order_by('weekday', 'hour')
+            .annotate(pages=Sum(SESSION_PAGES), sessions=Count('id'))
+            .values_list('weekday', 'hour', 'pages', 'sessions')
+        )
+
+
+def dashboard(context):
+    snapshot = context.snapshot
+    today = context.today
+
+    windows = {days: snapshot.finished_since(today - timedelta(days=days)) for days in BOOK_WINDOWS}
+    books_this_year, pages_this_year = snapshot.finished_in_year(today.year)
+    books_all_time = snapshot.books_all_time
+
+    # Calculate average books per month
+    first_month = snapshot.first_finished_month
+    if first_month:
+        months_diff = (today.year - first_month.year) * 12 + today.month - first_month.month
+        avg_books_per_month = books_all_time / max(months_diff, 1)
+    else:
+        avg_books_per_month = 0
+
+    # Average pages per day (last 30 days)
+    pages_last_30_days = windows[30][1]
+    avg_pages_per_day = pages_last_30_days / 30
+
+    current_streak_days, longest_streak_days = context.streaks
+
+    return {
+        'books_last_7_days': windows[7][0],
+        'books_last_14_days': windows[14][0],
+        'books_last_30_days': windows[30][0],
+        'books_last_60_days': windows[60][0],
+        'books_last_90_days': windows[90][0],
+        'books_this_year': books_this_year,
+        'books_all_time': books_all_time,
+        'monthly_books': snapshot.monthly_books(today.year, today.month),
+        'pages_last_30_days': pages_last_30_days,
+        'pages_last_60_days': windows[60][1],
+        'pages_last_90_days': windows[90][1],
+        'pages_this_year': pages_this_year,
+        'pages_all_time': snapshot.pages_all_time,
+        'avg_pages_per_book': round(snapshot.avg_pages_per_book, 1),
+        'avg_books_per_month': round(avg_books_per_month, 1),
+        'avg_pages_per_day': round(avg_pages_per_day, 1),
+        'current_streak_days': current_streak_days,
+        'longest_streak_days': longest_streak_days,
+        'currently_reading': snapshot.status_counts.get('reading', 0),
+        'finished_books': books_all_time,
+        'tbr_books': snapshot.status_counts.get('tbr', 0),
+        'avg_rating': round(snapshot.avg_rating, 1),
+        'total_ratings': snapshot.total_ratings,
+        'rating_distribution': {
+            str(value): snapshot.rating_histogram.get(snapshots.rating_key(value), 0)
+            for value in RATING_BINS
+        },
+    }
+
+
+def timeline_params(params):
+    """Validate the days/granularity query parameters"""
+    granularity = params.get('granularity', 'day')
+    try:
+        days = int(params.get('days', 30))
+    except ValueError:
+        raise InvalidParameter('days must be an integer')
+    if granularity not in GRANULARITIES:
+        raise InvalidParameter(f"granularity must be one of: {', '.join(GRANULARITIES)}")
+    return min(max(days, 0), MAX_TIMELINE_DAYS), granularity
+
+
+def _bucket_start(day, granularity):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def reading_timeline(context, days=30, granularity='day'):
+    user = context.user
+    end_date = context.today
+    start_date = end_date - timedelta(days=days)
+
+    def bucket(field):
+        return Trunc(field, granularity, output_field=DateField())
+
+    # One grouped query per series instead of three queries per day
+    books_finished = dict(
+        UserBook.objects.filter(
+            user=user,
+            status='finished',
+            date_finished__date__range=(start_date, end_date)
+        ).annotate(bucket=bucket('date_finished'))
+        .values('bucket').order_by('bucket')
+        .annotate(total=Count('id'))
+        .values_list('bucket', 'total')
+    )
+
+    books_started = dict(
+        UserBook.objects.filter(
+            user=user,
+            date_started__date__range=(start_date, end_date)
+        ).annotate(bucket=bucket('date_started'))
+        .values('bucket').order_by('bucket')
+        .annotate(total=Count('id'))
+        .values_list('bucket', 'total')
+    )
+
+    pages_read = dict(
+        ReadingSession.objects.filter(
+            user=user,
+            session_date__range=(start_date, end_date)
+        ).annotate(bucket=bucket('session_date'))
+        .values('bucket').order_by('bucket')
+        .annotate(total=Sum(SESSION_PAGES))
+        .values_list('bucket', 'total')
+    )
+
+    # Fill in empty buckets so charts get a continuous series
+    current_date = _bucket_start(start_date, granularity)
+    step = GRANULARITIES[granularity]
+
+    timeline_data = []
+    while current_date <= end_date:
+        timeline_data.append({
+            'date': current_date,
+            'books_finished': books_finished.get(current_date, 0),
+            'pages_read': pages_read.get(current_date, 0),
+            'books_started': books_started.get(current_date, 0),
+        })
+        current_date += step
+    return timeline_data
+
+
+def genre_breakdown(context):
+    user = context.user
+    total_books = context.snapshot.books_all_time
+
+    # Group the user's finished books by genre in the database. The overall
+    # rating is joined through a FilteredRelation so each book contributes
+    # at most one rating row.
+    genre_rows = BookGenre.objects.filter(
+        book__userbook__user=user,
+        book__userbook__status='finished'
+    ).annotate(
+        overall=FilteredRelation(
+            'book__rating',
+            condition=Q(book__rating__user=user, book__rating__rating_type='overall')
+        )
+    ).values('genre__name').annotate(
+        book_count=Count('book_id'),
+        total_pages=Sum('book__pages'),
+        avg_rating=Avg('overall__rating')
+    ).order_by('-book_count', 'genre__name')
+
+    genre_breakdown = []
+    for row in genre_rows:
+        percentage = (row['book_count'] / total_books * 100) if total_books > 0 else 0
+
+        genre_breakdown.append({
+            'genre': row['genre__name'],
+            'book_count': row['book_count'],
+            'total_pages': row['total_pages'] or 0,
+            'avg_rating': round(float(row['avg_rating'] or 0), 1),
+            'percentage': round(percentage, 1)
+        })
+    return genre_breakdown
+
+
+def reading_habits(context):
+    snapshot = context.snapshot
+    thirty_days_ago = context.today - timedelta(days=30)
+
+    # Pages per weekday, with the last 30 days summed alongside, in one GROUP BY
+    weekday_rows = ReadingSession.objects.filter(user=context.user).annotate(
+        weekday=ExtractWeekDay('session_date')
+    ).values('weekday').order_by('weekday').annotate(
+        pages=Sum(SESSION_PAGES),
+        recent_pages=Sum(SESSION_PAGES, filter=Q(session_date__gte=thirty_days_ago))
+    )
+
+    # Average pages per day (last 30 days)
+    weekday_pages = {}
+    recent_pages = 0
+    for row in weekday_rows:
+        weekday_pages[WEEKDAYS[row['weekday'] - 1]] = row['pages'] or 0
+        recent_pages += row['recent_pages'] or 0
+    avg_pages_per_day = recent_pages / 30
+
+    # Most productive days (by pages read)
+    most_productive_days = sorted(
+        weekday_pages.items(),
+        key=lambda x: x[1],
+        reverse=True
+    )[:3]
+
+    # Most productive hours, from sessions with a start time
+    hour_pages = {}
+    for _, hour, pages, _ in context.hourly_session_pages:
+        hour_pages[hour] = hour_pages.get(hour, 0) + (pages or 0)
+    most_productive_hours = sorted(hour_pages.items(), key=lambda x: (-x[1], x[0]))[:3]
+
+    # Longest and shortest books, each an ordered LIMIT query
+    with_pages = UserBook.objects.filter(
+        user=context.user, status='finished', book__pages__gt=0
+    ).select_related('book')
+    longest_books = [
+        (user_book.book.title, user_book.book.pages)
+        for user_book in with_pages.order_by('-book__pages', 'book__title')[:3]
+    ]
+    shortest_books = [
+        (user_book.book.title, user_book.book.pages)
+        for user_book in with_pages.order_by('book__pages', 'book__title')[:3]
+    ]
+
+    return {
+        'avg_pages_per_day': round(avg_pages_per_day, 1),
+        'avg_pages_per_session': round(snapshot.avg_pages_per_session, 1),
+        'avg_session_duration': round(snapshot.avg_session_duration, 1),
+        'most_productive_days': [{'day': day, 'pages': pages} for day, pages in most_productive_days],
+        'most_productive_hours': [{'hour': hour, 'pages': pages} for hour, pages in most_productive_hours],
+        'favorite_authors': [{'author': author, 'count': count} for author, count in snapshot.top_authors()],
+        'favorite_genres': [{'genre': genre, 'count': count} for genre, count in snapshot.top_genres()],
+        'longest_books': [{'title': title, 'pages': pages} for title, pages in longest_books],
+        'shortest_books': [{'title': title, 'pages': pages} for title, pages in shortest_books],
+    }
+
+
+def reading_heatmap(context):
+    """Pages read per weekday and hour of day, in the current time zone.
+
+    Each session counts towards the hour it started in.
+    """
+    heatmap = [[0] * 24 for _ in WEEKDAYS]
+    timestamped_sessions = 0
+    for weekday, hour, pages, sessions in context.hourly_session_pages:
+        heatmap[weekday - 1][hour] = pages or 0
+        timestamped_sessions += sessions
+
+    return {
+        'weekdays': WEEKDAYS,
+        'hours': [sum(row[hour] for row in heatmap) for hour in range(24)],
+        'heatmap': heatmap,
+        'timestamped_sessions': timestamped_sessions,
+    }
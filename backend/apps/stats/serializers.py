@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from django.utils import timezone
 from .models import ReadingSession, ReadingStreak
 from apps.books.models import UserBook, Book, Rating
 
@@ -79,3 +80,50 @@ class ReadingHabitsSerializer(serializers.Serializer):
     favorite_genres = serializers.ListField()
     longest_books = serializers.ListField()
     shortest_books = serializers.ListField()
+
+
+class ReadingHeatmapSerializer(serializers.Serializer):
+    """Serializer for pages read by weekday and hour of day"""
+    
+    weekdays = serializers.ListField(child=serializers.CharField())
+    hours = serializers.ListField(child=serializers.IntegerField())  # Pages per hour, 0-23
+    heatmap = serializers.ListField(  # One row of 24 hours per weekday
+        child=serializers.ListField(child=serializers.IntegerField())
+    )
+    timestamped_sessions = serializers.IntegerField()
+
+
+class ReadingSessionSerializer(serializers.ModelSerializer):
+    """Serializer for logging and listing reading sessions.
+    
+    Sessions are logged against a book in the user's library; session_date
+    defaults to the day the session started, and duration_minutes to the
+    time between started_at and ended_at.
+    """
+    
+    user_book_id = serializers.IntegerField(write_only=True)
+    session_date = serializers.DateField(required=False)
+    pages_read = serializers.ReadOnlyField()
+    
+    class Meta:
+        model = ReadingSession
+        fields = ['id', 'user_book_id', 'book', 'start_page', 'end_page', 'pages_read', 'session_date',
+                  'duration_minutes', 'started_at', 'ended_at', 'notes', 'created_at']
+        read_only_fields = ['book', 'created_at']
+    
+    def validate(self, data):
+        if data['start_page'] < 0 or data['end_page'] < data['start_page']:
+            raise serializers.ValidationError('Pages must satisfy 0 <= start_page <= end_page.')
+        
+        started_at, ended_at = data.get('started_at'), data.get('ended_at')
+        if started_at and ended_at:
+            if ended_at < started_at:
+                raise serializers.ValidationError('ended_at must not be before started_at.')
+            if data.get('duration_minutes') is None:
+                data['duration_minutes'] = int((ended_at - started_at).total_seconds() // 60)
+        if data.get('duration_minutes') is not None and data['duration_minutes'] < 0:
+            raise serializers.ValidationError('duration_minutes cannot be negative.')
+        
+        if 'session_date' not in data:
+            data['session_date'] = timezone.localdate(started_at) if started_at else timezone.localdate()
+        return data
@@ -0,0 +1,87 @@
+"""
+Logging ReadingSessions in bulk.
+
+Reading trackers sync one or many sessions per call. Each call is stored
+with a single bulk insert, the progress of the books involved is written
+with a single bulk update, and bulk_saved is sent once for each, so the
+stats snapshot, streaks and response cache are updated by a fixed number
+of queries however many sessions arrive.
+"""
+
+from datetime import datetime, time
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.books.models import UserBook
+from apps.books.signals import bulk_saved
+from .models import ReadingSession
+
+
+MAX_SESSIONS = 500
+
+
+class SessionLogError(ValueError):
+    """The logged sessions can't be stored as a whole"""
+
+
+def _start_time(entry):
+    """When a session began, falling back to the start of its day"""
+    if entry.get('started_at'):
+        return entry['started_at']
+    return timezone.make_aware(datetime.combine(entry['session_date'], time.min))
+
+
+def log_sessions(user, entries):
+    """Store validated session dicts for `user` and advance their books.
+
+    A book's current_page moves forward to the furthest page reached and
+    never back, so sessions synced out of order can't undo progress;
+    date_started is set from the earliest session if it was empty.
+    """
+    if not entries:
+        raise SessionLogError('At least one session is required')
+    if len(entries) > MAX_SESSIONS:
+        raise SessionLogError(f'At most {MAX_SESSIONS} sessions can be logged at once')
+
+    ids = {entry['user_book_id'] for entry in entries}
+    with transaction.atomic():
+        user_books = UserBook.objects.select_for_update().filter(user=user, pk__in=ids).in_bulk()
+        missing = ids - user_books.keys()
+        if missing:
+            raise SessionLogError(f"Books not found in your library: {', '.join(map(str, sorted(missing)))}")
+
+        unstarted = {pk for pk, user_book in user_books.items() if user_book.date_started is None}
+        sessions = []
+        changed = {}
+        for entry in entries:
+            user_book = user_books[entry['user_book_id']]
+            sessions.append(ReadingSession(
+                user=user,
+                book_id=user_book.book_id,
+                start_page=entry['start_page'],
+                end_page=entry['end_page'],
+                session_date=entry['session_date'],
+                duration_minutes=entry.get('duration_minutes'),
+                started_at=entry.get('started_at'),
+                ended_at=entry.get('ended_at'),
+                notes=entry.get('notes'),
+            ))
+
+            if entry['end_page'] > user_book.current_page:
+                user_book.current_page = entry['end_page']
+                changed[user_book.pk] = user_book
+            if user_book.pk in unstarted:
+                started = _start_time(entry)
+                if user_book.date_started is None or started < user_book.date_started:
+                    user_book.date_started = started
+                    changed[user_book.pk] = user_book
+
+        ReadingSession.objects.bulk_create(sessions)
+        bulk_saved.send(sender=ReadingSession, instances=sessions)
+
+        if changed:
+            UserBook.objects.bulk_update(changed.values(), ['current_page', 'date_started'])
+            bulk_saved.send(sender=UserBook, instances=list(changed.values()))
+
+    return sessions
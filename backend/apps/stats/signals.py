@@ -0,0 +1,178 @@
+"""
+Receivers that keep UserStatsSnapshot and the stats response cache in step
+with library writes.
+
+Each tracked instance remembers the values of its stats fields as loaded
+from the database. On save or delete the tallies for that stored state are
+swapped for the tallies of the new one; saves that don't touch a stats
+field (notes, current_page, ...) cost nothing.
+"""
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from apps.books.models import Book, UserBook, Rating
+from apps.books.signals import bulk_saved
+from . import cache, snapshots, streaks
+from .models import ReadingSession, ReadingStreak, UserStatsSnapshot
+
+
+TRACKED_FIELDS = {
+    UserBook: ('status', 'date_finished', 'book_id'),
+    Rating: ('rating_type', 'rating'),
+    ReadingSession: ('start_page', 'end_page', 'duration_minutes', 'session_date'),
+}
+
+# Stored state of an instance loaded with some tracked fields deferred
+UNKNOWN = object()
+
+
+def _stored_state(instance):
+    if instance.pk is None:
+        return None
+    fields = TRACKED_FIELDS[type(instance)]
+    # Read __dict__ directly so deferred fields aren't loaded one by one
+    if any(field not in instance.__dict__ for field in fields):
+        return UNKNOWN
+    return tuple(instance.__dict__[field] for field in fields)
+
+
+def _current_state(instance):
+    return tuple(getattr(instance, field) for field in TRACKED_FIELDS[type(instance)])
+
+
+def _tallies(instance, state):
+    if state is None:
+        return []
+    if isinstance(instance, UserBook):
+        status, date_finished, book_id = state
+        book = None
+        if status == 'finished':
+            book = instance.book if book_id == instance.book_id else Book.objects.get(pk=book_id)
+        return snapshots.user_book_tallies(status, date_finished, book)
+    if isinstance(instance, Rating):
+        return snapshots.rating_tallies(*state)
+    return snapshots.session_tallies(*state[:3])
+
+
+def _changes(instances, deleted=False):
+    """Collect {user_id: (removed, added)} tallies for changed instances"""
+    changes = {}
+    stale_users = set()
+    for instance in instances:
+        old = getattr(instance, '_stats_state', None)
+        new = None if deleted else _current_state(instance)
+        instance._stats_state = new
+        if old is UNKNOWN:
+            stale_users.add(instance.user_id)
+        elif old != new:
+            removed, added = changes.setdefault(instance.user_id, ([], []))
+            removed.extend(_tallies(instance, old))
+            added.extend(_tallies(instance, new))
+    return changes, stale_users
+
+
+def _update_streaks(sessions, deleted=False):
+    """Extend streaks with new session dates; rebuild them if dates went away"""
+    new_dates = {}
+    rebuild = set()
+    for session in sessions:
+        old = getattr(session, '_stats_state', None)
+        if old is None and not deleted:
+            new_dates.setdefault(session.user_id, []).append(session.session_date)
+        elif deleted or old is UNKNOWN or old[-1] != session.session_date:
+            rebuild.add(session.user_id)
+
+    for user_id in rebuild:
+        streaks.rebuild_streaks(user_id)
+    for user_id, dates in new_dates.items():
+        if user_id not in rebuild:
+            streaks.record_session_dates(user_id, dates)
+
+
+def _apply(instances, deleted=False):
+    if instances and isinstance(instances[0], ReadingSession):
+        _update_streaks(instances, deleted)
+    changes, stale_users = _changes(instances, deleted)
+    for user_id, (removed, added) in changes.items():
+        if user_id not in stale_users:
+            snapshots.update_snapshot(user_id, removed, added)
+    if stale_users:
+        # Their previous tallies are unknown, so recount them once this commits
+        transaction.on_commit(lambda: _rebuild_snapshots(stale_users))
+
+
+def _rebuild_snapshots(user_ids):
+    for user in User.objects.filter(pk__in=user_ids):
+        snapshots.rebuild_snapshot(user)
+
+
+@receiver(post_init, sender=UserBook)
+@receiver(post_init, sender=Rating)
+@receiver(post_init, sender=ReadingSession)
+def remember_stats_state(sender, instance, **kwargs):
+    instance._stats_state = _stored_state(instance)
+
+
+@receiver(post_save, sender=UserBook)
+@receiver(post_save, sender=Rating)
+@receiver(post_save, sender=ReadingSession)
+def update_snapshot_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _apply([instance])
+
+
+@receiver(post_delete, sender=UserBook)
+@receiver(post_delete, sender=Rating)
+@receiver(post_delete, sender=ReadingSession)
+def update_snapshot_on_delete(sender, instance, **kwargs):
+    _apply([instance], deleted=True)
+
+
+@receiver(bulk_saved)
+def update_snapshot_on_bulk_save(sender, instances, **kwargs):
+    if sender is Rating:
+        # Upserted ratings can't tell inserts from updates; recount instead
+        for rating in instances:
+            rating._stats_state = _current_state(rating)
+        snapshots.refresh_rating_histograms({rating.user_id for rating in instances})
+    elif sender in TRACKED_FIELDS:
+        _apply(instances)
+
+
+@receiver(post_save, sender=User)
+def create_snapshot_for_new_user(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStatsSnapshot.objects.create(user=instance)
+
+
+def _bump_versions(user_ids):
+    # Bump now so this request sees its own writes, and again on commit so a
+    # response computed from the old rows in the meantime isn't kept
+    def bump():
+        for user_id in user_ids:
+            cache.bump_version(user_id)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+@receiver(post_save, sender=UserBook)
+@receiver(post_save, sender=Rating)
+@receiver(post_save, sender=ReadingSession)
+@receiver(post_save, sender=ReadingStreak)
+@receiver(post_delete, sender=UserBook)
+@receiver(post_delete, sender=Rating)
+@receiver(post_delete, sender=ReadingSession)
+@receiver(post_delete, sender=ReadingStreak)
+def bump_stats_version(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _bump_versions({instance.user_id})
+
+
+@receiver(bulk_saved)
+def bump_stats_version_on_bulk_save(sender, instances, **kwargs):
+    if sender in (UserBook, Rating, ReadingSession, ReadingStreak):
+        _bump_versions({instance.user_id for instance in instances})
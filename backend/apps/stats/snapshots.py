@@ -0,0 +1,151 @@
+"""
+Building and updating UserStatsSnapshot rows.
+
+Each UserBook, overall Rating and ReadingSession contributes a list of
+(field, key, amount) tallies to its owner's snapshot. Writes remove the
+tallies of a row's previous state and add those of its new state, so a
+snapshot stays equal to a rebuild from scratch without rescanning history.
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from apps.books.models import UserBook, Rating
+from . import streaks
+from .models import ReadingSession, UserStatsSnapshot
+
+
+def user_book_tallies(status, date_finished, book):
+    """Tallies for a UserBook; `book` is only used for finished books"""
+    tallies = [('status_counts', status, 1)]
+    if status != 'finished':
+        return tallies
+
+    month = ''
+    if date_finished is not None:
+        day = timezone.localdate(date_finished)
+        month = day.strftime('%Y-%m')
+        tallies.append(('finished_by_day', day.isoformat(), 1))
+        if book.pages:
+            tallies.append(('pages_by_month', month, book.pages))
+            tallies.append(('pages_by_day', day.isoformat(), book.pages))
+    tallies.append(('finished_by_month', month, 1))
+
+    if book.pages is not None:
+        tallies.append(('finished_pages', None, book.pages))
+        tallies.append(('finished_with_pages', None, 1))
+    tallies.extend(('genre_counts', name, 1) for name in book.genre_names)
+    tallies.extend(('author_counts', name, 1) for name in book.author_names)
+    return tallies
+
+
+def rating_key(value):
+    return str(Decimal(str(value)).quantize(Decimal('0.1')))
+
+
+def rating_tallies(rating_type, rating):
+    if rating_type != 'overall':
+        return []
+    return [('rating_histogram', rating_key(rating), 1)]
+
+
+def session_tallies(start_page, end_page, duration_minutes):
+    tallies = [
+        ('session_count', None, 1),
+        ('session_pages', None, end_page - start_page),
+    ]
+    if duration_minutes is not None:
+        tallies.append(('session_minutes', None, duration_minutes))
+        tallies.append(('timed_sessions', None, 1))
+    return tallies
+
+
+def update_snapshot(user_id, removed=(), added=()):
+    """Apply tallies to a user's snapshot, if one has been built"""
+    if not removed and not added:
+        return
+    with transaction.atomic(savepoint=False):
+        snapshot = UserStatsSnapshot.objects.select_for_update().filter(user_id=user_id).first()
+        if snapshot is None:
+            return
+        today = timezone.localdate()
+        snapshot.apply(removed, sign=-1, today=today)
+        snapshot.apply(added, today=today)
+        snapshot.save()
+
+
+def refresh_rating_histograms(user_ids):
+    """Recount overall ratings for users whose ratings were upserted in bulk"""
+    with transaction.atomic(savepoint=False):
+        snapshots = list(UserStatsSnapshot.objects.select_for_update().filter(user_id__in=user_ids))
+        if not snapshots:
+            return
+        histograms = {snapshot.user_id: {} for snapshot in snapshots}
+        for user_id, value, count in Rating.objects.filter(
+            user_id__in=histograms.keys(), rating_type='overall'
+        ).values_list('user_id', 'rating').annotate(count=Count('id')):
+            histograms[user_id][rating_key(value)] = count
+        for snapshot in snapshots:
+            snapshot.rating_histogram = histograms[snapshot.user_id]
+        UserStatsSnapshot.objects.bulk_update(snapshots, ['rating_histogram', 'updated_at'])
+
+
+def build_snapshot(user):
+    """Compute a user's snapshot from their books, ratings and sessions, without saving it"""
+    snapshot = UserStatsSnapshot(user=user)
+    today = timezone.localdate()
+    user_books = UserBook.objects.filter(user=user).select_related('book')
+    for user_book in user_books.iterator(chunk_size=2000):
+        snapshot.apply(
+            user_book_tallies(user_book.status, user_book.date_finished, user_book.book),
+            today=today
+        )
+
+    snapshot.rating_histogram = {
+        rating_key(value): count
+        for value, count in Rating.objects.filter(
+            user=user, rating_type='overall'
+        ).values_list('rating').annotate(count=Count('id'))
+    }
+
+    sessions = ReadingSession.objects.filter(user=user).aggregate(
+        count=Count('id'),
+        pages=Sum(F('end_page') - F('start_page')),
+        minutes=Sum('duration_minutes'),
+        timed=Count('duration_minutes'),
+    )
+    snapshot.session_count = sessions['count']
+    snapshot.session_pages = sessions['pages'] or 0
+    snapshot.session_minutes = sessions['minutes'] or 0
+    snapshot.timed_sessions = sessions['timed']
+
+    latest, snapshot.longest_streak_days = streaks.summarize(streaks.session_islands(user.pk))
+    snapshot.current_streak_start, snapshot.current_streak_end = latest or (None, None)
+    return snapshot
+
+
+def rebuild_snapshot(user):
+    """Recompute and save a user's snapshot, and their ReadingStreak rows"""
+    with transaction.atomic():
+        # get_or_create re-reads the row if a concurrent insert wins the race
+        existing, _ = UserStatsSnapshot.objects.select_for_update().get_or_create(user=user)
+        streaks.rebuild_streaks(user.pk)
+        snapshot = build_snapshot(user)
+        snapshot.pk = existing.pk
+        snapshot.save()
+    return snapshot
+
+
+def get_snapshot(user):
+    """Return the user's snapshot.
+
+    Every user gets one when they sign up, and migration 0007 stored one
+    for everyone who signed up before. A user still missing theirs gets one
+    computed on the fly, unsaved, so reads never write;
+    `manage.py rebuild_stats_snapshots` stores it.
+    """
+    snapshot = UserStatsSnapshot.objects.filter(user=user).first()
+    return snapshot if snapshot is not None else build_snapshot(user)
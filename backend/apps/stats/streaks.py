@@ -0,0 +1,134 @@
+"""
+Reading streaks derived from the distinct dates of a user's ReadingSessions.
+
+A streak is an island of consecutive reading days. Islands are found with
+the gaps-and-islands trick: over the ordered distinct dates, date minus
+row number is constant within an island. Each island is stored as a
+ReadingStreak row, the latest one flagged current_streak, and the latest
+island and longest streak are copied onto UserStatsSnapshot so the
+dashboard reads them without touching ReadingStreak at all.
+
+New session dates only ever extend or merge islands, so they are applied
+incrementally; deleted or moved sessions trigger a rebuild.
+"""
+
+from datetime import timedelta
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import ReadingSession, ReadingStreak, UserStatsSnapshot
+
+
+def find_islands(dates):
+    """Group ascending distinct dates into (start, end) runs of consecutive days"""
+    islands = []
+    for _, run in groupby(enumerate(dates), key=lambda item: item[1].toordinal() - item[0]):
+        run = [day for _, day in run]
+        islands.append((run[0], run[-1]))
+    return islands
+
+
+def _length(island):
+    return (island[1] - island[0]).days + 1
+
+
+def _save_to_snapshot(user_id, latest, longest_days, replace=False):
+    """Record the latest island and longest streak on the user's snapshot"""
+    snapshot = UserStatsSnapshot.objects.select_for_update().filter(user_id=user_id).first()
+    if snapshot is None:
+        return
+    if replace or (latest and (snapshot.current_streak_end is None or latest[1] >= snapshot.current_streak_end)):
+        snapshot.current_streak_start, snapshot.current_streak_end = latest or (None, None)
+    snapshot.longest_streak_days = longest_days if replace else max(snapshot.longest_streak_days, longest_days)
+    snapshot.save(update_fields=['current_streak_start', 'current_streak_end', 'longest_streak_days', 'updated_at'])
+
+
+def session_islands(user_id):
+    """Islands of a user's distinct session dates, oldest first"""
+    dates = ReadingSession.objects.filter(
+        user_id=user_id
+    ).values_list('session_date', flat=True).distinct().order_by('session_date')
+    return find_islands(list(dates))
+
+
+def summarize(islands):
+    """The latest island (or None) and the longest streak in days"""
+    return (islands[-1] if islands else None), max(map(_length, islands), default=0)
+
+
+def rebuild_streaks(user_id):
+    """Recompute every streak for a user from their session dates.
+
+    Returns the latest island (or None) and the longest streak in days.
+    """
+    islands = session_islands(user_id)
+
+    with transaction.atomic():
+        ReadingStreak.objects.filter(user_id=user_id).delete()
+        ReadingStreak.objects.bulk_create([
+            ReadingStreak(
+                user_id=user_id,
+                start_date=start,
+                end_date=end,
+                current_streak=index == len(islands) - 1
+            )
+            for index, (start, end) in enumerate(islands)
+        ])
+
+        latest, longest_days = summarize(islands)
+        _save_to_snapshot(user_id, latest, longest_days, replace=True)
+    return latest, longest_days
+
+
+def record_session_dates(user_id, dates):
+    """Extend or merge a user's streaks with newly logged session dates"""
+    dates = sorted(set(dates))
+    if not dates:
+        return
+
+    with transaction.atomic(savepoint=False):
+        # Only islands touching the new dates (or one day either side) can change
+        touching = Q()
+        for start, end in find_islands(dates):
+            touching |= Q(start_date__lte=end + timedelta(days=1), end_date__gte=start - timedelta(days=1))
+        existing = list(ReadingStreak.objects.select_for_update().filter(touching, user_id=user_id))
+
+        days = set(dates)
+        for streak in existing:
+            days.update(streak.start_date + timedelta(days=offset) for offset in range(streak.streak_length))
+        if len(days) == sum(streak.streak_length for streak in existing):
+            return  # Every date was already inside a streak
+
+        islands = find_islands(sorted(days))
+        latest = islands[-1]
+        is_latest = not ReadingStreak.objects.filter(
+            user_id=user_id, start_date__gt=latest[1]
+        ).exclude(pk__in=[streak.pk for streak in existing]).exists()
+        if is_latest:
+            ReadingStreak.objects.filter(user_id=user_id, current_streak=True).update(current_streak=False)
+
+        ReadingStreak.objects.filter(pk__in=[streak.pk for streak in existing]).delete()
+        ReadingStreak.objects.bulk_create([
+            ReadingStreak(
+                user_id=user_id,
+                start_date=start,
+                end_date=end,
+                current_streak=is_latest and (start, end) == latest
+            )
+            for start, end in islands
+        ])
+
+        _save_to_snapshot(user_id, latest if is_latest else None, max(map(_length, islands)))
+
+
+def streak_lengths(snapshot, today):
+    """(current, longest) streak in days from a snapshot.
+
+    The current streak survives until a full day passes without reading.
+    """
+    current = 0
+    if snapshot.current_streak_end and snapshot.current_streak_end >= today - timedelta(days=1):
+        current = (snapshot.current_streak_end - snapshot.current_streak_start).days + 1
+    return current, snapshot.longest_streak_days
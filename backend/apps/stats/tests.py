@@ -1,3 +1,858 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, connections, router
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.books.models import Book, UserBook, Rating
+from apps.books import batch
+from apps.books.models import upsert_ratings
+from bookcase import replicas
+from .models import ReadingSession, ReadingStreak, ReplicaHeartbeat, UserStatsSnapshot
+from .streaks import find_islands
+from . import cache as stats_cache, snapshots
+from .views import (
+    DashboardStatsView, ReadingTimelineView, GenreBreakdownView, ReadingHabitsView, ReadingHeatmapView,
+    StatsBundleView, ReadingSessionsView
+)
+
+
+class StatsTestCase(TestCase):
+    """Shared fixtures for the stats endpoint tests"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='secret')
+        cls.factory = APIRequestFactory()
+
+    def add_book(self, key, status='finished', pages=300, finished_days_ago=None, genres=None, authors=None):
+        book = Book.objects.create(
+            open_library_id=key,
+            title=f'Book {key}',
+            authors=authors or ['Author'],
+            genres=genres or [],
+            pages=pages,
+        )
+        book.sync_authors_and_genres()
+        date_finished = None
+        if finished_days_ago is not None:
+            date_finished = timezone.now() - timedelta(days=finished_days_ago)
+        return UserBook.objects.create(
+            user=self.user,
+            book=book,
+            status=status,
+            date_finished=date_finished,
+        )
+
+    def rate(self, user_book, value, rating_type='overall'):
+        return Rating.objects.create(
+            user=self.user,
+            book=user_book.book,
+            rating_type=rating_type,
+            rating=Decimal(str(value)),
+        )
+
+    def setUp(self):
+        stats_cache.get_cache().clear()
+
+    def get(self, view, path, headers=None, **params):
+        request = self.factory.get(path, params, **(headers or {}))
+        force_authenticate(request, user=self.user)
+        return view.as_view()(request)
+
+    def post(self, view, path, data):
+        request = self.factory.post(path, data, format='json')
+        force_authenticate(request, user=self.user)
+        return view.as_view()(request)
+
+
+class DashboardStatsViewTests(StatsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.recent = self.add_book('OL1W', pages=100, finished_days_ago=0)
+        self.older = self.add_book('OL2W', pages=200, finished_days_ago=45)
+        self.add_book('OL3W', status='reading')
+        self.add_book('OL4W', status='tbr')
+        self.add_book('OL5W', status='tbr')
+        self.rate(self.recent, 4.5)
+        self.rate(self.older, 3.0)
+        self.rate(self.older, 5.0, rating_type='plot')
+
+    def test_windows_and_distribution(self):
+        data = self.get(DashboardStatsView, '/api/stats/dashboard/').data
+
+        self.assertEqual(data['books_last_7_days'], 1)
+        self.assertEqual(data['books_last_30_days'], 1)
+        self.assertEqual(data['books_last_60_days'], 2)
+        self.assertEqual(data['books_all_time'], 2)
+        self.assertEqual(data['pages_last_30_days'], 100)
+        self.assertEqual(data['pages_last_60_days'], 300)
+        self.assertEqual(data['pages_all_time'], 300)
+        self.assertEqual(data['avg_pages_per_book'], 150.0)
+        self.assertEqual(data['currently_reading'], 1)
+        self.assertEqual(data['tbr_books'], 2)
+        self.assertEqual(data['total_ratings'], 2)
+        self.assertEqual(data['rating_distribution']['4.5'], 1)
+        self.assertEqual(data['rating_distribution']['3.0'], 1)
+        self.assertEqual(data['rating_distribution']['5.0'], 0)
+        self.assertEqual(sum(data['monthly_books'].values()), data['books_this_year'])
+
+    def test_query_count_is_constant(self):
+        # Just the stats snapshot
+        with self.assertNumQueries(1):
+            self.get(DashboardStatsView, '/api/stats/dashboard/')
+
+        for i in range(20):
+            self.rate(self.add_book(f'OL{100 + i}W', finished_days_ago=i * 10), 2.5)
+
+        with self.assertNumQueries(1):
+            self.get(DashboardStatsView, '/api/stats/dashboard/')
+
+    def test_missing_snapshot_is_computed_without_writing(self):
+        expected = self.get(DashboardStatsView, '/api/stats/dashboard/').data
+        UserStatsSnapshot.objects.filter(user=self.user).delete()
+        stats_cache.bump_version(self.user.pk)
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self.get(DashboardStatsView, '/api/stats/dashboard/').data
+
+        self.assertEqual(data, expected)
+        self.assertTrue(all(query['sql'].startswith('SELECT') for query in queries), queries.captured_queries)
+        self.assertFalse(UserStatsSnapshot.objects.filter(user=self.user).exists())
+
+
+class ReadingTimelineViewTests(StatsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user_book = self.add_book('OL1W', finished_days_ago=2)
+        for offset in range(5):
+            ReadingSession.objects.create(
+                user=self.user,
+                book=self.user_book.book,
+                start_page=offset * 20,
+                end_page=offset * 20 + 20,
+                session_date=timezone.now().date() - timedelta(days=offset),
+            )
+
+    def test_daily_series_is_filled(self):
+        data = self.get(ReadingTimelineView, '/api/stats/reading-timeline/', days=10).data
+
+        self.assertEqual(len(data), 11)
+        self.assertEqual(sum(day['pages_read'] for day in data), 100)
+        self.assertEqual(sum(day['books_finished'] for day in data), 1)
+
+    def test_query_count_does_not_depend_on_range(self):
+        with self.assertNumQueries(3):
+            self.get(ReadingTimelineView, '/api/stats/reading-timeline/', days=365)
+
+    def test_days_is_capped(self):
+        data = self.get(ReadingTimelineView, '/api/stats/reading-timeline/', days=100000).data
+
+        self.assertEqual(len(data), ReadingTimelineView.MAX_DAYS + 1)
+
+    def test_month_granularity(self):
+        data = self.get(
+            ReadingTimelineView, '/api/stats/reading-timeline/', days=365, granularity='month'
+        ).data
+
+        self.assertLessEqual(len(data), 13)
+        self.assertTrue(all(row['date'].endswith('-01') for row in data))
+        self.assertEqual(sum(row['pages_read'] for row in data), 100)
+
+    def test_invalid_granularity(self):
+        response = self.get(ReadingTimelineView, '/api/stats/reading-timeline/', granularity='hour')
+
+        self.assertEqual(response.status_code, 400)
+
+
+class GenreBreakdownViewTests(StatsTestCase):
+
+    def test_breakdown(self):
+        fantasy = self.add_book('OL1W', pages=400, finished_days_ago=1, genres=['Fantasy', 'Adventure'])
+        self.add_book('OL2W', pages=100, finished_days_ago=1, genres=['Fantasy'])
+        self.add_book('OL3W', status='reading', genres=['Fantasy'])
+        self.rate(fantasy, 4.0)
+
+        data = self.get(GenreBreakdownView, '/api/stats/genre-breakdown/').data
+
+        self.assertEqual(data[0]['genre'], 'Fantasy')
+        self.assertEqual(data[0]['book_count'], 2)
+        self.assertEqual(data[0]['total_pages'], 500)
+        self.assertEqual(data[0]['avg_rating'], 4.0)
+        self.assertEqual(data[0]['percentage'], 100.0)
+        self.assertEqual(data[1]['percentage'], 50.0)
+
+    def test_query_count_is_constant(self):
+        for i in range(30):
+            user_book = self.add_book(f'OL{i}W', finished_days_ago=i, genres=['A', 'B', 'C', 'D', 'E'])
+            self.rate(user_book, 3.5)
+
+        with self.assertNumQueries(2):
+            self.get(GenreBreakdownView, '/api/stats/genre-breakdown/')
+
+
+class ReadingHabitsViewTests(StatsTestCase):
+
+    def test_favorite_authors_and_genres(self):
+        self.add_book('OL1W', finished_days_ago=1, authors=['Le Guin'], genres=['Fantasy'])
+        self.add_book('OL2W', finished_days_ago=2, authors=['Le Guin', 'Jemisin'], genres=['Fantasy', 'Sci-Fi'])
+        self.add_book('OL3W', status='tbr', authors=['Jemisin'], genres=['Sci-Fi'])
+
+        data = self.get(ReadingHabitsView, '/api/stats/reading-habits/').data
+
+        self.assertEqual(data['favorite_authors'][0], {'author': 'Le Guin', 'count': 2})
+        self.assertEqual(data['favorite_authors'][1], {'author': 'Jemisin', 'count': 1})
+        self.assertEqual(data['favorite_genres'][0], {'genre': 'Fantasy', 'count': 2})
+
+    def test_sessions_and_book_lengths(self):
+        short = self.add_book('OL1W', pages=90, finished_days_ago=1)
+        self.add_book('OL2W', pages=900, finished_days_ago=1)
+        self.add_book('OL3W', pages=400, finished_days_ago=1)
+        self.add_book('OL4W', pages=None, finished_days_ago=1)
+        self.add_book('OL5W', pages=1200, status='reading')
+        monday = timezone.localdate() - timedelta(days=timezone.localdate().weekday() + 7)
+        for session_date, pages in [(monday, 50), (monday + timedelta(days=7), 20), (monday + timedelta(days=2), 30)]:
+            ReadingSession.objects.create(
+                user=self.user, book=short.book, start_page=0, end_page=pages, session_date=session_date
+            )
+
+        data = self.get(ReadingHabitsView, '/api/stats/reading-habits/').data
+
+        self.assertEqual(data['most_productive_days'], [
+            {'day': 'Monday', 'pages': 70}, {'day': 'Wednesday', 'pages': 30}
+        ])
+        self.assertEqual(data['avg_pages_per_day'], round(100 / 30, 1))
+        self.assertEqual([book['pages'] for book in data['longest_books']], [900, 400, 90])
+        self.assertEqual([book['pages'] for book in data['shortest_books']], [90, 400, 900])
+
+    def test_query_count_does_not_depend_on_history(self):
+        for i in range(10):
+            user_book = self.add_book(f'OL{i}W', pages=100 + i, finished_days_ago=i)
+            ReadingSession.objects.bulk_create([
+                ReadingSession(
+                    user=self.user, book=user_book.book, start_page=0, end_page=10,
+                    session_date=timezone.localdate() - timedelta(days=day)
+                )
+                for day in range(100)
+            ])
+
+        # Snapshot, weekday totals, hourly totals, longest and shortest books
+        with self.assertNumQueries(5):
+            self.get(ReadingHabitsView, '/api/stats/reading-habits/')
+
+
+class UserStatsSnapshotTests(StatsTestCase):
+    """The incrementally maintained snapshot must match a rebuild"""
+
+    FIELDS = [
+        'status_counts', 'finished_by_month', 'pages_by_month', 'finished_by_day', 'pages_by_day',
+        'finished_pages', 'finished_with_pages', 'genre_counts', 'author_counts',
+        'rating_histogram', 'session_count', 'session_pages', 'session_minutes', 'timed_sessions',
+        'current_streak_start', 'current_streak_end', 'longest_streak_days',
+    ]
+
+    def assertSnapshotIsCurrent(self):
+        snapshot = UserStatsSnapshot.objects.get(user=self.user)
+        rebuilt = snapshots.rebuild_snapshot(self.user)
+        for field in self.FIELDS:
+            self.assertEqual(getattr(snapshot, field), getattr(rebuilt, field), field)
+        return rebuilt
+
+    def test_single_writes(self):
+        first = self.add_book('OL1W', pages=250, finished_days_ago=3, genres=['Fantasy'], authors=['Le Guin'])
+        second = self.add_book('OL2W', status='reading', pages=None, genres=['Fantasy', 'Horror'])
+        self.add_book('OL3W', status='finished', pages=120)
+        rating = self.rate(first, 4.0)
+        self.rate(first, 2.0, rating_type='plot')
+        ReadingSession.objects.create(
+            user=self.user, book=second.book, start_page=0, end_page=40,
+            session_date=timezone.now().date(), duration_minutes=30
+        )
+        self.assertSnapshotIsCurrent()
+
+        second.apply_status('finished')
+        second.save()
+        first.status = 'dnf'
+        first.save()
+        rating.rating = Decimal('3.5')
+        rating.save()
+        UserBook.objects.get(book__open_library_id='OL3W').delete()
+        snapshot = self.assertSnapshotIsCurrent()
+
+        self.assertEqual(snapshot.status_counts, {'finished': 1, 'dnf': 1})
+        self.assertEqual(snapshot.genre_counts, {'Fantasy': 1, 'Horror': 1})
+        self.assertEqual(snapshot.rating_histogram, {'3.5': 1})
+        self.assertEqual(snapshot.session_pages, 40)
+
+    def test_saves_that_dont_change_stats_skip_the_snapshot(self):
+        user_book = self.add_book('OL1W', status='reading')
+        user_book.current_page = 50
+        user_book.notes = 'Slow start'
+
+        with self.assertNumQueries(1):
+            user_book.save()
+
+    def test_bulk_writes(self):
+        reading = self.add_book('OL1W', status='reading', genres=['Sci-Fi'])
+        results = batch.apply_batch(self.user, [
+            {'op': 'add', 'book': {'open_library_id': 'OL2W', 'title': 'Two', 'subjects': ['Poetry']}, 'status': 'finished'},
+            {'op': 'status', 'open_library_id': 'OL2W', 'status': 'dnf'},
+            {'op': 'status', 'user_book_id': reading.id, 'status': 'finished'},
+            {'op': 'rate', 'user_book_id': reading.id, 'ratings': {'overall': 5}},
+        ])
+        self.assertTrue(all(result['status'] == 'ok' for result in results))
+        self.assertSnapshotIsCurrent()
+
+        upsert_ratings([Rating(user=self.user, book=reading.book, rating_type='overall', rating=Decimal('1.5'))])
+        snapshot = self.assertSnapshotIsCurrent()
+
+        self.assertEqual(snapshot.status_counts, {'finished': 1, 'dnf': 1})
+        self.assertEqual(snapshot.genre_counts, {'Sci-Fi': 1})
+        self.assertEqual(snapshot.rating_histogram, {'1.5': 1})
+
+    def test_old_days_are_pruned(self):
+        self.add_book('OL1W', finished_days_ago=UserStatsSnapshot.RECENT_DAYS + 10)
+        self.add_book('OL2W', finished_days_ago=1)
+        snapshot = self.assertSnapshotIsCurrent()
+
+        self.assertEqual(sum(snapshot.finished_by_day.values()), 1)
+        self.assertEqual(snapshot.books_all_time, 2)
+
+    def test_writes_with_unknown_previous_state_rebuild_the_snapshot(self):
+        user_book = self.add_book('OL1W', status='reading')
+        self.add_book('OL2W', finished_days_ago=1)
+
+        # Deferred stats fields leave the previous tallies unknown
+        user_book = UserBook.objects.only('id', 'user_id').get(pk=user_book.pk)
+        user_book.status = 'finished'
+        with self.captureOnCommitCallbacks(execute=True):
+            user_book.save()
+
+        snapshot = self.assertSnapshotIsCurrent()
+        self.assertEqual(snapshot.status_counts, {'finished': 2})
+
+    def test_rebuild_command(self):
+        self.add_book('OL1W', finished_days_ago=1)
+        UserStatsSnapshot.objects.all().delete()
+
+        call_command('rebuild_stats_snapshots', 'reader', stdout=StringIO())
+
+        self.assertEqual(UserStatsSnapshot.objects.get(user=self.user).books_all_time, 1)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_stats_snapshots', 'nobody', stdout=StringIO())
+
+
+class StatsResponseCacheTests(StatsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user_book = self.add_book('OL1W', finished_days_ago=1)
+
+    def test_unchanged_data_is_served_from_cache(self):
+        first = self.get(DashboardStatsView, '/api/stats/dashboard/')
+
+        with self.assertNumQueries(0):
+            second = self.get(DashboardStatsView, '/api/stats/dashboard/')
+
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_writes_invalidate_the_users_responses(self):
+        before = self.get(DashboardStatsView, '/api/stats/dashboard/')
+        self.rate(self.user_book, 4.0)
+        after = self.get(DashboardStatsView, '/api/stats/dashboard/')
+
+        self.assertEqual((before.data['total_ratings'], after.data['total_ratings']), (0, 1))
+        self.assertNotEqual(before['ETag'], after['ETag'])
+
+        ReadingSession.objects.create(
+            user=self.user, book=self.user_book.book, start_page=0, end_page=10,
+            session_date=timezone.now().date()
+        )
+        self.assertEqual(self.get(DashboardStatsView, '/api/stats/dashboard/').data['current_streak_days'], 1)
+
+    def test_query_parameters_are_cached_separately(self):
+        short = self.get(ReadingTimelineView, '/api/stats/reading-timeline/', days=5).data
+        long = self.get(ReadingTimelineView, '/api/stats/reading-timeline/', days=10).data
+
+        self.assertEqual((len(short), len(long)), (6, 11))
+
+    def test_responses_expire_at_midnight(self):
+        etag = self.get(DashboardStatsView, '/api/stats/dashboard/')['ETag']
+
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        with mock.patch.object(stats_cache.timezone, 'localdate', return_value=tomorrow):
+            response = self.get(
+                DashboardStatsView, '/api/stats/dashboard/', headers={'HTTP_IF_NONE_MATCH': etag}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_conditional_requests(self):
+        etag = self.get(GenreBreakdownView, '/api/stats/genre-breakdown/')['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.get(
+                GenreBreakdownView, '/api/stats/genre-breakdown/', headers={'HTTP_IF_NONE_MATCH': etag}
+            )
+        self.assertEqual(response.status_code, 304)
+
+        self.add_book('OL2W', finished_days_ago=1)
+        response = self.get(
+            GenreBreakdownView, '/api/stats/genre-breakdown/', headers={'HTTP_IF_NONE_MATCH': etag}
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class StatsBundleViewTests(StatsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for i in range(3):
+            user_book = self.add_book(f'OL{i}W', pages=100 * (i + 1), finished_days_ago=i, genres=['Fantasy'])
+            self.rate(user_book, 4.0)
+            ReadingSession.objects.create(
+                user=self.user, book=user_book.book, start_page=0, end_page=30,
+                session_date=timezone.now().date() - timedelta(days=i)
+            )
+
+    def test_sections_match_the_individual_endpoints(self):
+        data = self.get(StatsBundleView, '/api/stats/bundle/', days=7, granularity='week').data
+
+        self.assertEqual(data['dashboard'], self.get(DashboardStatsView, '/api/stats/dashboard/').data)
+        self.assertEqual(
+            data['reading_timeline'],
+            self.get(ReadingTimelineView, '/api/stats/reading-timeline/', days=7, granularity='week').data
+        )
+        self.assertEqual(data['genre_breakdown'], self.get(GenreBreakdownView, '/api/stats/genre-breakdown/').data)
+        self.assertEqual(data['reading_habits'], self.get(ReadingHabitsView, '/api/stats/reading-habits/').data)
+        self.assertEqual(data['reading_heatmap'], self.get(ReadingHeatmapView, '/api/stats/reading-heatmap/').data)
+
+    def test_shared_data_is_loaded_once(self):
+        with CaptureQueriesContext(connection) as bundle:
+            self.get(StatsBundleView, '/api/stats/bundle/')
+        stats_cache.get_cache().clear()
+
+        with CaptureQueriesContext(connection) as separate:
+            for view, path in [
+                (DashboardStatsView, '/api/stats/dashboard/'),
+                (ReadingTimelineView, '/api/stats/reading-timeline/'),
+                (GenreBreakdownView, '/api/stats/genre-breakdown/'),
+                (ReadingHabitsView, '/api/stats/reading-habits/'),
+                (ReadingHeatmapView, '/api/stats/reading-heatmap/'),
+            ]:
+                self.get(view, path)
+
+        self.assertEqual(len(bundle), 9)
+        self.assertLess(len(bundle), len(separate))
+
+    def test_sections_parameter(self):
+        data = self.get(StatsBundleView, '/api/stats/bundle/', sections='dashboard, reading_habits').data
+
+        self.assertEqual(set(data), {'dashboard', 'reading_habits'})
+
+        # The snapshot and the genre rows
+        with self.assertNumQueries(2):
+            self.get(StatsBundleView, '/api/stats/bundle/', sections='genre_breakdown')
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.get(StatsBundleView, '/api/stats/bundle/', sections='dashboard,nope').status_code, 400)
+        self.assertEqual(self.get(StatsBundleView, '/api/stats/bundle/', granularity='hour').status_code, 400)
+
+
+class ReadingStreakTests(StatsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.book = self.add_book('OL1W', status='reading').book
+        self.today = timezone.localdate()
+
+    def read(self, *days_ago):
+        for days in days_ago:
+            ReadingSession.objects.create(
+                user=self.user, book=self.book, start_page=0, end_page=10,
+                session_date=self.today - timedelta(days=days)
+            )
+
+    def streaks(self):
+        return list(ReadingStreak.objects.filter(user=self.user).order_by('start_date').values_list(
+            'start_date', 'end_date', 'current_streak'
+        ))
+
+    def assertStreaksAreCurrent(self):
+        incremental = self.streaks()
+        snapshot = UserStatsSnapshot.objects.get(user=self.user)
+        rebuilt = snapshots.rebuild_snapshot(self.user)
+        self.assertEqual(incremental, self.streaks())
+        self.assertEqual(
+            (snapshot.current_streak_start, snapshot.current_streak_end, snapshot.longest_streak_days),
+            (rebuilt.current_streak_start, rebuilt.current_streak_end, rebuilt.longest_streak_days)
+        )
+
+    def test_find_islands(self):
+        days = [self.today + timedelta(days=offset) for offset in (0, 1, 2, 5, 7, 8)]
+
+        self.assertEqual(find_islands(days), [(days[0], days[2]), (days[3], days[3]), (days[4], days[5])])
+        self.assertEqual(find_islands([]), [])
+
+    def test_sessions_extend_and_merge_streaks(self):
+        self.read(10, 9, 8, 7)
+        self.read(2, 1)
+        self.assertStreaksAreCurrent()
+        self.assertEqual(len(self.streaks()), 2)
+
+        # Filling the gap merges both streaks into the current one
+        self.read(6, 5, 4, 3, 3)
+        self.assertStreaksAreCurrent()
+        self.assertEqual(self.streaks(), [(self.today - timedelta(days=10), self.today - timedelta(days=1), True)])
+
+        data = self.get(DashboardStatsView, '/api/stats/dashboard/').data
+        self.assertEqual((data['current_streak_days'], data['longest_streak_days']), (10, 10))
+
+    def test_backfilled_sessions_keep_the_current_streak(self):
+        self.read(0)
+        self.read(30, 29, 28)
+        self.assertStreaksAreCurrent()
+
+        data = self.get(DashboardStatsView, '/api/stats/dashboard/').data
+        self.assertEqual((data['current_streak_days'], data['longest_streak_days']), (1, 3))
+
+    def test_lapsed_streak_is_not_current(self):
+        self.read(5, 4)
+
+        data = self.get(DashboardStatsView, '/api/stats/dashboard/').data
+        self.assertEqual((data['current_streak_days'], data['longest_streak_days']), (0, 2))
+
+    def test_deleting_a_session_rebuilds(self):
+        self.read(3, 2, 1)
+        ReadingSession.objects.get(session_date=self.today - timedelta(days=2)).delete()
+
+        self.assertStreaksAreCurrent()
+        self.assertEqual(UserStatsSnapshot.objects.get(user=self.user).longest_streak_days, 1)
+
+    def test_dashboard_reads_a_single_row(self):
+        self.read(*range(50))
+
+        with self.assertNumQueries(1):
+            self.get(DashboardStatsView, '/api/stats/dashboard/')
+
+
+class ReadingHeatmapViewTests(StatsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.book = self.add_book('OL1W', status='reading').book
+
+    def log(self, started_at, pages):
+        return ReadingSession.objects.create(
+            user=self.user, book=self.book, start_page=0, end_page=pages,
+            session_date=started_at.date(), started_at=started_at,
+            ended_at=started_at + timedelta(minutes=45)
+        )
+
+    def test_pages_by_weekday_and_hour(self):
+        # 2026-10-05 is a Monday
+        monday_night = datetime(2026, 10, 5, 21, 30, tzinfo=dt_timezone.utc)
+        self.log(monday_night, 40)
+        self.log(monday_night + timedelta(days=7), 20)
+        self.log(monday_night + timedelta(days=2, hours=-14), 15)
+        ReadingSession.objects.create(
+            user=self.user, book=self.book, start_page=0, end_page=99, session_date=monday_night.date()
+        )
+
+        data = self.get(ReadingHeatmapView, '/api/stats/reading-heatmap/').data
+
+        self.assertEqual(data['heatmap'][data['weekdays'].index('Monday')][21], 60)
+        self.assertEqual(data['heatmap'][data['weekdays'].index('Wednesday')][7], 15)
+        self.assertEqual(sum(data['hours']), 75)
+        self.assertEqual(data['timestamped_sessions'], 3)
+
+        habits = self.get(ReadingHabitsView, '/api/stats/reading-habits/').data
+        self.assertEqual(habits['most_productive_hours'], [{'hour': 21, 'pages': 60}, {'hour': 7, 'pages': 15}])
+
+    @override_settings(TIME_ZONE='America/New_York')
+    def test_buckets_use_the_current_time_zone(self):
+        self.log(datetime(2026, 10, 6, 1, 0, tzinfo=dt_timezone.utc), 10)  # Monday 21:00 in New York
+
+        data = self.get(ReadingHeatmapView, '/api/stats/reading-heatmap/').data
+
+        self.assertEqual(data['heatmap'][data['weekdays'].index('Monday')][21], 10)
+
+    def test_query_count_does_not_depend_on_history(self):
+        start = timezone.now() - timedelta(days=400)
+        ReadingSession.objects.bulk_create([
+            ReadingSession(
+                user=self.user, book=self.book, start_page=0, end_page=5,
+                session_date=(start + timedelta(hours=i * 7)).date(), started_at=start + timedelta(hours=i * 7)
+            )
+            for i in range(1000)
+        ])
+
+        with self.assertNumQueries(1):
+            data = self.get(ReadingHeatmapView, '/api/stats/reading-heatmap/').data
+        self.assertEqual(data['timestamped_sessions'], 1000)
+
+
+class ReadingSessionsViewTests(StatsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user_book = self.add_book('OL1W', status='reading', pages=400)
+        self.today = timezone.localdate()
+
+    def session(self, start, end, days_ago=0, **extra):
+        return {
+            'user_book_id': self.user_book.pk,
+            'start_page': start,
+            'end_page': end,
+            'session_date': (self.today - timedelta(days=days_ago)).isoformat(),
+            **extra
+        }
+
+    def test_log_single_session(self):
+        started_at = timezone.now().replace(microsecond=0) - timedelta(hours=1)
+        response = self.post(ReadingSessionsView, '/api/stats/sessions/', {
+            'user_book_id': self.user_book.pk, 'start_page': 0, 'end_page': 25,
+            'started_at': started_at.isoformat(), 'ended_at': (started_at + timedelta(minutes=40)).isoformat()
+        })
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 1)
+        session = ReadingSession.objects.get(user=self.user)
+        self.assertEqual(session.duration_minutes, 40)
+        self.assertEqual(session.session_date, timezone.localdate(started_at))
+        self.user_book.refresh_from_db()
+        self.assertEqual(self.user_book.current_page, 25)
+        self.assertEqual(self.user_book.date_started, started_at)
+
+    def test_log_many_sessions_updates_stats(self):
+        response = self.post(ReadingSessionsView, '/api/stats/sessions/', {
+            'sessions': [self.session(0, 30, days_ago=2), self.session(30, 70, days_ago=1), self.session(70, 90)]
+        })
+        self.assertEqual(response.status_code, 201)
+
+        self.user_book.refresh_from_db()
+        self.assertEqual(self.user_book.current_page, 90)
+        self.assertEqual(timezone.localdate(self.user_book.date_started), self.today - timedelta(days=2))
+
+        incremental = UserStatsSnapshot.objects.get(user=self.user)
+        rebuilt = snapshots.rebuild_snapshot(self.user)
+        self.assertEqual(
+            (incremental.session_count, incremental.session_pages, incremental.longest_streak_days),
+            (rebuilt.session_count, rebuilt.session_pages, rebuilt.longest_streak_days)
+        )
+        self.assertEqual(incremental.session_pages, 90)
+
+        data = self.get(DashboardStatsView, '/api/stats/dashboard/').data
+        self.assertEqual(data['current_streak_days'], 3)
+        habits = self.get(ReadingHabitsView, '/api/stats/reading-habits/').data
+        self.assertEqual(habits['avg_pages_per_session'], 30.0)
+
+    def test_current_page_does_not_move_back(self):
+        self.post(ReadingSessionsView, '/api/stats/sessions/', [self.session(100, 150)])
+        self.post(ReadingSessionsView, '/api/stats/sessions/', [self.session(40, 60, days_ago=3)])
+
+        self.user_book.refresh_from_db()
+        self.assertEqual(self.user_book.current_page, 150)
+
+    def test_query_count_is_constant(self):
+        self.post(ReadingSessionsView, '/api/stats/sessions/', [self.session(0, 10)])
+
+        # Both calls extend the existing streak
+        with CaptureQueriesContext(connection) as one:
+            self.post(ReadingSessionsView, '/api/stats/sessions/', [self.session(10, 20, days_ago=1)])
+        with CaptureQueriesContext(connection) as many:
+            self.post(ReadingSessionsView, '/api/stats/sessions/', [
+                self.session(20 + i, 21 + i, days_ago=2 + i) for i in range(30)
+            ])
+
+        self.assertEqual(len(many), len(one))
+        self.assertEqual(ReadingSession.objects.filter(user=self.user).count(), 32)
+
+    def test_invalid_sessions_write_nothing(self):
+        other = User.objects.create_user(username='other', password='secret')
+        foreign = UserBook.objects.create(user=other, book=Book.objects.create(open_library_id='OL2W', title='Other'))
+
+        response = self.post(ReadingSessionsView, '/api/stats/sessions/', [self.session(0, 10), self.session(50, 20)])
+        self.assertEqual(response.status_code, 400)
+
+        response = self.post(ReadingSessionsView, '/api/stats/sessions/', [
+            self.session(0, 10), {**self.session(0, 10), 'user_book_id': foreign.pk}
+        ])
+        self.assertEqual(response.status_code, 400)
+
+        self.assertFalse(ReadingSession.objects.exists())
+        self.user_book.refresh_from_db()
+        self.assertEqual(self.user_book.current_page, 0)
+
+    def test_list_recent_sessions(self):
+        self.post(ReadingSessionsView, '/api/stats/sessions/', [self.session(0, 10, days_ago=1), self.session(10, 20)])
+
+        data = self.get(ReadingSessionsView, '/api/stats/sessions/', limit=1).data
+
+        self.assertEqual(len(data['sessions']), 1)
+        self.assertEqual(data['sessions'][0]['pages_read'], 10)
+        self.assertEqual(data['sessions'][0]['session_date'], self.today.isoformat())
+
+
+@override_settings(DATABASE_REPLICA={'ALIAS': 'test_replica', 'LAG_CHECK_INTERVAL': 0})
+class ReplicaRoutingTests(TransactionTestCase):
+    """The test database as primary and a separate SQLite file as its replica"""
+
+    ALIAS = 'test_replica'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.replica_dir = tempfile.mkdtemp(prefix='bookcase-replica-')
+        connections.settings[cls.ALIAS] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(cls.replica_dir, 'replica.sqlite3'),
+        }
+        # Fill in the defaults Django gives every alias
+        connections.configure_settings(connections.settings)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[cls.ALIAS].close()
+        del connections[cls.ALIAS]
+        del connections.settings[cls.ALIAS]
+        shutil.rmtree(cls.replica_dir)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', password='secret')
+        book = Book.objects.create(open_library_id='OL1W', title='Book OL1W', pages=300)
+        self.user_book = UserBook.objects.create(user=self.user, book=book, status='reading')
+        self.client.force_login(self.user)
+
+    def replicate(self, lag=0):
+        """Copy the primary into the replica with a heartbeat `lag` seconds old"""
+        ReplicaHeartbeat.objects.update_or_create(
+            pk=1, defaults={'beat_at': timezone.now() - timedelta(seconds=lag)}
+        )
+        primary, replica = connections[DEFAULT_DB_ALIAS], connections[self.ALIAS]
+        primary.ensure_connection()
+        replica.ensure_connection()
+        primary.connection.backup(replica.connection)
+
+    def log_session(self, end_page):
+        ReadingSession.objects.create(
+            user=self.user, book=self.user_book.book, start_page=0, end_page=end_page,
+            session_date=timezone.localdate()
+        )
+
+    def session_count(self, client=None):
+        response = (client or self.client).get('/api/stats/sessions/')
+        self.assertEqual(response.status_code, 200)
+        return len(response.json()['sessions'])
+
+    def test_marked_views_read_from_the_replica(self):
+        self.log_session(10)
+        self.replicate()
+        # Not replicated yet
+        self.log_session(20)
+        Book.objects.create(open_library_id='OL2W', title='Book OL2W')
+        UserBook.objects.create(user=self.user, book=Book.objects.get(open_library_id='OL2W'))
+
+        self.assertEqual(self.session_count(), 1)
+        self.assertEqual(len(self.client.get('/api/books/my-books/').json()['books']), 1)
+        # Views that aren't marked always read from the primary
+        self.assertEqual(len(self.client.get('/api/users/goals/').json()['goals']), 0)
+
+    def test_reads_after_a_write_stay_on_the_primary(self):
+        self.replicate()
+
+        response = self.client.post('/api/stats/sessions/', {
+            'user_book_id': self.user_book.pk, 'start_page': 0, 'end_page': 30
+        }, content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('primary_until', response.cookies)
+        self.assertEqual(self.session_count(), 1)
+
+        # Another client of the same user that hasn't written reads the replica
+        other = type(self.client)()
+        other.force_login(self.user)
+        self.assertEqual(self.session_count(other), 0)
+
+    async def test_async_requests_are_routed_without_adapting(self):
+        async def get_response(request):
+            return None
+        self.assertTrue(iscoroutinefunction(replicas.ReplicaRoutingMiddleware(get_response)))
+
+        await sync_to_async(self.log_session)(10)
+        await sync_to_async(self.replicate)()
+        await sync_to_async(self.log_session)(20)
+        self.async_client.cookies = self.client.cookies
+
+        response = await self.async_client.get('/api/stats/sessions/')
+
+        self.assertEqual(len(response.json()['sessions']), 1)
+        self.assertIsNone(getattr(replicas._state, 'alias', None))
+
+    def test_stale_replica_responses_are_not_cached(self):
+        self.replicate()
+        dashboard = '/api/stats/dashboard/'
+        self.assertEqual(self.client.get(dashboard).json()['current_streak_days'], 0)
+
+        self.client.post('/api/stats/sessions/', {
+            'user_book_id': self.user_book.pk, 'start_page': 0, 'end_page': 30
+        }, content_type='application/json')
+
+        # Another client computes from the replica before the write reaches it
+        other = type(self.client)()
+        other.force_login(self.user)
+        response = other.get(dashboard)
+        self.assertEqual(response.json()['current_streak_days'], 0)
+        self.assertNotIn('ETag', response)
+
+        # The writer reads its own write, not the stale response
+        self.assertEqual(self.client.get(dashboard).json()['current_streak_days'], 1)
+        self.replicate()
+        self.assertEqual(other.get(dashboard).json()['current_streak_days'], 1)
+
+    def test_lagging_or_unknown_replica_is_not_read(self):
+        self.log_session(10)
+        self.replicate(lag=60)
+        self.log_session(20)
+        self.assertEqual(self.session_count(), 2)
+
+        ReplicaHeartbeat.objects.all().delete()
+        self.replicate()
+        self.log_session(30)
+        with connections[self.ALIAS].cursor() as cursor:
+            cursor.execute('DELETE FROM stats_replicaheartbeat')
+        self.assertEqual(self.session_count(), 3)
+
+    def test_router_sends_writes_and_later_reads_to_the_primary(self):
+        replicas._state.alias = self.ALIAS
+        try:
+            self.assertEqual(router.db_for_read(ReadingSession), self.ALIAS)
+            self.assertEqual(router.db_for_write(ReadingSession), DEFAULT_DB_ALIAS)
+            self.assertEqual(router.db_for_read(ReadingSession), DEFAULT_DB_ALIAS)
+        finally:
+            replicas._state.alias = None
+        self.assertFalse(router.allow_migrate(self.ALIAS, 'stats'))
+
+    def test_heartbeat_command(self):
+        output = StringIO()
+        call_command('replica_heartbeat', interval=0, stdout=output)
+
+        self.assertIn('Heartbeat written', output.getvalue())
+        self.replicate(lag=0)
+        self.assertLess(replicas.replication_lag(self.ALIAS), 5)
@@ -8,4 +8,7 @@ urlpatterns = [
     path('reading-timeline/', views.ReadingTimelineView.as_view(), name='reading-timeline'),
     path('genre-breakdown/', views.GenreBreakdownView.as_view(), name='genre-breakdown'),
     path('reading-habits/', views.ReadingHabitsView.as_view(), name='reading-habits'),
+    path('reading-heatmap/', views.ReadingHeatmapView.as_view(), name='reading-heatmap'),
+    path('sessions/', views.ReadingSessionsView.as_view(), name='sessions'),
+    path('bundle/', views.StatsBundleView.as_view(), name='bundle'),
 ]
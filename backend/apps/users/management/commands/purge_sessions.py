@@ -0,0 +1,42 @@
+import time
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Delete expired sessions in small batches; run it periodically (e.g. hourly from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Sessions deleted per statement, keeping each write lock short'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Keep running, purging every INTERVAL seconds'
+        )
+
+    def handle(self, *args, **options):
+        if settings.SESSION_ENGINE.endswith('signed_cookies'):
+            self.stdout.write('Signed cookie sessions expire on their own; nothing to purge')
+            return
+
+        while True:
+            deleted = self.purge(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Purged {deleted} expired sessions'))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def purge(self, batch_size):
+        deleted = 0
+        while True:
+            keys = list(Session.objects.filter(
+                expire_date__lt=timezone.now()
+            ).values_list('session_key', flat=True)[:batch_size])
+            if not keys:
+                return deleted
+            deleted += Session.objects.filter(session_key__in=keys).delete()[0]
@@ -0,0 +1,48 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+
+class SessionRefreshMiddleware:
+    """Roll a session's expiry forward at most once per SESSION_REFRESH_INTERVAL.
+    
+    Stands in for SESSION_SAVE_EVERY_REQUEST, which rewrote the session on
+    every request, reads included. Sessions still expire SESSION_COOKIE_AGE
+    after last use, give or take the interval. Must come after
+    SessionMiddleware.
+    """
+    
+    KEY = '_refreshed_at'
+    
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self.refresh(request)
+        return response
+    
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        # Reading the session may hit the database
+        await sync_to_async(self.refresh)(request)
+        return response
+    
+    def refresh(self, request):
+        session = getattr(request, 'session', None)
+        if session is None or session.is_empty():
+            return
+        
+        now = int(time.time())
+        # Stamp sessions that are being saved anyway (e.g. on login) for free
+        if session.modified or now - session.get(self.KEY, 0) >= settings.SESSION_REFRESH_INTERVAL:
+            session[self.KEY] = now
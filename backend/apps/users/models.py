@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.db.models.functions import Coalesce
 
 
 class UserProfile(models.Model):
@@ -23,6 +24,27 @@ class UserProfile(models.Model):
         return f"{self.user.username}'s Profile"
 
 
+class ReadingGoalQuerySet(models.QuerySet):
+    
+    def with_progress(self):
+        """Annotate books_read and pages_read for each goal's year.
+        
+        Both come from one grouped join against the user's books finished
+        that year (the year and status are part of the join condition), so a
+        list of goals is fetched in a single query. Years follow the current
+        time zone.
+        """
+        return self.alias(
+            finished=models.FilteredRelation('user__userbook', condition=models.Q(
+                user__userbook__status='finished',
+                user__userbook__date_finished__year=models.F('year'),
+            ))
+        ).annotate(
+            books_read=models.Count('finished'),
+            pages_read=Coalesce(models.Sum('finished__book__pages'), 0),
+        )
+
+
 class ReadingGoal(models.Model):
     """Annual reading goals for users"""
     
@@ -33,6 +55,8 @@ class ReadingGoal(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = ReadingGoalQuerySet.as_manager()
+    
     class Meta:
         unique_together = ['user', 'year']
         ordering = ['-year']
@@ -40,24 +64,41 @@ class ReadingGoal(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.year}: {self.books_goal} books"
     
-    @property
-    def books_read_count(self):
-        """Count books finished this year"""
-        from django.utils import timezone
+    def _finished_books(self):
         from apps.books.models import UserBook
         
-        year_start = timezone.datetime(self.year, 1, 1)
-        year_end = timezone.datetime(self.year, 12, 31, 23, 59, 59)
-        
+        # __year compares in the current time zone, so late-December
+        # finishes land in the right year
         return UserBook.objects.filter(
-            user=self.user,
+            user_id=self.user_id,
             status='finished',
-            date_finished__range=(year_start, year_end)
-        ).count()
+            date_finished__year=self.year
+        )
+    
+    @property
+    def books_read_count(self):
+        """Count books finished this year"""
+        if hasattr(self, 'books_read'):
+            return self.books_read
+        return self._finished_books().count()
+    
+    @property
+    def pages_read_count(self):
+        """Total pages of books finished this year"""
+        if hasattr(self, 'pages_read'):
+            return self.pages_read
+        return self._finished_books().aggregate(total=models.Sum('book__pages'))['total'] or 0
     
     @property 
     def progress_percentage(self):
         """Calculate progress toward goal"""
         if self.books_goal == 0:
             return 0
-        return min(100, (self.books_read_count / self.books_goal) * 100)
\ No newline at end of file
+        return min(100, (self.books_read_count / self.books_goal) * 100)
+    
+    @property
+    def pages_progress_percentage(self):
+        """Calculate progress toward the pages goal, if one is set"""
+        if not self.pages_goal:
+            return None
+        return min(100, (self.pages_read_count / self.pages_goal) * 100)
@@ -24,12 +24,29 @@ class UserProfileSerializer(serializers.ModelSerializer):
 
 
 class ReadingGoalSerializer(serializers.ModelSerializer):
-    """Serializer for ReadingGoal model"""
+    """Serializer for ReadingGoal model.
+    
+    Use ReadingGoal.objects.with_progress() so the read counts come from
+    annotations instead of a query per goal.
+    """
     books_read_count = serializers.ReadOnlyField()
+    pages_read_count = serializers.ReadOnlyField()
     progress_percentage = serializers.ReadOnlyField()
+    pages_progress_percentage = serializers.ReadOnlyField()
     
     class Meta:
         model = ReadingGoal
         fields = ['id', 'user', 'year', 'books_goal', 'pages_goal', 
-                 'books_read_count', 'progress_percentage', 'created_at']
-        read_only_fields = ['user', 'created_at']
\ No newline at end of file
+                 'books_read_count', 'pages_read_count', 'progress_percentage',
+                 'pages_progress_percentage', 'created_at']
+        read_only_fields = ['user', 'created_at']
+    
+    def validate_books_goal(self, value):
+        if value < 0:
+            raise serializers.ValidationError('books_goal cannot be negative.')
+        return value
+    
+    def validate_pages_goal(self, value):
+        if value is not None and value < 0:
+            raise serializers.ValidationError('pages_goal cannot be negative.')
+        return value
@@ -1,3 +1,169 @@
-from django.test import TestCase
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.books.models import Book, UserBook
+from .middleware import SessionRefreshMiddleware
+from .models import ReadingGoal
+
+
+class ReadingGoalTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='secret')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def finish(self, key, finished, pages=200, user=None):
+        book = Book.objects.create(open_library_id=key, title=f'Book {key}', pages=pages)
+        return UserBook.objects.create(
+            user=user or self.user, book=book, status='finished', date_finished=finished
+        )
+
+    def test_list_annotates_progress_per_year(self):
+        ReadingGoal.objects.create(user=self.user, year=2023, books_goal=4, pages_goal=1000)
+        ReadingGoal.objects.create(user=self.user, year=2024, books_goal=10)
+        self.finish('OL1W', datetime(2023, 3, 1, 12, tzinfo=dt_timezone.utc), pages=300)
+        self.finish('OL2W', datetime(2023, 7, 1, 12, tzinfo=dt_timezone.utc), pages=200)
+        self.finish('OL3W', datetime(2024, 1, 5, 12, tzinfo=dt_timezone.utc))
+        other = User.objects.create_user(username='other', password='secret')
+        self.finish('OL4W', datetime(2023, 5, 1, 12, tzinfo=dt_timezone.utc), user=other)
+
+        response = self.client.get(reverse('users:reading_goals'))
+
+        self.assertEqual(response.status_code, 200)
+        goals = {goal['year']: goal for goal in response.data['goals']}
+        self.assertEqual(goals[2023]['books_read_count'], 2)
+        self.assertEqual(goals[2023]['pages_read_count'], 500)
+        self.assertEqual(goals[2023]['progress_percentage'], 50)
+        self.assertEqual(goals[2023]['pages_progress_percentage'], 50)
+        self.assertEqual(goals[2024]['books_read_count'], 1)
+        self.assertIsNone(goals[2024]['pages_progress_percentage'])
+
+    def test_list_query_count_is_independent_of_goal_count(self):
+        for year in range(2015, 2025):
+            ReadingGoal.objects.create(user=self.user, year=year, books_goal=12)
+        self.finish('OL1W', datetime(2020, 6, 1, 12, tzinfo=dt_timezone.utc))
+
+        # Session auth is bypassed, so this is just the goals query
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('users:reading_goals'))
+        self.assertEqual(len(response.data['goals']), 10)
+
+    @override_settings(TIME_ZONE='America/New_York')
+    def test_year_follows_current_time_zone(self):
+        ReadingGoal.objects.create(user=self.user, year=2023, books_goal=1)
+        ReadingGoal.objects.create(user=self.user, year=2024, books_goal=1)
+        # 2024-01-01 03:00 UTC is still New Year's Eve in New York
+        self.finish('OL1W', datetime(2024, 1, 1, 3, tzinfo=dt_timezone.utc))
+
+        goals = {goal.year: goal for goal in ReadingGoal.objects.with_progress()}
+        self.assertEqual(goals[2023].books_read, 1)
+        self.assertEqual(goals[2024].books_read, 0)
+        self.assertEqual(ReadingGoal.objects.get(year=2023).books_read_count, 1)
+
+    def test_create_update_and_delete_goal(self):
+        self.finish('OL1W', datetime(2024, 2, 1, 12, tzinfo=dt_timezone.utc))
+
+        response = self.client.post(reverse('users:reading_goals'), {'year': 2024, 'books_goal': 2}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['goal']['progress_percentage'], 50)
+
+        response = self.client.post(reverse('users:reading_goals'), {'year': 2024, 'books_goal': 5}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        url = reverse('users:reading_goal_detail', args=[2024])
+        response = self.client.patch(url, {'books_goal': 4, 'pages_goal': 800}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['goal']['books_goal'], 4)
+        self.assertEqual(response.data['goal']['progress_percentage'], 25)
+        self.assertEqual(response.data['goal']['pages_progress_percentage'], 25)
+
+        for body in ([{'books_goal': 3}], 7):
+            response = self.client.patch(url, body, format='json')
+            self.assertEqual(response.status_code, 400)
+
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(ReadingGoal.objects.filter(user=self.user).exists())
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class SessionRefreshTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='secret')
+
+    def setUp(self):
+        self.client.login(username='reader', password='secret')
+        self.session_key = self.client.session.session_key
+        # client.login() bypasses the middleware, so the first request stamps the session
+        self.client.get('/api/books/my-books/')
+
+    def session_writes(self, queries):
+        return [
+            query['sql'] for query in queries
+            if 'django_session' in query['sql'] and not query['sql'].startswith('SELECT')
+        ]
+
+    def test_read_requests_do_not_write_the_session(self):
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(5):
+                response = self.client.get('/api/books/my-books/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.session_writes(queries), [])
+        self.assertNotIn('sessionid', response.cookies)
+
+    def test_expiry_rolls_forward_after_the_refresh_interval(self):
+        expiry = Session.objects.get(session_key=self.session_key).expire_date
+        later = time.time() + 2 * 60 * 60
+
+        with mock.patch('apps.users.middleware.time.time', return_value=later):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/books/my-books/')
+
+        self.assertEqual(len(self.session_writes(queries)), 1)
+        self.assertIn('sessionid', response.cookies)
+        self.assertGreater(Session.objects.get(session_key=self.session_key).expire_date, expiry)
+
+    async def test_async_requests_refresh_the_session(self):
+        async def get_response(request):
+            return None
+        self.assertTrue(iscoroutinefunction(SessionRefreshMiddleware(get_response)))
+
+        self.async_client.cookies = self.client.cookies
+        later = time.time() + 2 * 60 * 60
+        with mock.patch('apps.users.middleware.time.time', return_value=later):
+            response = await self.async_client.get('/api/books/my-books/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('sessionid', response.cookies)
+
+    def test_purge_deletes_only_expired_sessions(self):
+        Session.objects.bulk_create([
+            Session(session_key=f'expired{i}', session_data='', expire_date=timezone.now() - timedelta(days=1))
+            for i in range(5)
+        ])
+
+        output = StringIO()
+        call_command('purge_sessions', batch_size=2, stdout=output)
+
+        self.assertIn('Purged 5 expired sessions', output.getvalue())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), [self.session_key])
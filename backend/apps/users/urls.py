@@ -10,4 +10,8 @@ urlpatterns = [
     path('auth/logout/', views.logout_view, name='logout'),
     path('auth/check/', views.check_auth, name='check_auth'),
     path('auth/profile/', views.user_profile, name='user_profile'),
+    
+    # Reading goals
+    path('goals/', views.reading_goals, name='reading_goals'),
+    path('goals/<int:year>/', views.reading_goal_detail, name='reading_goal_detail'),
 ]
@@ -3,11 +3,13 @@ from django.contrib.auth.models import User
 from django.conf import settings
 from django.views.decorators.csrf import ensure_csrf_cookie, csrf_exempt
 from django.utils.decorators import method_decorator
+from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
-from .serializers import UserSerializer
+from .models import ReadingGoal
+from .serializers import UserSerializer, ReadingGoalSerializer
 
 
 @ensure_csrf_cookie
@@ -133,4 +135,64 @@ def check_auth(request):
     else:
         return Response({
             'authenticated': False
-        }, status=status.HTTP_200_OK)
\ No newline at end of file
+        }, status=status.HTTP_200_OK)
+
+
+@ensure_csrf_cookie
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def reading_goals(request):
+    """List the user's reading goals with progress, or set a goal for a year"""
+    if request.method == 'GET':
+        goals = ReadingGoal.objects.filter(user=request.user).with_progress()
+        return Response({
+            'goals': ReadingGoalSerializer(goals, many=True).data
+        }, status=status.HTTP_200_OK)
+    
+    serializer = ReadingGoalSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response({
+            'error': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    year = serializer.validated_data['year']
+    if ReadingGoal.objects.filter(user=request.user, year=year).exists():
+        return Response({
+            'error': f'A reading goal for {year} already exists.'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    goal = serializer.save(user=request.user)
+    goal = ReadingGoal.objects.with_progress().get(pk=goal.pk)
+    return Response({
+        'goal': ReadingGoalSerializer(goal).data
+    }, status=status.HTTP_201_CREATED)
+
+
+@ensure_csrf_cookie
+@api_view(['GET', 'PUT', 'PATCH', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def reading_goal_detail(request, year):
+    """Get, update or remove the user's reading goal for a year"""
+    goals = ReadingGoal.objects.filter(user=request.user).with_progress()
+    goal = get_object_or_404(goals, year=year)
+    
+    if request.method == 'DELETE':
+        goal.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    
+    if request.method in ('PUT', 'PATCH'):
+        if not isinstance(request.data, dict):
+            return Response({
+                'error': 'The goal must be a JSON object'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        data = {key: value for key, value in request.data.items() if key != 'year'}
+        serializer = ReadingGoalSerializer(goal, data=data, partial=True)
+        if not serializer.is_valid():
+            return Response({
+                'error': serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        serializer.save()
+    
+    return Response({
+        'goal': ReadingGoalSerializer(goal).data
+    }, status=status.HTTP_200_OK)
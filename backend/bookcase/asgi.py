@@ -3,6 +3,10 @@ ASGI config for bookcase project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server (e.g. ``uvicorn bookcase.asgi:application``)
+so async views such as ``/api/books/search/async/`` run natively on the
+event loop, letting one worker hold many in-flight Open Library requests.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
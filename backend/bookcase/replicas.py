@@ -0,0 +1,188 @@
+"""
+Read replica routing for read-only views.
+
+Views marked with @replica_reads (the stats endpoints, my_books and
+user_book_detail) send their queries to the replica alias in
+DATABASE_REPLICA; every other view, and every write, uses the primary (the
+default alias). A marked view still reads from the primary when:
+
+- the request isn't a GET or HEAD;
+- the client wrote something in the last STICKY_SECONDS. Successful unsafe
+  requests set a short-lived cookie, so a client always reads its own
+  writes, even before they have reached the replica;
+- the replica is more than MAX_LAG seconds behind, or can't be reached.
+  Lag is the age of the ReplicaHeartbeat row as read on the replica, which
+  `manage.py replica_heartbeat` keeps touching on the primary; with no
+  heartbeat running the replica is never used. Each process checks at
+  most once per LAG_CHECK_INTERVAL;
+- the query runs in a transaction on the primary, or after the request
+  has written anything.
+
+Without the replica alias in DATABASES, all of this is a no-op.
+"""
+
+import time
+
+from asgiref.local import Local
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils import timezone
+
+
+DEFAULTS = {
+    'ALIAS': 'replica',
+    'MAX_LAG': 5,  # Seconds
+    'LAG_CHECK_INTERVAL': 1,  # Seconds between lag checks, per process
+    'STICKY_SECONDS': 10,  # Keep at least MAX_LAG + LAG_CHECK_INTERVAL
+    'COOKIE_NAME': 'primary_until',
+}
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+# The alias reads go to during the current request, if not the primary, and
+# whether the request has read from it yet
+_state = Local()
+
+# Alias -> (time.monotonic() of the last check, whether the replica was fresh)
+_lag_checks = {}
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'DATABASE_REPLICA', {})}
+
+
+def replica_reads(view):
+    """Mark a view function or class as safe to serve from the replica"""
+    view.read_replica = True
+    return view
+
+
+def _reads_from_replica(view_func):
+    # Class-based views are marked on the class, which as_view() exposes as .cls
+    return getattr(view_func, 'read_replica', False) or getattr(getattr(view_func, 'cls', None), 'read_replica', False)
+
+
+def read_from_replica():
+    """Whether the current request has read anything from the replica"""
+    return getattr(_state, 'used_replica', False)
+
+
+def replication_lag(alias):
+    """Seconds the replica is behind the primary, or None if that's unknown"""
+    from apps.stats.models import ReplicaHeartbeat
+
+    try:
+        beat_at = ReplicaHeartbeat.objects.using(alias).values_list('beat_at', flat=True).first()
+    except DatabaseError:
+        return None
+    if beat_at is None:
+        return None
+    return max((timezone.now() - beat_at).total_seconds(), 0.0)
+
+
+def replica_is_fresh(alias, options):
+    """Whether the replica is within MAX_LAG, rechecked once per LAG_CHECK_INTERVAL"""
+    now = time.monotonic()
+    checked = _lag_checks.get(alias)
+    if checked is not None and now - checked[0] < options['LAG_CHECK_INTERVAL']:
+        return checked[1]
+
+    lag = replication_lag(alias)
+    fresh = lag is not None and lag <= options['MAX_LAG']
+    _lag_checks[alias] = (now, fresh)
+    return fresh
+
+
+def beat():
+    """Touch the heartbeat on the primary"""
+    from apps.stats.models import ReplicaHeartbeat
+
+    ReplicaHeartbeat.objects.using(DEFAULT_DB_ALIAS).update_or_create(pk=1, defaults={'beat_at': timezone.now()})
+
+
+class ReplicaRouter:
+    """Route reads to the replica chosen for the current request, writes to the primary"""
+
+    def db_for_read(self, model, **hints):
+        alias = getattr(_state, 'alias', None)
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        _state.used_replica = True
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # Whatever the request reads next should see this write
+        _state.alias = None
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, get_options()['ALIAS']}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from the primary
+        if db == get_options()['ALIAS']:
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Pick the database a request reads from, and pin writers to the primary for a while"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self._reset()
+        return self._pin_writer(request, response)
+
+    async def __acall__(self, request):
+        try:
+            response = await self.get_response(request)
+        finally:
+            self._reset()
+        return self._pin_writer(request, response)
+
+    def _reset(self):
+        _state.alias = None
+        _state.used_replica = False
+
+    def _pin_writer(self, request, response):
+        options = get_options()
+        if request.method not in SAFE_METHODS and response.status_code < 400 and options['ALIAS'] in connections:
+            response.set_cookie(
+                options['COOKIE_NAME'], str(int(time.time()) + options['STICKY_SECONDS']),
+                max_age=options['STICKY_SECONDS'], httponly=True, samesite='Lax'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        options = get_options()
+        if (
+            options['ALIAS'] in connections
+            and request.method in SAFE_METHODS
+            and _reads_from_replica(view_func)
+            and not self._wrote_recently(request, options)
+            and replica_is_fresh(options['ALIAS'], options)
+        ):
+            _state.alias = options['ALIAS']
+
+    def _wrote_recently(self, request, options):
+        try:
+            return int(request.COOKIES.get(options['COOKIE_NAME'], 0)) > time.time()
+        except ValueError:
+            return False
@@ -7,6 +7,8 @@ import os
 from dotenv import load_dotenv
 import sys
 
+from django.core.exceptions import ImproperlyConfigured
+
 load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,9 +46,11 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'apps.users.middleware.SessionRefreshMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',  # Make sure this is enabled
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'bookcase.replicas.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -71,12 +75,74 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'bookcase.wsgi.application'
 
-# Database
+# Database, selected by DB_ENGINE: sqlite (default) or postgres
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+
+DATABASE_PROFILES = {
+    # WAL, relaxed fsync, a busy timeout and a 64 MB page cache, set on each
+    # connection (see bookcase/sqlite_backend)
+    'sqlite': {
+        'ENGINE': 'bookcase.sqlite_backend',
+        'NAME': os.getenv('DB_NAME', str(BASE_DIR / 'db.sqlite3')),
+        'OPTIONS': {
+            'timeout': 20,
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'busy_timeout': 20000,
+                'cache_size': -64000,
+                'temp_store': 'MEMORY',
+            },
+            'transaction_mode': 'IMMEDIATE',
+        },
+    },
+    # Persistent connections, checked before reuse. Behind PgBouncer in
+    # transaction mode, set DB_CONN_MAX_AGE=0 and DB_PGBOUNCER=1.
+    'postgres': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv('DB_NAME', 'bookcase'),
+        'USER': os.getenv('DB_USER', 'bookcase'),
+        'PASSWORD': os.getenv('DB_PASSWORD', ''),
+        'HOST': os.getenv('DB_HOST', 'localhost'),
+        'PORT': os.getenv('DB_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'DISABLE_SERVER_SIDE_CURSORS': bool(os.getenv('DB_PGBOUNCER')),
+        'OPTIONS': {
+            'connect_timeout': 5,
+        },
+    },
+}
+
+if DB_ENGINE not in DATABASE_PROFILES:
+    raise ImproperlyConfigured(
+        f"DB_ENGINE must be one of: {', '.join(DATABASE_PROFILES)} (got {DB_ENGINE!r})"
+    )
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+    'default': DATABASE_PROFILES[DB_ENGINE],
+}
+
+# Optional read replica for the stats and list views (see bookcase/replicas.py),
+# enabled by DB_REPLICA_NAME (another SQLite file or Postgres database) and/or
+# DB_REPLICA_HOST. Run `manage.py replica_heartbeat` alongside it, or the
+# replica counts as lagging and is never read.
+if os.getenv('DB_REPLICA_NAME') or os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'TEST': {'MIRROR': 'default'},
     }
+    if DB_ENGINE == 'postgres':
+        DATABASES['replica']['HOST'] = os.getenv('DB_REPLICA_HOST', DATABASES['default']['HOST'])
+        DATABASES['replica']['PORT'] = os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT'])
+
+DATABASE_ROUTERS = ['bookcase.replicas.ReplicaRouter']
+
+DATABASE_REPLICA = {
+    'ALIAS': 'replica',
+    'MAX_LAG': float(os.getenv('DB_REPLICA_MAX_LAG', 5)),
+    'STICKY_SECONDS': 10,
 }
 
 # Password validation
@@ -163,10 +229,83 @@ CORS_ALLOW_HEADERS = [
     'x-requested-with',
 ]
 
+# Open Library
+OPEN_LIBRARY_URL = os.getenv('OPEN_LIBRARY_URL', 'https://openlibrary.org')
+
+# Pooling, retry and circuit breaker settings (see apps/books/open_library.py)
+OPEN_LIBRARY_CLIENT = {
+    'TIMEOUT': 10,
+    'DEADLINE': 10,
+    'MAX_CONNECTIONS': 20,
+    'MAX_CONCURRENCY_PER_HOST': 10,
+    'RETRIES': 2,
+    'BACKOFF': 0.2,
+    'FAILURE_THRESHOLD': 5,
+    'RESET_TIMEOUT': 30,
+}
+
+# Search result cache in front of Open Library (see apps/books/search_cache.py).
+# Set SHARED_CACHE to a CACHES alias to share results between workers.
+BOOK_SEARCH_CACHE = {
+    'TTL': 60 * 60,
+    'MAX_ENTRIES': 1024,
+    'SHARED_CACHE': os.getenv('BOOK_SEARCH_SHARED_CACHE') or None,
+}
+
+# Per-user stats response cache (see apps/stats/cache.py). STATS_CACHE_BACKEND
+# picks locmem (single process only), file or redis (needs the redis package).
+STATS_CACHE_BACKEND = os.getenv('STATS_CACHE_BACKEND', 'locmem')
+STATS_CACHE_LOCATIONS = {
+    'locmem': 'stats',
+    'file': str(BASE_DIR / 'cache' / 'stats'),
+    'redis': 'redis://127.0.0.1:6379/1',
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'stats': {
+        'BACKEND': {
+            'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+            'file': 'django.core.cache.backends.filebased.FileBasedCache',
+            'redis': 'django.core.cache.backends.redis.RedisCache',
+        }[STATS_CACHE_BACKEND],
+        'LOCATION': os.getenv('STATS_CACHE_LOCATION') or STATS_CACHE_LOCATIONS[STATS_CACHE_BACKEND],
+        'OPTIONS': {'MAX_ENTRIES': 10000} if STATS_CACHE_BACKEND != 'redis' else {},
+    },
+}
+
+STATS_CACHE = {
+    'ALIAS': 'stats',
+    'TIMEOUT': 60 * 60 * 24,
+}
+
+# Background Open Library enrichment (see apps/books/enrichment.py)
+BOOK_ENRICHMENT = {
+    'CONCURRENCY': int(os.getenv('BOOK_ENRICHMENT_CONCURRENCY', 4)),
+    'RATE_PER_HOST': float(os.getenv('BOOK_ENRICHMENT_RATE', 5)),
+}
+
+# Local cover thumbnail cache (see apps/books/covers.py)
+COVER_CACHE = {
+    'ROOT': os.getenv('COVER_CACHE_ROOT', str(BASE_DIR / 'cache' / 'covers')),
+    'MAX_BYTES': int(os.getenv('COVER_CACHE_MAX_MB', 200)) * 1024 * 1024,
+}
+
 # Custom registration password (for CS50x project)
 REGISTRATION_PASSWORD = os.getenv('REGISTRATION_PASSWORD', 'cs50bookcase2024')
 
-# Session settings
+# Session settings. SESSION_BACKEND picks cached_db (reads from the cache,
+# writes through to the database), db or signed_cookies (no server storage).
+# With several workers, point SESSION_CACHE_ALIAS at a shared cache.
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'cached_db')
+SESSION_ENGINE = f'django.contrib.sessions.backends.{SESSION_BACKEND}'
+SESSION_CACHE_ALIAS = os.getenv('SESSION_CACHE_ALIAS', 'default')
 SESSION_COOKIE_AGE = 86400  # 24 hours
-SESSION_SAVE_EVERY_REQUEST = True
+
+# Instead of saving the session on every request, roll its expiry forward
+# only once it was last refreshed this long ago (see apps/users/middleware.py)
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_REFRESH_INTERVAL = 60 * 60
 
@@ -0,0 +1,40 @@
+"""
+SQLite backend tuned for concurrent web traffic.
+
+Same as django.db.backends.sqlite3, plus two OPTIONS that it consumes
+instead of passing them to sqlite3.connect():
+
+- 'pragmas': PRAGMA name -> value, applied to every new connection.
+  journal_mode=WAL lets readers proceed while a write is in progress,
+  synchronous=NORMAL only fsyncs at checkpoints, busy_timeout makes a
+  blocked writer wait instead of failing with "database is locked", and a
+  negative cache_size is the page cache in KiB.
+- 'transaction_mode': 'IMMEDIATE' starts atomic blocks with BEGIN
+  IMMEDIATE, taking the write lock up front. A deferred transaction that
+  reads and then writes can't wait on busy_timeout when another writer got
+  in first; it fails at once. This applies to every atomic() block, so a
+  read-only one also takes the write lock and waits behind (and blocks)
+  writers; plain reads in autocommit are unaffected, so keep read paths
+  out of atomic().
+"""
+
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        params.pop('transaction_mode', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict['OPTIONS'].get('pragmas', {}).items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode')
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
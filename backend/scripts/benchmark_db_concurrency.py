@@ -0,0 +1,207 @@
+"""
+Benchmark concurrent reads and writes against the database profiles.
+
+Runs the same mixed workload against a fresh SQLite database with Django's
+stock SQLite settings and with the tuned `sqlite` profile from settings
+(WAL, synchronous=NORMAL, busy timeout, larger page cache, BEGIN
+IMMEDIATE). Writer threads add books to libraries, upsert ratings and save
+sessions the way every request does; reader threads page through
+libraries and load sessions. Prints throughput, latency percentiles and
+"database is locked" failures for each profile.
+
+Usage (from the backend directory):
+    python scripts/benchmark_db_concurrency.py [--writers 8] [--readers 8] [--seconds 10]
+
+Pass --profile postgres (with the DB_* variables set) to run the workload
+against Postgres instead; that database must be disposable.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bookcase.settings')
+
+PROFILES = ['stock', 'sqlite']
+
+
+def configure(profile):
+    """Point the default database at a throwaway copy of `profile`"""
+    from django.conf import settings
+
+    if profile == 'stock':
+        database = {'ENGINE': 'django.db.backends.sqlite3', 'OPTIONS': {}}
+    else:
+        database = dict(settings.DATABASE_PROFILES[profile])
+    if profile != 'postgres':
+        database['NAME'] = os.path.join(tempfile.mkdtemp(prefix='bookcase-bench-'), 'bench.sqlite3')
+    settings.DATABASES['default'] = database
+
+
+def seed(users, books):
+    from django.contrib.auth.models import User
+    from apps.books.models import Book, UserBook
+
+    User.objects.bulk_create([User(username=f'bench{i}', password='!') for i in range(users)])
+    Book.objects.bulk_create([
+        Book(open_library_id=f'OL{i}W', title=f'Book {i}', authors=[f'Author {i % 97}'], pages=100 + i % 500)
+        for i in range(books)
+    ])
+    user_ids = list(User.objects.values_list('id', flat=True))
+    book_ids = list(Book.objects.values_list('id', flat=True))
+    UserBook.objects.bulk_create([
+        UserBook(user_id=user_id, book_id=book_id)
+        for user_id in user_ids for book_id in book_ids[:50]
+    ])
+    return user_ids
+
+
+def run(profile, writers, readers, seconds):
+    import django
+    configure(profile)
+    django.setup()
+
+    from decimal import Decimal
+    from django.contrib.sessions.backends.db import SessionStore
+    from django.core.management import call_command
+    from django.db import OperationalError, connection, transaction
+
+    from apps.books.models import Book, UserBook, Rating, upsert_ratings
+
+    call_command('migrate', verbosity=0)
+    pragmas = {}
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            for name in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size'):
+                cursor.execute(f'PRAGMA {name}')
+                pragmas[name] = cursor.fetchone()[0]
+    user_ids = seed(writers + readers, 200)
+    session_keys = []
+    for user_id in user_ids:
+        session = SessionStore()
+        session['_auth_user_id'] = str(user_id)
+        session.create()
+        session_keys.append(session.session_key)
+
+    deadline = time.monotonic() + seconds
+    latencies = {'write': [], 'read': []}
+    errors = {'write': 0, 'read': 0}
+    lock = threading.Lock()
+
+    def writer(index):
+        user_id, session_key = user_ids[index], session_keys[index]
+        count = 0
+        while time.monotonic() < deadline:
+            count += 1
+            start = time.perf_counter()
+            try:
+                with transaction.atomic():
+                    book, _ = Book.objects.get_or_create(
+                        open_library_id=f'OLW{index}-{count}', defaults={'title': f'New {count}'}
+                    )
+                    UserBook.objects.create(user_id=user_id, book=book)
+                upsert_ratings([Rating(user_id=user_id, book=book, rating_type='overall', rating=Decimal('4.0'))])
+                session = SessionStore(session_key=session_key)
+                session['last_seen'] = count
+                session.save()
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies['write'].append(elapsed)
+            except OperationalError:
+                with lock:
+                    errors['write'] += 1
+        connection.close()
+
+    def reader(index):
+        user_id, session_key = user_ids[writers + index], session_keys[writers + index]
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                SessionStore(session_key=session_key).load()
+                list(UserBook.objects.filter(user_id=user_id).select_related('book').order_by('-date_added')[:20])
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies['read'].append(elapsed)
+            except OperationalError:
+                with lock:
+                    errors['read'] += 1
+        connection.close()
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    def percentile(values, fraction):
+        values = sorted(values)
+        return values[min(int(len(values) * fraction), len(values) - 1)] * 1000 if values else 0.0
+
+    return {
+        'profile': profile,
+        'pragmas': pragmas,
+        **{
+            f'{kind}_{name}': value
+            for kind in ('write', 'read')
+            for name, value in {
+                'ops': len(latencies[kind]),
+                'ops_per_second': len(latencies[kind]) / seconds,
+                'p50_ms': percentile(latencies[kind], 0.5),
+                'p95_ms': percentile(latencies[kind], 0.95),
+                'max_ms': percentile(latencies[kind], 1.0),
+                'errors': errors[kind],
+            }.items()
+        },
+    }
+
+
+def report(result):
+    print(f"\n=== {result['profile']} ===")
+    if result['pragmas']:
+        print('  ' + ', '.join(f'{name}={value}' for name, value in result['pragmas'].items()))
+    for kind in ('write', 'read'):
+        print(
+            f"  {kind + 's':<7} {result[f'{kind}_ops_per_second']:8.1f} ops/s  "
+            f"p50 {result[f'{kind}_p50_ms']:7.1f} ms  p95 {result[f'{kind}_p95_ms']:7.1f} ms  "
+            f"max {result[f'{kind}_max_ms']:7.1f} ms  locked errors {result[f'{kind}_errors']}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--profile', choices=PROFILES + ['postgres'], help='Run a single profile')
+    parser.add_argument('--json', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        result = run(args.profile, args.writers, args.readers, args.seconds)
+        if args.json:
+            print(json.dumps(result))
+        else:
+            report(result)
+        return
+
+    # Each profile runs in its own process, since settings are fixed at setup
+    for profile in PROFILES:
+        output = subprocess.run(
+            [sys.executable, __file__, '--profile', profile, '--json', '--writers', str(args.writers),
+             '--readers', str(args.readers), '--seconds', str(args.seconds)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        report(json.loads(output.strip().splitlines()[-1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""
+Benchmark the stats access paths with and without the composite indexes.
+
+Seeds a throwaway SQLite database with a large synthetic library, then
+prints EXPLAIN plans and timings for the hot UserBook, ReadingSession and
+Rating queries without and with the composite indexes. The database is
+migrated to the current schema and only the measured indexes are dropped
+for the BEFORE pass, so seeding always matches the models.
+
+Usage (from the backend directory):
+    python scripts/benchmark_indexes.py [--users 200] [--books-per-user 500]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bookcase.settings')
+
+import django
+from django.conf import settings
+
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix='bookcase-bench-'), 'bench.sqlite3')
+settings.DATABASES['default']['NAME'] = DB_PATH
+django.setup()
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Avg, Count, F, Sum
+from django.utils import timezone
+
+from apps.books.models import Book, UserBook, Rating
+from apps.stats.models import ReadingSession
+
+# The composite indexes being measured, by model and fields
+MEASURED_INDEXES = [
+    (UserBook, ['user', 'status', 'date_finished']),
+    (UserBook, ['user', 'date_started']),
+    (ReadingSession, ['user', 'session_date']),
+    (Rating, ['user', 'rating_type']),
+]
+
+
+def measured_indexes():
+    for model, fields in MEASURED_INDEXES:
+        yield model, next(index for index in model._meta.indexes if index.fields == fields)
+
+
+def drop_indexes():
+    with connection.schema_editor() as editor:
+        for model, index in measured_indexes():
+            editor.remove_index(model, index)
+
+
+def create_indexes():
+    with connection.schema_editor() as editor:
+        for model, index in measured_indexes():
+            editor.add_index(model, index)
+
+
+def seed(users, books_per_user, sessions_per_user):
+    rng = random.Random(42)
+    now = timezone.now()
+    today = now.date()
+
+    User.objects.bulk_create([
+        User(username=f'bench{i}', password='!') for i in range(users)
+    ], batch_size=1000)
+    user_ids = list(User.objects.values_list('id', flat=True))
+
+    Book.objects.bulk_create([
+        Book(open_library_id=f'OL{i}W', title=f'Book {i}', authors=[f'Author {i % 997}'],
+             genres=[f'Genre {i % 53}'], pages=rng.randint(80, 900))
+        for i in range(books_per_user * 2)
+    ], batch_size=1000)
+    book_ids = list(Book.objects.values_list('id', flat=True))
+
+    statuses = ['tbr', 'reading', 'finished', 'finished', 'dnf']
+    for user_id in user_ids:
+        picked = rng.sample(book_ids, books_per_user)
+        user_books = []
+        ratings = []
+        for book_id in picked:
+            book_status = rng.choice(statuses)
+            finished = now - timedelta(days=rng.randint(0, 1500)) if book_status == 'finished' else None
+            user_books.append(UserBook(user_id=user_id, book_id=book_id, status=book_status,
+                                       date_started=finished, date_finished=finished))
+            if book_status == 'finished':
+                for rating_type in ['overall', 'plot', 'prose']:
+                    ratings.append(Rating(user_id=user_id, book_id=book_id, rating_type=rating_type,
+                                          rating=Decimal(rng.randint(1, 10)) / 2))
+        UserBook.objects.bulk_create(user_books, batch_size=1000)
+        Rating.objects.bulk_create(ratings, batch_size=1000)
+        ReadingSession.objects.bulk_create([
+            ReadingSession(user_id=user_id, book_id=rng.choice(picked), start_page=0,
+                           end_page=rng.randint(5, 80),
+                           session_date=today - timedelta(days=rng.randint(0, 1500)))
+            for _ in range(sessions_per_user)
+        ], batch_size=1000)
+
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def workload(user):
+    today = timezone.now().date()
+    return {
+        'userbook finished window': lambda: UserBook.objects.filter(
+            user=user, status='finished', date_finished__gte=timezone.now() - timedelta(days=90)
+        ).aggregate(count=Count('id'), pages=Sum('book__pages')),
+        'readingsession date range': lambda: ReadingSession.objects.filter(
+            user=user, session_date__range=(today - timedelta(days=30), today)
+        ).aggregate(pages=Sum(F('end_page') - F('start_page'))),
+        'rating overall': lambda: Rating.objects.filter(
+            user=user, rating_type='overall'
+        ).aggregate(avg=Avg('rating'), count=Count('id')),
+    }
+
+
+def explain(user):
+    today = timezone.now().date()
+    querysets = {
+        'userbook finished window': UserBook.objects.filter(
+            user=user, status='finished', date_finished__gte=timezone.now() - timedelta(days=90)),
+        'readingsession date range': ReadingSession.objects.filter(
+            user=user, session_date__range=(today - timedelta(days=30), today)),
+        'rating overall': Rating.objects.filter(user=user, rating_type='overall'),
+    }
+    for name, queryset in querysets.items():
+        print(f'  {name}:')
+        for line in queryset.order_by().explain().splitlines():
+            print(f'    {line}')
+
+
+def time_workload(user, repeat):
+    for name, query in workload(user).items():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            query()
+        elapsed = (time.perf_counter() - start) / repeat * 1000
+        print(f'  {name:<28} {elapsed:8.3f} ms/query')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--books-per-user', type=int, default=500)
+    parser.add_argument('--sessions-per-user', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f'Database: {DB_PATH}')
+    call_command('migrate', verbosity=0)
+    drop_indexes()
+
+    start = time.perf_counter()
+    seed(args.users, args.books_per_user, args.sessions_per_user)
+    print(f'Seeded {UserBook.objects.count()} user books, {Rating.objects.count()} ratings, '
+          f'{ReadingSession.objects.count()} sessions in {time.perf_counter() - start:.1f}s')
+
+    user = User.objects.order_by('id')[args.users // 2]
+
+    for label, change in [('BEFORE (unique_together only)', None), ('AFTER (composite indexes)', create_indexes)]:
+        if change is not None:
+            change()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        print(f'\n=== {label} ===')
+        explain(user)
+        time_workload(user, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Load test the session strategies on read-only API requests.
+
+Logs a set of users in, then replays read-only requests (my_books and the
+stats endpoints) through the full middleware stack and counts the
+statements that touch django_session. The previous configuration (db
+backend with SESSION_SAVE_EVERY_REQUEST) is compared against the current
+one (threshold refresh) on the db, cached_db and signed_cookies engines.
+Pass --elapsed to simulate time since the last refresh, e.g. --elapsed
+4000 to see the single refresh write per session once the interval has
+passed.
+
+Usage (from the backend directory):
+    python scripts/loadtest_sessions.py [--users 20] [--requests 50] [--elapsed 0]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bookcase.settings')
+
+import django
+from django.conf import settings
+
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix='bookcase-bench-'), 'bench.sqlite3')
+settings.DATABASES['default']['NAME'] = DB_PATH
+django.setup()
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+
+READ_URLS = [
+    '/api/books/my-books/',
+    '/api/stats/dashboard/',
+    '/api/stats/reading-timeline/',
+    '/api/stats/genre-breakdown/',
+    '/api/stats/reading-habits/',
+]
+
+REFRESH_MIDDLEWARE = 'apps.users.middleware.SessionRefreshMiddleware'
+
+STRATEGIES = {
+    'before (db, save every request)': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+        'SESSION_SAVE_EVERY_REQUEST': True,
+        'MIDDLEWARE': [name for name in settings.MIDDLEWARE if name != REFRESH_MIDDLEWARE],
+    },
+    'db + threshold refresh': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+    },
+    'cached_db + threshold refresh': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db',
+    },
+    'signed_cookies + threshold refresh': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.signed_cookies',
+    },
+}
+
+
+def run(name, overrides, users, requests, elapsed):
+    with override_settings(**overrides):
+        clients = []
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            # Let the middleware stamp the fresh session, as a login view would
+            client.get(READ_URLS[0])
+            clients.append(client)
+
+        later = time.time() + elapsed
+        with mock.patch('apps.users.middleware.time.time', return_value=later):
+            with CaptureQueriesContext(connection) as queries:
+                for index in range(requests):
+                    for client in clients:
+                        client.get(READ_URLS[index % len(READ_URLS)])
+
+    total = requests * len(users)
+    session_sql = [query['sql'] for query in queries if 'django_session' in query['sql']]
+    writes = [sql for sql in session_sql if not sql.startswith('SELECT')]
+    print(
+        f'{name:<36} {len(queries) / total:6.2f} queries/req  '
+        f'{(len(session_sql) - len(writes)) / total:5.2f} session reads/req  '
+        f'{len(writes) / total:5.2f} session writes/req'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=50, help='Requests per user')
+    parser.add_argument('--elapsed', type=int, default=0, help='Seconds since the sessions were last refreshed')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    settings.ALLOWED_HOSTS = ['*']
+    call_command('migrate', verbosity=0)
+    users = [User.objects.create_user(username=f'load{i}', password='!') for i in range(args.users)]
+
+    print(f'{args.users} users x {args.requests} read requests, {args.elapsed}s since last refresh\n')
+    for name, overrides in STRATEGIES.items():
+        caches['default'].clear()
+        caches['stats'].clear()
+        run(name, overrides, users, args.requests, args.elapsed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Stand-in replication between two SQLite files, for trying the read replica locally.
+
+Copies the primary database into the replica with SQLite's online backup
+API every --interval seconds, so the replica trails the primary the way a
+streaming replica would. Run it next to the heartbeat:
+
+    DB_REPLICA_NAME=replica.sqlite3 python manage.py runserver
+    python manage.py replica_heartbeat
+    python scripts/sqlite_replica.py --replica replica.sqlite3 --interval 2
+
+An --interval above DB_REPLICA_MAX_LAG (5 seconds by default) shows the
+lag guard sending stats reads back to the primary.
+
+Usage (from the backend directory):
+    python scripts/sqlite_replica.py [--primary db.sqlite3] [--replica replica.sqlite3] [--interval 2] [--once]
+"""
+
+import argparse
+import sqlite3
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def copy(primary, replica):
+    """Copy `primary` into `replica` as one consistent snapshot"""
+    source = sqlite3.connect(primary, timeout=20)
+    target = sqlite3.connect(replica, timeout=20)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--primary', default=str(BACKEND_DIR / 'db.sqlite3'))
+    parser.add_argument('--replica', default=str(BACKEND_DIR / 'replica.sqlite3'))
+    parser.add_argument('--interval', type=float, default=2, help='Seconds between copies')
+    parser.add_argument('--once', action='store_true', help='Copy once and exit')
+    args = parser.parse_args()
+
+    while True:
+        start = time.perf_counter()
+        copy(args.primary, args.replica)
+        print(f'Copied {args.primary} -> {args.replica} in {(time.perf_counter() - start) * 1000:.0f} ms', flush=True)
+        if args.once:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+import axios from 'axios';
+
+// Fetch one book from the library by its user book id
+export const fetchMyBook = async (userBookId) => {
+  const response = await axios.get(`/api/books/user-book/${userBookId}/`);
+  return response.data.user_book;
+};
+
+// Fetch several statuses, following the cursor links, e.g. ['tbr', 'reading'].
+// Resolves to { books: { tbr: [...], reading: [...] }, counts: { tbr: 3, ... } }
+export const fetchMyBooksByStatus = async (statuses) => {
+  const books = Object.fromEntries(statuses.map((status) => [status, []]));
+  let response = await axios.get('/api/books/my-books/', {
+    params: { status: statuses.join(','), page_size: 100 }
+  });
+  const { counts } = response.data;
+
+  const collect = () => {
+    Object.entries(response.data.books_by_status).forEach(([status, page]) => {
+      books[status].push(...page);
+    });
+  };
+
+  collect();
+  while (response.data.next) {
+    response = await axios.get(response.data.next);
+    collect();
+  }
+
+  return { books, counts };
+};
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useParams, useNavigate, Link } from 'react-router-dom';
 import axios from 'axios';
+import { fetchMyBook } from '../api/myBooks';
 import './BookDetail.css';
 
 // Simple Star Rating Component with half-star support
@@ -108,19 +109,14 @@ const BookDetail = () => {
 
   const fetchBookDetails = async () => {
     try {
-      // For now, let's get book details through the my-books endpoint
-      // You might want to create a specific endpoint for single book details
-      const response = await axios.get('/api/books/my-books/');
-      const book = response.data.books.find(b => b.id == bookId);
-      
-      if (book) {
-        setUserBook(book);
-      } else {
+      setUserBook(await fetchMyBook(bookId));
+    } catch (err) {
+      if (err.response?.status === 404) {
         setError('Book not found');
+      } else {
+        setError('Failed to load book details');
+        console.error('Fetch book error:', err);
       }
-    } catch (err) {
-      setError('Failed to load book details');
-      console.error('Fetch book error:', err);
     }
   };
 
@@ -232,7 +228,7 @@ const BookDetail = () => {
           <div className="book-cover-large">
             {userBook?.book.cover_url ? (
               <img 
-                src={userBook.book.cover_url} 
+                src={userBook.book.cover_medium_url || userBook.book.cover_url} 
                 alt={`${userBook.book.title} cover`}
                 onError={(e) => {
                   e.target.style.display = 'none';
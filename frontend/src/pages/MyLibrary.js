@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
-import axios from 'axios';
+import { fetchMyBooksByStatus } from '../api/myBooks';
 import './MyLibrary.css';
 
 const MyLibrary = () => {
@@ -18,17 +18,10 @@ const MyLibrary = () => {
   const fetchBooks = async () => {
     setLoading(true);
     try {
-      // Get finished books
-      const finishedResponse = await axios.get('/api/books/my-books/', {
-        params: { status: 'finished' }
-      });
-      setFinishedBooks(finishedResponse.data.books);
-
-      // Get DNF books
-      const dnfResponse = await axios.get('/api/books/my-books/', {
-        params: { status: 'dnf' }
-      });
-      setDnfBooks(dnfResponse.data.books);
+      // Get finished and DNF books in one request
+      const { books } = await fetchMyBooksByStatus(['finished', 'dnf']);
+      setFinishedBooks(books.finished);
+      setDnfBooks(books.dnf);
     } catch (err) {
       setError('Failed to load your library');
     } finally {
@@ -62,7 +55,7 @@ const MyLibrary = () => {
         {userBook.book.cover_url && (
           <div className="book-cover">
             <img 
-              src={userBook.book.cover_url} 
+              src={userBook.book.cover_medium_url || userBook.book.cover_url} 
               alt={`${userBook.book.title} cover`}
               onError={(e) => {
                 e.target.style.display = 'none';
@@ -248,7 +241,7 @@ const MyLibrary = () => {
                   {userBook.book.cover_url && (
                     <div className="book-cover">
                       <img 
-                        src={userBook.book.cover_url} 
+                        src={userBook.book.cover_medium_url || userBook.book.cover_url} 
                         alt={`${userBook.book.title} cover`}
                         onError={(e) => {
                           e.target.style.display = 'none';
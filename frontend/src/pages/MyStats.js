@@ -28,18 +28,13 @@ const MyStats = () => {
       const token = localStorage.getItem('token');
       const config = { headers: { Authorization: `Bearer ${token}` } };
 
-      // Fetch all stats data
-      const [dashboardRes, timelineRes, genreRes, habitsRes] = await Promise.all([
-        axios.get('/api/stats/dashboard/', config),
-        axios.get(`/api/stats/reading-timeline/?days=${timeFilter}`, config),
-        axios.get('/api/stats/genre-breakdown/', config),
-        axios.get('/api/stats/reading-habits/', config)
-      ]);
+      // Fetch all stats sections in one request
+      const response = await axios.get(`/api/stats/bundle/?days=${timeFilter}`, config);
 
-      setDashboardStats(dashboardRes.data);
-      setTimelineData(timelineRes.data);
-      setGenreData(genreRes.data);
-      setHabitsData(habitsRes.data);
+      setDashboardStats(response.data.dashboard);
+      setTimelineData(response.data.reading_timeline);
+      setGenreData(response.data.genre_breakdown);
+      setHabitsData(response.data.reading_habits);
       setError(null);
     } catch (err) {
       console.error('Error fetching stats:', err);
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
 import axios from 'axios';
+import { fetchMyBooksByStatus } from '../api/myBooks';
 
 const MyTBR = () => {
   const [tbrBooks, setTbrBooks] = useState([]);
@@ -16,17 +17,10 @@ const MyTBR = () => {
   const fetchBooks = async () => {
     setLoading(true);
     try {
-      // Get TBR books
-      const tbrResponse = await axios.get('/api/books/my-books/', {
-        params: { status: 'tbr' }
-      });
-      setTbrBooks(tbrResponse.data.books);
-
-      // Get currently reading books
-      const readingResponse = await axios.get('/api/books/my-books/', {
-        params: { status: 'reading' }
-      });
-      setReadingBooks(readingResponse.data.books);
+      // Get TBR and currently reading books in one request
+      const { books } = await fetchMyBooksByStatus(['tbr', 'reading']);
+      setTbrBooks(books.tbr);
+      setReadingBooks(books.reading);
     } catch (err) {
       setError('Failed to load your books');
     } finally {
@@ -64,7 +58,7 @@ const MyTBR = () => {
         {userBook.book.cover_url && (
           <div className="book-cover">
             <img 
-              src={userBook.book.cover_url} 
+              src={userBook.book.cover_medium_url || userBook.book.cover_url} 
               alt={`${userBook.book.title} cover`}
               onError={(e) => {
                 e.target.style.display = 'none';